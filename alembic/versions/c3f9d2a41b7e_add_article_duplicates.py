@@ -0,0 +1,30 @@
+"""add ArticleDuplicates
+
+Revision ID: c3f9d2a41b7e
+Revises: ab8681a82333
+Create Date: 2026-10-18 10:12:41.275310
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c3f9d2a41b7e'
+down_revision = 'ab8681a82333'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ArticleDuplicates',
+        sa.Column('ArticleID', sa.Integer(), sa.ForeignKey('LawArticles.ArticleID', ondelete='CASCADE'), primary_key=True, autoincrement=False),
+        sa.Column('CanonicalArticleID', sa.Integer(), sa.ForeignKey('LawArticles.ArticleID'), nullable=False),
+        sa.Column('Similarity', sa.Numeric(5, 4), nullable=False),
+        sa.Column('DetectedDate', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_ArticleDuplicates_CanonicalArticleID', 'ArticleDuplicates', ['CanonicalArticleID'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ArticleDuplicates_CanonicalArticleID', table_name='ArticleDuplicates')
+    op.drop_table('ArticleDuplicates')
@@ -0,0 +1,57 @@
+"""add AI record sequences and AIAnswerSources.Excerpt
+
+From this revision on, the sequences are the only source of QueryID,
+AnswerID and SourceID values: rows are inserted with an ID taken from
+NEXT VALUE FOR the table's sequence, under SET IDENTITY_INSERT ON, as the
+write-behind writer does. The IDENTITY property stays (SQL Server can only
+drop it by rebuilding the table), but its counter is moved to the INT
+maximum, so an insert that still relies on IDENTITY (an old code path, a
+manual backfill) fails with an arithmetic overflow error instead of
+taking an ID already reserved from the sequence.
+
+Revision ID: e5b8c1d94f3a
+Revises: c3f9d2a41b7e
+Create Date: 2026-10-18 16:40:08.513927
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e5b8c1d94f3a'
+down_revision = 'c3f9d2a41b7e'
+branch_labels = None
+depends_on = None
+
+# IDs of rows written behind the request come from these sequences
+SEQUENCES = (
+    ('AIQueries_QueryID_Seq', 'AIQueries', 'QueryID'),
+    ('AIAnswers_AnswerID_Seq', 'AIAnswers', 'AnswerID'),
+    ('AIAnswerSources_SourceID_Seq', 'AIAnswerSources', 'SourceID'),
+)
+
+# Largest INT, where the retired IDENTITY counters are parked
+INT_MAX = 2147483647
+
+
+def upgrade() -> None:
+    op.add_column('AIAnswerSources', sa.Column('Excerpt', sa.UnicodeText(), nullable=True))
+    for sequence, table, column in SEQUENCES:
+        # Continue after the IDs already issued by the IDENTITY column
+        op.execute(
+            f"DECLARE @start BIGINT = (SELECT ISNULL(MAX([{column}]), 0) + 1 FROM [{table}]); "
+            f"EXEC('CREATE SEQUENCE [{sequence}] AS INT START WITH ' + CAST(@start AS NVARCHAR(20)) + ' INCREMENT BY 1 CACHE 1000')"
+        )
+        # Guard against mixed use: the next IDENTITY value would overflow.
+        # Explicit IDs below the counter leave it where it is.
+        op.execute(f"DBCC CHECKIDENT ('[{table}]', RESEED, {INT_MAX})")
+
+
+def downgrade() -> None:
+    for sequence, table, column in SEQUENCES:
+        # Hand ID allocation back to IDENTITY, after the IDs already used
+        op.execute(
+            f"DECLARE @last INT = (SELECT ISNULL(MAX([{column}]), 0) FROM [{table}]); "
+            f"DBCC CHECKIDENT ('[{table}]', RESEED, @last)"
+        )
+        op.execute(f"DROP SEQUENCE [{sequence}]")
+    op.drop_column('AIAnswerSources', 'Excerpt')
@@ -0,0 +1,137 @@
+"""
+Vector search benchmark script for Convergence Platform.
+Builds flat, ANN and quantized indexes over the same corpus and runs a
+labelled query set through search_similar, reporting p50/p95/p99 latency,
+QPS under concurrency, memory and recall@k against exact search.
+
+Usage:
+    python scripts/benchmark_vector_search.py --laws 2000 --queries 300 --output bench.json
+    python scripts/benchmark_vector_search.py --corpus db --queries-file queries.jsonl
+    python scripts/benchmark_vector_search.py --configs flat:none hnsw:sq8 --baseline bench.json
+
+Query files hold one JSON object per line: {"query": "...", "relevant": ["law_12"]}.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.vector_service import VECTOR_AVAILABLE
+
+
+def load_corpus(args):
+    """Documents to index, and a description of where they came from."""
+    from src.services.vector_benchmark import load_jsonl, synthetic_corpus
+    
+    if args.corpus == "synthetic":
+        documents = synthetic_corpus(args.laws, args.articles_per_law, seed=args.seed)
+        return documents, f"synthetic ({args.laws} laws x {args.articles_per_law} articles)"
+    
+    if args.corpus == "db":
+        from src.core.settings import settings
+        from src.db.session import SessionLocal
+        from src.services.vector_documents import iter_corpus_documents
+        
+        db = SessionLocal()
+        try:
+            documents = [
+                doc
+                for batch in iter_corpus_documents(db, settings.vector_encode_batch_size)
+                for doc in batch
+            ]
+        finally:
+            db.close()
+        return documents, "database"
+    
+    return load_jsonl(Path(args.corpus)), args.corpus
+
+
+def main():
+    from src.services.vector_benchmark import DEFAULT_CONFIGS
+    
+    parser = argparse.ArgumentParser(description="Benchmark vector search configurations")
+    parser.add_argument(
+        "--corpus", default="synthetic",
+        help="'synthetic', 'db' (the legal corpus) or a JSONL file of index documents",
+    )
+    parser.add_argument("--laws", type=int, default=2000, help="laws in the synthetic corpus")
+    parser.add_argument("--articles-per-law", type=int, default=4, help="articles per synthetic law")
+    parser.add_argument("--queries", type=int, default=300, help="labelled queries sampled from the corpus")
+    parser.add_argument("--queries-file", help="JSONL file of labelled queries instead of sampled ones")
+    parser.add_argument("--k", type=int, default=10, help="results per query (recall@k cut-off)")
+    parser.add_argument(
+        "--configs", nargs="+", default=list(DEFAULT_CONFIGS),
+        help="index_type:quantization pairs to benchmark",
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="concurrent clients")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic corpus and query sample")
+    parser.add_argument("--work-dir", help="keep the built indexes in this directory")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+    
+    if not VECTOR_AVAILABLE:
+        print("Vector search dependencies are not installed.")
+        return 1
+    
+    from src.core.settings import settings
+    from src.services.vector_benchmark import compare_reports, load_jsonl, run_benchmark, sample_queries
+    
+    documents, source = load_corpus(args)
+    if not documents:
+        print("The corpus is empty.")
+        return 1
+    
+    if args.queries_file:
+        labelled = load_jsonl(Path(args.queries_file))
+    else:
+        labelled = sample_queries(documents, args.queries, seed=args.seed)
+    
+    print(f"Benchmarking {len(args.configs)} configurations: {len(documents)} documents, {len(labelled)} queries")
+    report = asyncio.run(run_benchmark(
+        documents,
+        labelled,
+        k=args.k,
+        configs=args.configs,
+        concurrency_levels=args.concurrency,
+        work_dir=Path(args.work_dir) if args.work_dir else None,
+        # The real corpus shares the live embedding cache; synthetic text stays out of it
+        embedding_cache_dir=Path(settings.vector_embedding_cache_dir) if args.corpus == "db" else None,
+        corpus_source=source,
+    ))
+    
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"Report written to {args.output}")
+    else:
+        print(output)
+    
+    print(f"\n{'config':<12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max QPS':>9} {'recall':>8} {'MB':>9}")
+    for entry in report["configs"]:
+        if "error" in entry:
+            print(f"{entry['config']:<12} failed: {entry['error']}")
+            continue
+        latency = entry["latency_ms"]
+        qps = max(run["qps"] for run in entry["throughput"]) if entry["throughput"] else 0
+        print(
+            f"{entry['config']:<12} {latency['p50']:>9} {latency['p95']:>9} {latency['p99']:>9} "
+            f"{qps:>9} {entry[f'recall@{args.k}']:>8} {entry['resident_bytes'] / 2**20:>9.1f}"
+        )
+    
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline} ({baseline.get('git_revision')}), as (now, before):")
+        for row in compare_reports(report, baseline):
+            print("  " + ", ".join(f"{key}: {value}" for key, value in row.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Vector index evaluation script for Convergence Platform.
+Compares exact, int8 scalar (sq8) and product (pq) quantized indexes on the
+currently indexed corpus and prints memory footprint and recall@k.
+With language-sharded indexes each shard is evaluated separately.
+
+Usage:
+    python scripts/evaluate_vector_index.py --k 10 --queries 500
+    python scripts/evaluate_vector_index.py --queries-file queries.txt --output report.json
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.vector_service import VECTOR_AVAILABLE, get_vector_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate vector index compression modes")
+    parser.add_argument("--k", type=int, default=10, help="cut-off for recall@k")
+    parser.add_argument("--queries", type=int, default=500, help="corpus vectors sampled as queries")
+    parser.add_argument("--queries-file", help="text file with one real query per line")
+    parser.add_argument("--modes", nargs="+", choices=["none", "sq8", "pq"], help="modes to evaluate")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    
+    if not VECTOR_AVAILABLE:
+        print("Vector search dependencies are not installed.")
+        return 1
+    
+    from src.services.vector_eval import evaluate_index_modes
+    
+    query_texts = None
+    if args.queries_file:
+        with open(args.queries_file, "r", encoding="utf-8") as f:
+            query_texts = [line.strip() for line in f if line.strip()]
+    
+    service = get_vector_service()
+    shards = getattr(service, "shards", None)
+    if shards is None:
+        report = evaluate_index_modes(
+            service,
+            k=args.k,
+            num_queries=args.queries,
+            query_texts=query_texts,
+            quantizations=args.modes,
+        )
+    else:
+        report = {
+            language: evaluate_index_modes(
+                shard,
+                k=args.k,
+                num_queries=args.queries,
+                query_texts=query_texts,
+                quantizations=args.modes,
+            )
+            for language, shard in shards.items()
+        }
+    
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+ONNX encoder export script for Convergence Platform.
+Exports the sentence-transformers embedding model to ONNX, quantizes its
+weights to int8 (dynamic quantization) and checks that the exported encoder
+reproduces the PyTorch similarities within tolerance.
+
+Point settings.vector_model (VECTOR_MODEL) at the output directory to use
+it, then rebuild the vector index: the int8 embeddings are close to, but
+not identical with, the PyTorch ones.
+
+Usage:
+    python scripts/export_onnx_encoder.py --output data/models/minilm-onnx
+    python scripts/export_onnx_encoder.py --output data/models/minilm-onnx --check-only --texts-file queries.txt
+
+Requires torch, sentence-transformers, onnx and onnxruntime.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.core.settings import settings
+from src.services.embedding_model import ENCODER_CONFIG_FILE, is_onnx_model
+
+
+def export(model_name: str, output: Path, opset: int, quantize: bool):
+    """Export the transformer of a sentence-transformers model and write the encoder files."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling, Transformer
+    
+    model = SentenceTransformer(model_name, device="cpu")
+    modules = list(model)
+    if not isinstance(modules[0], Transformer) or not all(
+        isinstance(module, (Pooling, Normalize)) for module in modules[1:]
+    ):
+        raise ValueError("Only Transformer + Pooling (+ Normalize) models can be exported")
+    pooling = next(module for module in modules if isinstance(module, Pooling))
+    mode = pooling.get_pooling_mode_str()
+    if mode not in ("mean", "cls", "max"):
+        raise ValueError(f"Unsupported pooling mode: {mode}")
+    
+    tokenizer = model.tokenizer
+    transformer = modules[0].auto_model.eval()
+    sample = tokenizer(["Loi relative aux élections"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    
+    class TokenStates(torch.nn.Module):
+        """Transformer returning only the last hidden states, positional inputs for export."""
+        
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+        
+        def forward(self, *inputs):
+            return self.inner(**dict(zip(input_names, inputs))).last_hidden_state
+    
+    output.mkdir(parents=True, exist_ok=True)
+    onnx_path = output / "model.onnx"
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenStates(transformer),
+            tuple(sample[name] for name in input_names),
+            str(onnx_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    print(f"Exported {model_name} to {onnx_path}")
+    
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        
+        quantized_path = output / "model_quantized.onnx"
+        quantize_dynamic(str(onnx_path), str(quantized_path), weight_type=QuantType.QInt8)
+        print(
+            f"Quantized to {quantized_path} "
+            f"({onnx_path.stat().st_size / 2**20:.1f} MB -> {quantized_path.stat().st_size / 2**20:.1f} MB)"
+        )
+    
+    # tokenizer.json, read by the ONNX encoder without transformers
+    tokenizer.save_pretrained(str(output))
+    config = {
+        "source_model": model_name,
+        "max_seq_length": model.max_seq_length,
+        "pooling": mode,
+        "normalize": any(isinstance(module, Normalize) for module in modules),
+        "dimension": model.get_sentence_embedding_dimension(),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "quantized": quantize,
+    }
+    (output / ENCODER_CONFIG_FILE).write_text(json.dumps(config, indent=2), encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to quantized ONNX")
+    parser.add_argument("--model", help="sentence-transformers model (default: settings.vector_model)")
+    parser.add_argument("--output", required=True, help="directory for the exported encoder")
+    parser.add_argument("--opset", type=int, default=14, help="ONNX opset version")
+    parser.add_argument("--no-quantize", action="store_true", help="keep float32 weights")
+    parser.add_argument("--check-only", action="store_true", help="only run the parity check on an existing export")
+    parser.add_argument("--texts-file", help="extra texts for the parity check, one per line")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="largest accepted cosine similarity error")
+    args = parser.parse_args()
+    
+    output = Path(args.output)
+    model_name = args.model
+    if model_name is None:
+        if is_onnx_model(settings.vector_model):
+            config = json.loads((Path(settings.vector_model) / ENCODER_CONFIG_FILE).read_text(encoding="utf-8"))
+            model_name = config["source_model"]
+        else:
+            model_name = settings.vector_model
+    
+    if not args.check_only:
+        export(model_name, output, args.opset, quantize=not args.no_quantize)
+    
+    from sentence_transformers import SentenceTransformer
+    from src.services.embedding_model import PARITY_TEXTS, OnnxEncoder, parity_report
+    
+    texts = list(PARITY_TEXTS)
+    if args.texts_file:
+        with open(args.texts_file, "r", encoding="utf-8") as f:
+            texts += [line.strip() for line in f if line.strip()]
+    
+    start = time.perf_counter()
+    reference = SentenceTransformer(model_name, device="cpu")
+    reference_load = time.perf_counter() - start
+    start = time.perf_counter()
+    candidate = OnnxEncoder(output)
+    candidate_load = time.perf_counter() - start
+    
+    report = parity_report(reference, candidate, texts, tolerance=args.tolerance)
+    report["load_seconds"] = {"pytorch": round(reference_load, 2), "onnx": round(candidate_load, 2)}
+    for name, encoder in (("pytorch", reference), ("onnx", candidate)):
+        start = time.perf_counter()
+        encoder.encode(texts * 8, batch_size=32, show_progress_bar=False)
+        report.setdefault("encode_ms_per_text", {})[name] = round(
+            (time.perf_counter() - start) * 1000 / (len(texts) * 8), 3
+        )
+    
+    print(json.dumps(report, indent=2))
+    if not report["passed"]:
+        print(f"Parity check FAILED: similarities differ by more than {args.tolerance}")
+        return 1
+    print(f"Parity check passed. Set VECTOR_MODEL={output} and rebuild the vector index to use it.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Near-duplicate article scan for Convergence Platform.
+Clusters indexed law articles whose embeddings are nearly identical
+(republished or lightly amended texts), records each duplicate's canonical
+article in ArticleDuplicates and reports the index memory the duplicates take.
+
+Usage:
+    python scripts/find_duplicate_articles.py --threshold 0.97
+    python scripts/find_duplicate_articles.py --dry-run --output duplicates.json
+
+Duplicates are dropped from the serving index with POST /ai/vector/duplicates/prune;
+set VECTOR_DEDUP_PRUNE=true so that rebuilds leave them out as well.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.vector_service import VECTOR_AVAILABLE, get_vector_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate law articles in the vector index")
+    parser.add_argument("--threshold", type=float, help="minimum cosine similarity (default: settings)")
+    parser.add_argument("--neighbors", type=int, help="neighbours examined per article (default: settings)")
+    parser.add_argument("--dry-run", action="store_true", help="report only, do not record the links")
+    parser.add_argument("--output", help="write the JSON report, with every link, to this file")
+    args = parser.parse_args()
+    
+    if not VECTOR_AVAILABLE:
+        print("Vector search dependencies are not installed.")
+        return 1
+    
+    from src.services.article_dedup import find_duplicates, save_duplicate_links
+    
+    service = get_vector_service()
+    # Translations are not duplicates: language shards are scanned separately
+    services = getattr(service, "shards", None) or {"index": service}
+    reports = {
+        name: find_duplicates(shard, threshold=args.threshold, neighbors=args.neighbors)
+        for name, shard in services.items()
+    }
+    links = [link for report in reports.values() for link in report["links"]]
+    scanned = [article_id for report in reports.values() for article_id in report.pop("scanned_article_ids")]
+    
+    if not args.dry_run:
+        from src.db.session import SessionLocal
+        
+        db = SessionLocal()
+        try:
+            stored = save_duplicate_links(db, links, scanned)
+        finally:
+            db.close()
+        print(f"Recorded {stored} duplicate links in ArticleDuplicates")
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False)
+        print(f"Report written to {args.output}")
+    
+    for name, report in reports.items():
+        memory = report["memory"]
+        print(
+            f"{name}: {report['duplicates']} duplicates of {report['articles']} articles "
+            f"in {report['clusters']} clusters (largest {report['largest_cluster']}), "
+            f"{report['duplicate_vectors']} vectors, {memory['duplicate_bytes'] / 2**20:.1f} MB "
+            f"of {memory['resident_bytes'] / 2**20:.1f} MB ({memory['duplicate_share']:.1%})"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
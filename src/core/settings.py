@@ -22,14 +22,69 @@ class AppSettings(BaseSettings):
     ai_provider: str = "openai"  # openai or anthropic
     openai_api_key: str = ""
     anthropic_api_key: str = ""
+    openai_base_url: str = ""  # empty = the provider's API; e.g. a local mock server for tests
+    anthropic_base_url: str = ""
     ai_model: str = "gpt-4"  # gpt-4, gpt-3.5-turbo, claude-3-sonnet-20240229
     ai_max_tokens: int = 1000
     ai_temperature: float = 0.1
+    ai_answer_cache_size: int = 1000  # answers reused for near-identical questions, 0 disables
+    ai_answer_cache_threshold: float = 0.95  # query embedding similarity from which an answer is reused
+    ai_answer_cache_ttl_seconds: float = 86400
+    ai_max_concurrency: int = 8  # provider calls in flight per process; others wait
+    ai_max_connections: int = 16  # pooled keep-alive connections to the provider
+    ai_keepalive_seconds: float = 60
+    ai_request_timeout_seconds: float = 60
+    ai_max_retries: int = 3  # retries on 429, 5xx and connection errors
+    ai_retry_base_delay_seconds: float = 0.5  # backoff doubles per retry, with full jitter
+    ai_retry_max_delay_seconds: float = 30  # longer Retry-After values are not waited for
+    ai_write_batch_size: int = 200  # questions whose records are inserted together
+    ai_write_max_wait_ms: float = 200  # how long queued records wait for their batch to fill
+    ai_write_queue_size: int = 10000  # pending questions before callers wait, 0 = unbounded
+    ai_id_block_size: int = 100  # IDs reserved per sequence round trip
 
     # Vector Database Configuration
-    vector_model: str = "paraphrase-multilingual-MiniLM-L12-v2"
+    vector_model: str = "paraphrase-multilingual-MiniLM-L12-v2"  # or an ONNX export directory (scripts/export_onnx_encoder.py)
+    vector_onnx_threads: int = 0  # inference threads of the encoder, 0 = library default
     vector_dimension: int = 384
     vector_similarity_threshold: float = 0.7
+    vector_index_type: str = "auto"  # auto, flat, ivf, hnsw
+    vector_flat_max_vectors: int = 20000  # auto: largest corpus kept on exact search
+    vector_hnsw_max_vectors: int = 1000000  # auto: largest corpus served by HNSW, IVF above
+    vector_ivf_nlist: int = 0  # 0 = derive from corpus size (4 * sqrt(n))
+    vector_ivf_nprobe: int = 16
+    vector_hnsw_m: int = 32
+    vector_hnsw_ef_construction: int = 200
+    vector_hnsw_ef_search: int = 64
+    vector_quantization: str = "none"  # none, sq8, pq (IVFPQ); candidates are re-ranked exactly
+    vector_pq_m: int = 48  # PQ sub-quantizers, must divide vector_dimension
+    vector_pq_nbits: int = 8
+    vector_rerank_factor: int = 4  # candidates fetched per result for exact re-ranking
+    vector_query_batch_size: int = 32  # concurrent searches encoded and searched together
+    vector_query_batch_wait_ms: float = 2.0  # how long a search waits for others to join its batch
+    vector_hybrid_candidates: int = 50  # results taken from BM25 and from FAISS before fusion
+    vector_hybrid_max_results: int = 1000  # deepest hybrid hit a paginated law search reaches (IDs go into one SQL IN list)
+    vector_rrf_k: int = 60  # reciprocal-rank fusion damping constant
+    vector_filter_exact_max: int = 2048  # filtered searches matching at most this many vectors are scored exactly
+    vector_filter_cache_size: int = 128  # distinct search filters whose matching IDs are kept
+    vector_query_cache_size: int = 4096  # query embeddings kept in memory (~1.5 KB each)
+    vector_query_cache_ttl_seconds: float = 86400
+    vector_result_cache_size: int = 1024  # search result lists kept until the index changes
+    vector_result_cache_ttl_seconds: float = 600
+    vector_chunk_max_tokens: int = 0  # word pieces per passage, 0 = what the model reads
+    vector_chunk_overlap_tokens: int = 24  # word pieces shared by consecutive passages
+    vector_chunk_search_factor: int = 4  # passages fetched per result before grouping by document
+    vector_shard_languages: str = ""  # e.g. "fr,ar,en": one index per language, first is the default; empty = one index
+    vector_shard_fanout: str = "auto"  # auto (other shards when the query's shard has < k hits), always, never
+    vector_dedup_threshold: float = 0.97  # cosine similarity above which two articles are near-duplicates
+    vector_dedup_neighbors: int = 10  # neighbours examined per article by the duplicate scan
+    vector_dedup_prune: bool = False  # rebuilds index canonical articles only (see scripts/find_duplicate_articles.py)
+    vector_compaction_ratio: float = 0.1  # compact once this share of stored vectors is tombstoned
+    vector_compaction_min_tombstones: int = 100
+    vector_segment_merge_threshold: int = 32  # logged writes before merging into a new snapshot
+    vector_embedding_cache_enabled: bool = True
+    vector_embedding_cache_dir: str = "data/embedding_cache"
+    vector_encode_batch_size: int = 256  # documents per rebuild batch
+    vector_encode_workers: int = 0  # encoder processes for rebuilds, 0 = one per CPU core
 
     # MongoDB Configuration (for raw data storage)
     mongodb_url: str = "mongodb://localhost:27017"
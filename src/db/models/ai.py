@@ -34,6 +34,7 @@ class AIAnswerSources(Base):
     AnswerID: Mapped[int] = mapped_column(ForeignKey("AIAnswers.AnswerID", ondelete="CASCADE"))
     LawID: Mapped[int | None] = mapped_column(ForeignKey("Laws.LawID"), nullable=True)
     ArticleID: Mapped[int | None] = mapped_column(ForeignKey("LawArticles.ArticleID"), nullable=True)
+    Excerpt: Mapped[str | None] = mapped_column(NVARCHAR(None), nullable=True)
     RelevanceScore: Mapped[float | None] = mapped_column(Numeric(5, 2), nullable=True)
 
 
@@ -1,6 +1,6 @@
-from datetime import date
+from datetime import date, datetime
 
-from sqlalchemy import Date, ForeignKey, Integer
+from sqlalchemy import Date, DateTime, ForeignKey, Integer, Numeric
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.dialects.mssql import NVARCHAR
 
@@ -47,3 +47,13 @@ class LawTags(Base):
     TagName: Mapped[str] = mapped_column(NVARCHAR(100))
 
 
+class ArticleDuplicates(Base):
+    __tablename__ = "ArticleDuplicates"
+
+    # One row per near-duplicate article, pointing at the article kept in its place
+    ArticleID: Mapped[int] = mapped_column(
+        ForeignKey("LawArticles.ArticleID", ondelete="CASCADE"), primary_key=True, autoincrement=False
+    )
+    CanonicalArticleID: Mapped[int] = mapped_column(ForeignKey("LawArticles.ArticleID"), index=True)
+    Similarity: Mapped[float] = mapped_column(Numeric(5, 4))
+    DetectedDate: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
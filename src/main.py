@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,11 +8,26 @@ from src.core.logging_config import configure_logging
 from src.core.settings import settings
 from src.routers.health import router as health_router
 from src.routers.api_v1 import api_router
+from src.services.ai_gateway import close_provider_gateway, get_provider_gateway
+from src.services.vector_service import close_vector_service
+from src.services.write_behind import close_ai_record_writer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled AI provider client for every request of this process
+    get_provider_gateway()
+    yield
+    # Write the AI records still queued before the process exits
+    await close_ai_record_writer()
+    await close_provider_gateway()
+    # Fold this process's index writes into the snapshot the next start maps
+    await close_vector_service()
 
 
 def create_app() -> FastAPI:
     configure_logging(settings.log_level)
-    app = FastAPI(title=settings.app_name)
+    app = FastAPI(title=settings.app_name, lifespan=lifespan)
     # CORS for React dev server
     app.add_middleware(
         CORSMiddleware,
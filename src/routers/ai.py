@@ -17,6 +17,7 @@ from src.schemas.legal import (
     AIFeedbackResponse,
 )
 from src.services.ai_service import AIService
+from src.services.write_behind import RecordsPendingError
 
 router = APIRouter(tags=["ai"])
 
@@ -42,6 +43,45 @@ async def submit_ai_query(
         raise HTTPException(status_code=500, detail=f"AI query failed: {str(e)}")
 
 
+@router.post("/query/stream")
+async def stream_ai_query(
+    query_request: AIQueryRequest,
+    current_user: Optional[Users] = Depends(get_current_user),
+):
+    """
+    Submit a legal question and receive the answer as server-sent events.
+    
+    Events: 'sources' (the citations, sent first), 'delta' (answer text as
+    the provider generates it), then 'done' (query ID, confidence and
+    disclaimer) or 'error'. The answer is stored once the stream completes.
+    """
+    import contextlib
+    import json
+    from fastapi.responses import StreamingResponse
+    from src.db.session import SessionLocal
+    
+    user_id = current_user.UserID if current_user else None
+    
+    async def events():
+        # The request's session closes before the body is streamed
+        db = SessionLocal()
+        try:
+            ai_service = AIService(db)
+            # Closed with the response, so a disconnect also ends the provider stream
+            async with contextlib.aclosing(ai_service.stream_legal_query(query_request, user_id=user_id)) as stream:
+                async for event, data in stream:
+                    yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+        finally:
+            db.close()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must not buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/queries/{query_id}", response_model=dict)
 async def get_query_details(
     query_id: str,
@@ -54,6 +94,10 @@ async def get_query_details(
     try:
         ai_service = AIService(db)
         
+        # The query's rows are written behind its response
+        if query_id.isdigit() and not await ai_service.records.wait_written(query_id=int(query_id)):
+            raise HTTPException(status_code=503, detail="Query is still being saved", headers={"Retry-After": "1"})
+        
         # Get query details
         from src.db.models.ai import AIQueries, AIAnswers, AIAnswerSources
         from sqlalchemy.orm import joinedload
@@ -129,6 +173,8 @@ async def submit_feedback(
             user_id=current_user.UserID if current_user else None,
         )
         return result
+    except RecordsPendingError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to submit feedback: {str(e)}")
 
@@ -261,9 +307,9 @@ async def get_vector_stats(
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        from src.services.vector_service import VectorService
+        from src.services.vector_service import get_vector_service
         
-        vector_service = VectorService()
+        vector_service = get_vector_service()
         stats = await vector_service.get_index_stats()
         
         return {
@@ -275,13 +321,18 @@ async def get_vector_stats(
         raise HTTPException(status_code=500, detail=f"Failed to get vector stats: {str(e)}")
 
 
-@router.post("/vector/rebuild", response_model=dict)
+@router.post("/vector/rebuild", response_model=dict, status_code=202)
 async def rebuild_vector_index(
+    language: Optional[str] = Query(None, description="Rebuild only this language shard"),
     current_user: Optional[Users] = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> dict:
     """
-    Rebuild the vector index with all legal documents.
+    Start rebuilding the vector index with all legal documents.
+    The rebuild runs in the background while searches keep using the current
+    index, which is swapped for the new one when it is complete; poll
+    /vector/rebuild/status for progress.
+    With language-sharded indexes, a single shard can be rebuilt.
     Requires admin permissions.
     """
     if not current_user:
@@ -292,59 +343,157 @@ async def rebuild_vector_index(
         raise HTTPException(status_code=403, detail="Admin permissions required")
     
     try:
-        from src.services.vector_service import VectorService
-        from src.db.models.legal import Laws, LawArticles
+        from src.services.vector_service import get_vector_service
+        from src.services.vector_documents import count_corpus_documents, iter_corpus_documents
+        from src.core.settings import settings
+        from src.db.session import SessionLocal
         
-        vector_service = VectorService()
+        vector_service = get_vector_service()
         
         if not vector_service.is_available():
             raise HTTPException(status_code=503, detail="Vector service not available")
         
-        # Get all laws and articles
-        laws = db.query(Laws).all()
-        articles = db.query(LawArticles).all()
-        
-        # Prepare documents for indexing
-        documents = []
-        
-        # Add law titles and summaries
-        for law in laws:
-            if law.Title:
-                documents.append({
-                    'id': f"law_{law.LawID}",
-                    'text': f"{law.Title}. {law.Summary or ''}",
-                    'type': 'law',
-                    'law_id': law.LawID,
-                    'title': law.Title,
-                })
+        if vector_service.rebuild_job.running:
+            raise HTTPException(status_code=409, detail="A vector index rebuild is already running")
         
-        # Add article content
-        for article in articles:
-            if article.Content:
-                documents.append({
-                    'id': f"article_{article.ArticleID}",
-                    'text': article.Content,
-                    'type': 'law_article',
-                    'law_id': article.LawID,
-                    'article_id': article.ArticleID,
-                    'title': f"Article {article.ArticleNumber}",
-                })
+        rebuild_options = {}
+        if language:
+            shards = getattr(vector_service, "shards", None)
+            if shards is None:
+                raise HTTPException(status_code=400, detail="The vector index is not sharded by language")
+            if language not in shards:
+                raise HTTPException(status_code=400, detail=f"Unknown shard language: {language}")
+            rebuild_options["languages"] = [language]
+        
+        skip_duplicates = settings.vector_dedup_prune
+        counts = count_corpus_documents(db, skip_duplicates=skip_duplicates)
+        expected_total = counts["laws"] + counts["articles"]
+        batch_size = settings.vector_encode_batch_size
+        
+        # The request's session closes with the response; the job reads
+        # through sessions of its own, opened when it first reads a batch
+        def corpus_batches(sample_every: int = 1):
+            corpus_db = SessionLocal()
+            try:
+                yield from iter_corpus_documents(
+                    corpus_db, batch_size, sample_every=sample_every, skip_duplicates=skip_duplicates
+                )
+            finally:
+                corpus_db.close()
+        
+        # Stream laws and articles in batches instead of loading the corpus
+        batches = corpus_batches()
+        
+        # IVF training sample spread evenly over the corpus rather than its head
+        training_batches = None
+        train_size = vector_service.training_sample_size(expected_total)
+        if train_size:
+            training_batches = corpus_batches(sample_every=max(1, expected_total // train_size))
         
-        # Rebuild index
-        success = await vector_service.rebuild_index(documents)
+        def close_sessions():
+            # Closes the session of a job that stopped partway through the batches
+            for generator in (batches, training_batches):
+                try:
+                    if generator is not None:
+                        generator.close()
+                except ValueError:
+                    # Still being read by the thread of a cancelled job; closed once collected
+                    pass
         
-        if success:
-            return {
-                "status": "success",
-                "message": "Vector index rebuilt successfully",
-                "documents_indexed": len(documents),
-                "laws_count": len(laws),
-                "articles_count": len(articles),
-            }
-        else:
-            raise HTTPException(status_code=500, detail="Failed to rebuild vector index")
+        try:
+            job = vector_service.start_rebuild(
+                batches,
+                expected_total,
+                training_batches=training_batches,
+                on_done=close_sessions,
+                **rebuild_options,
+            )
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        
+        return {
+            "status": "started",
+            "message": f"Rebuilding vector shard '{language}'" if language else "Rebuilding vector index",
+            "laws_count": counts["laws"],
+            "articles_count": counts["articles"],
+            "job": job,
+        }
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to rebuild vector index: {str(e)}")
+
+
+@router.post("/vector/duplicates/prune", response_model=dict)
+async def prune_duplicate_articles(
+    current_user: Optional[Users] = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> dict:
+    """
+    Drop the articles recorded as near-duplicates (scripts/find_duplicate_articles.py)
+    from the serving vector index and compact it.
+    Requires admin permissions.
+    """
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    if not hasattr(current_user, 'is_admin') or not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin permissions required")
+    
+    try:
+        from src.services.vector_service import get_vector_service
+        from src.services.article_dedup import duplicate_article_ids, prune_duplicates
+        
+        vector_service = get_vector_service()
+        if not vector_service.is_available():
+            raise HTTPException(status_code=503, detail="Vector service not available")
+        
+        article_ids = duplicate_article_ids(db)
+        services = getattr(vector_service, "shards", None) or {"index": vector_service}
+        reports = {name: await prune_duplicates(service, article_ids) for name, service in services.items()}
+        
+        return {
+            "status": "success",
+            "duplicate_articles": len(article_ids),
+            "removed_vectors": sum(report["removed_vectors"] for report in reports.values()),
+            "saved_bytes": sum(report["saved_bytes"] for report in reports.values()),
+            "indexes": reports,
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to prune duplicate articles: {str(e)}")
+
+
+@router.get("/vector/rebuild/status", response_model=dict)
+async def get_vector_rebuild_status(
+    current_user: Optional[Users] = Depends(get_current_user),
+) -> dict:
+    """
+    Get the state and progress of the latest vector index rebuild.
+    Requires admin permissions.
+    """
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    if not hasattr(current_user, 'is_admin') or not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin permissions required")
+    
+    try:
+        from src.services.vector_service import get_vector_service
+        
+        vector_service = get_vector_service()
+        if vector_service.rebuild_job is None:
+            raise HTTPException(status_code=503, detail="Vector service not available")
+        
+        return {
+            **vector_service.rebuild_job.status(),
+            "index_version": vector_service.index_version,
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get vector rebuild status: {str(e)}")
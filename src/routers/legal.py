@@ -21,6 +21,9 @@ from src.schemas.legal import (
     LawArticleDetail,
     LawTagCreate,
     LawTagResponse,
+    LegalSearchHit,
+    LegalSearchResponse,
+    SimilarDocumentsResponse,
 )
 from src.services.legal_service import LegalService
 from src.services.etl_service import ETLService
@@ -57,6 +60,155 @@ async def search_laws(
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
 
+@router.get("/search", response_model=LegalSearchResponse)
+async def hybrid_search(
+    q: str = Query(..., min_length=1, description="Search query (keywords, law numbers, or a question)"),
+    k: int = Query(10, ge=1, le=50, description="Number of results"),
+    doc_type: Optional[List[str]] = Query(None, alias="type", description="Document types (law, law_article)"),
+    category: Optional[List[str]] = Query(None, description="Law categories"),
+    law_id: Optional[List[int]] = Query(None, description="Restrict to these laws and their articles"),
+    from_date: Optional[date] = Query(None, description="Published on or after"),
+    to_date: Optional[date] = Query(None, description="Published on or before"),
+) -> LegalSearchResponse:
+    """
+    Search laws and articles with BM25 keyword matching and semantic
+    similarity, fused by reciprocal rank. Exact references such as law
+    numbers ("01-23") are matched by the keyword index. Filters are
+    applied inside both searches, so up to k matching results are returned.
+    """
+    try:
+        from src.services.vector_service import get_vector_service
+        
+        vector_service = get_vector_service()
+        if not vector_service.is_available():
+            raise HTTPException(status_code=503, detail="Search index not available")
+        
+        results = await vector_service.hybrid_search(
+            q,
+            k=k,
+            filters={
+                'type': doc_type,
+                'category': category,
+                'law_id': law_id,
+                'published_after': from_date,
+                'published_before': to_date,
+            },
+        )
+        items = [
+            LegalSearchHit(
+                document_id=result['id'],
+                type=result['type'],
+                law_id=result.get('law_id'),
+                article_id=result.get('article_id'),
+                title=result.get('title') or '',
+                excerpt=result.get('content') or '',
+                category=result.get('category'),
+                publication_date=result.get('publication_date'),
+                score=result['score'],
+                dense_score=result.get('dense_score'),
+                lexical_score=result.get('lexical_score'),
+            )
+            for result in results
+        ]
+        return LegalSearchResponse(query=q, total=len(items), items=items)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+
+async def _similar_documents(
+    doc_id: str,
+    k: int,
+    group_by: str,
+    filters: dict,
+) -> SimilarDocumentsResponse:
+    """Look up similar documents in the vector index, 404 if the document is not indexed."""
+    from src.services.vector_service import get_vector_service
+    
+    vector_service = get_vector_service()
+    if not vector_service.is_available():
+        raise HTTPException(status_code=503, detail="Search index not available")
+    
+    results = await vector_service.similar_documents(doc_id, k=k, group_by=group_by, filters=filters)
+    if results is None:
+        raise HTTPException(status_code=404, detail=f"Document {doc_id} is not indexed")
+    
+    items = [
+        LegalSearchHit(
+            document_id=result['id'],
+            type=result['type'],
+            law_id=result.get('law_id'),
+            article_id=result.get('article_id'),
+            title=result.get('title') or '',
+            excerpt=result.get('content') or '',
+            category=result.get('category'),
+            publication_date=result.get('publication_date'),
+            score=result['score'],
+            dense_score=result['score'],
+        )
+        for result in results
+    ]
+    return SimilarDocumentsResponse(document_id=doc_id, total=len(items), items=items)
+
+
+@router.get("/laws/{law_id}/similar", response_model=SimilarDocumentsResponse)
+async def get_similar_laws(
+    law_id: int,
+    k: int = Query(10, ge=1, le=50, description="Number of similar laws"),
+    category: Optional[List[str]] = Query(None, description="Law categories"),
+    from_date: Optional[date] = Query(None, description="Published on or after"),
+    to_date: Optional[date] = Query(None, description="Published on or before"),
+) -> SimilarDocumentsResponse:
+    """
+    Get the laws most similar to a law ("more like this").
+    Uses the law's stored vectors, so nothing is re-encoded; a law matches
+    through its title and summary or any of its articles.
+    """
+    try:
+        return await _similar_documents(
+            f"law_{law_id}",
+            k,
+            group_by="law",
+            filters={'category': category, 'published_after': from_date, 'published_before': to_date},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to find similar laws: {str(e)}")
+
+
+@router.get("/articles/{article_id}/similar", response_model=SimilarDocumentsResponse)
+async def get_similar_articles(
+    article_id: int,
+    k: int = Query(10, ge=1, le=50, description="Number of similar documents"),
+    doc_type: Optional[List[str]] = Query(None, alias="type", description="Document types (law, law_article)"),
+    category: Optional[List[str]] = Query(None, description="Law categories"),
+    from_date: Optional[date] = Query(None, description="Published on or after"),
+    to_date: Optional[date] = Query(None, description="Published on or before"),
+) -> SimilarDocumentsResponse:
+    """
+    Get the articles (and laws) most similar to an article ("more like this").
+    Uses the article's stored vectors, so nothing is re-encoded.
+    """
+    try:
+        return await _similar_documents(
+            f"article_{article_id}",
+            k,
+            group_by="document",
+            filters={
+                'type': doc_type,
+                'category': category,
+                'published_after': from_date,
+                'published_before': to_date,
+            },
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to find similar articles: {str(e)}")
+
+
 @router.get("/laws/{law_id}", response_model=LawDetail)
 async def get_law_detail(
     law_id: int,
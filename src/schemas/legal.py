@@ -94,11 +94,43 @@ class LawDetail(LawSummary):
 class LawSearchResponse(BaseModel):
     """Schema for law search response."""
     total: int = Field(..., description="Total number of results")
+    total_capped: bool = Field(
+        False, description="Whether ranked search stopped before running out of matches, so more laws may match than total"
+    )
     page: int = Field(..., description="Current page number")
     page_size: int = Field(..., description="Items per page")
     items: List[LawSummary] = Field(..., description="Search results")
 
 
+class LegalSearchHit(BaseModel):
+    """Schema for a hybrid (keyword + semantic) search result."""
+    document_id: str = Field(..., description="Indexed document ID (e.g., 'law_12', 'article_340')")
+    type: str = Field(..., description="Document type (law or law_article)")
+    law_id: Optional[int] = Field(None, description="Law ID")
+    article_id: Optional[int] = Field(None, description="Article ID")
+    title: str = Field(..., description="Law title or article label")
+    excerpt: str = Field(..., description="Best matching passage of the indexed text")
+    category: Optional[str] = Field(None, description="Law category")
+    publication_date: Optional[date] = Field(None, description="Publication date of the law's issue")
+    score: float = Field(..., description="Reciprocal-rank fusion score")
+    dense_score: Optional[float] = Field(None, description="Cosine similarity, if found by semantic search")
+    lexical_score: Optional[float] = Field(None, description="BM25 score, if found by keyword search")
+
+
+class LegalSearchResponse(BaseModel):
+    """Schema for hybrid search responses."""
+    query: str = Field(..., description="Search query")
+    total: int = Field(..., description="Number of results returned")
+    items: List[LegalSearchHit] = Field(..., description="Ranked results")
+
+
+class SimilarDocumentsResponse(BaseModel):
+    """Schema for "more like this" responses."""
+    document_id: str = Field(..., description="Indexed document the results are similar to")
+    total: int = Field(..., description="Number of results returned")
+    items: List[LegalSearchHit] = Field(..., description="Similar documents, most similar first; score is cosine similarity")
+
+
 class LawIssueBase(BaseModel):
     """Base schema for law issues."""
     issue_number: Optional[str] = Field(None, description="Issue number")
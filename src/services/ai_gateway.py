@@ -0,0 +1,273 @@
+"""
+AI Provider Gateway - One pooled, rate-limited connection to the AI provider.
+The OpenAI / Anthropic client is created once per process on a shared HTTP
+client that keeps connections alive, caps concurrent provider calls and
+retries throttled or failed requests with jittered backoff.
+"""
+
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import httpx
+
+from src.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Throttling, timeouts and server errors; 529 is Anthropic's "overloaded"
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504, 529})
+
+
+def retry_after_seconds(headers: httpx.Headers) -> Optional[float]:
+    """
+    Delay asked for by a throttled response, or None.
+    
+    Reads retry-after-ms (OpenAI) and Retry-After as seconds or an HTTP date.
+    """
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that frees its concurrency slot once closed."""
+    
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        self._released = False
+    
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+    
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+
+class ProviderTransport(httpx.AsyncBaseTransport):
+    """
+    HTTP transport limiting and retrying provider requests.
+    
+    At most max_concurrency requests are in flight; a request holds its
+    slot until its response body is closed, so a streamed answer counts
+    for as long as it streams. Connection errors and RETRY_STATUSES
+    responses are retried up to max_retries times, after the delay the
+    response's Retry-After asks for or else an exponential backoff with
+    full jitter. A Retry-After longer than max_delay is not waited for:
+    the throttled response is returned as is.
+    """
+    
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        max_concurrency: int,
+        max_retries: int,
+        base_delay: float,
+        max_delay: float,
+    ):
+        self._transport = transport
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+    
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Delay before retry number attempt + 1."""
+        if retry_after is not None:
+            # A little jitter so throttled callers do not return in lockstep
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+    
+    def _release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.requests += 1
+        
+        handed_over = False
+        try:
+            attempt = 0
+            while True:
+                try:
+                    response = await self._transport.handle_async_request(request)
+                except httpx.TransportError as e:
+                    if attempt >= self.max_retries:
+                        self.failures += 1
+                        raise
+                    delay = self._backoff(attempt, None)
+                    logger.warning(f"AI provider request failed ({str(e) or type(e).__name__}), retrying in {delay:.1f}s")
+                else:
+                    retry_after = retry_after_seconds(response.headers)
+                    if (
+                        response.status_code not in RETRY_STATUSES
+                        or attempt >= self.max_retries
+                        or (retry_after is not None and retry_after > self.max_delay)
+                    ):
+                        if response.status_code in RETRY_STATUSES:
+                            self.failures += 1
+                        # A body read already (e.g. a mock server's) holds nothing open
+                        if not response.is_closed:
+                            response.stream = _ReleasingStream(response.stream, self._release)
+                            handed_over = True
+                        return response
+                    delay = self._backoff(attempt, retry_after)
+                    logger.warning(f"AI provider returned {response.status_code}, retrying in {delay:.1f}s")
+                    await response.aclose()
+                
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+        finally:
+            if not handed_over:
+                self._release()
+    
+    async def aclose(self):
+        await self._transport.aclose()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Concurrency and retry counters for this process."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+        }
+
+
+class ProviderGateway:
+    """
+    The process's AI provider client and the HTTP connection pool under it.
+    
+    The SDK's own retries are disabled; ProviderTransport retries instead,
+    within the concurrency limit. Point openai_base_url / anthropic_base_url
+    at another server (e.g. a local mock) to redirect the calls.
+    """
+    
+    def __init__(self, provider: Optional[str] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.provider = provider or settings.ai_provider
+        self.transport = ProviderTransport(
+            transport or httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=settings.ai_max_connections,
+                    max_keepalive_connections=settings.ai_max_connections,
+                    keepalive_expiry=settings.ai_keepalive_seconds,
+                ),
+            ),
+            max_concurrency=settings.ai_max_concurrency,
+            max_retries=settings.ai_max_retries,
+            base_delay=settings.ai_retry_base_delay_seconds,
+            max_delay=settings.ai_retry_max_delay_seconds,
+        )
+        self.http_client = httpx.AsyncClient(
+            transport=self.transport,
+            timeout=httpx.Timeout(settings.ai_request_timeout_seconds, connect=10.0),
+        )
+        self.client = self._create_client()
+    
+    def _create_client(self):
+        """Create the provider SDK client on the shared HTTP client."""
+        if self.provider == "openai":
+            try:
+                import openai
+                return openai.AsyncOpenAI(
+                    api_key=settings.openai_api_key,
+                    base_url=settings.openai_base_url or None,
+                    http_client=self.http_client,
+                    max_retries=0,
+                )
+            except ImportError:
+                logger.error("OpenAI library not installed")
+                return None
+        elif self.provider == "anthropic":
+            try:
+                import anthropic
+                return anthropic.AsyncAnthropic(
+                    api_key=settings.anthropic_api_key,
+                    base_url=settings.anthropic_base_url or None,
+                    http_client=self.http_client,
+                    max_retries=0,
+                )
+            except ImportError:
+                logger.error("Anthropic library not installed")
+                return None
+        else:
+            logger.error(f"Unsupported AI provider: {self.provider}")
+            return None
+    
+    def stats(self) -> Dict[str, Any]:
+        """Provider name and request counters."""
+        return {"provider": self.provider, **self.transport.stats()}
+    
+    async def aclose(self):
+        """Close the pooled connections."""
+        await self.http_client.aclose()
+
+
+_shared_gateway: Optional[ProviderGateway] = None
+_shared_gateway_lock = threading.Lock()
+
+
+def get_provider_gateway() -> ProviderGateway:
+    """
+    Return the process-wide provider gateway, creating it on first use.
+    
+    The app creates it at startup; scripts get one on their first AI call.
+    """
+    global _shared_gateway
+    if _shared_gateway is None:
+        with _shared_gateway_lock:
+            if _shared_gateway is None:
+                _shared_gateway = ProviderGateway()
+    return _shared_gateway
+
+
+async def close_provider_gateway():
+    """Close the process-wide gateway, e.g. on app shutdown."""
+    global _shared_gateway
+    gateway, _shared_gateway = _shared_gateway, None
+    if gateway is not None:
+        await gateway.aclose()
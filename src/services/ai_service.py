@@ -4,50 +4,49 @@ Handles ChatGPT/Claude integration with RAG (Retrieval-Augmented Generation).
 """
 
 import asyncio
+import contextlib
 import json
 import logging
+import numpy as np
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
 from src.core.settings import settings
 from src.db.models.legal import Laws, LawArticles
-from src.db.models.ai import AIQueries, AIAnswers, AIAnswerSources, AIUserFeedback
+from src.db.models.ai import AIQueries, AIAnswers, AIUserFeedback
 from src.schemas.legal import AIQueryRequest, AIResponse, AISource, AIFeedbackRequest
-# VectorService import removed - using external AI only
+from src.services.ai_gateway import get_provider_gateway
+from src.services.answer_cache import get_answer_cache
+from src.services.embedding_cache import normalize_text
+from src.services.language import detect_language
+from src.services.single_flight import SingleFlight
+from src.services.vector_service import get_vector_service
+from src.services.write_behind import RecordsPendingError, get_ai_record_writer
 
 logger = logging.getLogger(__name__)
 
+# Identical questions being answered right now, keyed by normalised text and
+# number of sources
+_in_flight_answers = SingleFlight()
+
 
 class AIService:
     """Service class for AI-powered legal Q&A operations."""
     
     def __init__(self, db: Session):
         self.db = db
-        # Disable vector service for external AI only
-        self.vector_service = None
-        self.provider = settings.ai_provider
-        self.client = self._initialize_client()
-    
-    def _initialize_client(self):
-        """Initialize AI provider client."""
-        if self.provider == "openai":
-            try:
-                import openai
-                return openai.AsyncOpenAI(api_key=settings.openai_api_key)
-            except ImportError:
-                logger.error("OpenAI library not installed")
-                return None
-        elif self.provider == "anthropic":
-            try:
-                import anthropic
-                return anthropic.AsyncAnthropic(api_key=settings.anthropic_api_key)
-            except ImportError:
-                logger.error("Anthropic library not installed")
-                return None
-        else:
-            logger.error(f"Unsupported AI provider: {self.provider}")
-            return None
+        # Retrieval index shared by the process; answers come from the external AI
+        self.vector_service = get_vector_service()
+        # Answers to near-identical questions, shared by the process
+        self.answer_cache = get_answer_cache()
+        # Pooled, rate-limited provider client shared by the process
+        self.gateway = get_provider_gateway()
+        self.provider = self.gateway.provider
+        self.client = self.gateway.client
+        # Query, answer and source rows are written in batches, off the request
+        self.records = get_ai_record_writer()
     
     async def process_legal_query(
         self, 
@@ -56,107 +55,315 @@ class AIService:
     ) -> AIResponse:
         """
         Process a legal query using RAG (Retrieval-Augmented Generation).
+        
+        A question close enough to one answered recently reuses that answer
+        (see AnswerCache) without retrieval or a provider call, and
+        identical questions asked concurrently share one answer computation.
+        Each is still recorded as its own query and answer.
+        
+        The records are handed to the write-behind writer and reach the
+        database shortly after the response (see WriteBehindWriter); the
+        request holds no database connection during the provider call.
         """
         try:
-            # 1. Store the query
-            query_record = AIQueries(
-                UserID=user_id,
-                QueryText=query_request.query,
-                QueryDate=datetime.utcnow(),
-            )
-            self.db.add(query_record)
-            self.db.flush()
+            # 1. Allocate the query's ID; its row is written with the answer
+            query_id = await self.records.new_query_id()
+            query_row = self._query_row(query_id, query_request.query, user_id)
             
-            # 2. Retrieve relevant context using vector search
-            context_docs = await self._retrieve_context(
-                query_request.query, 
-                max_sources=query_request.max_sources
+            # 2. Answer, or join the identical question already being answered
+            response = await _in_flight_answers.do(
+                (normalize_text(query_request.query).casefold(), query_request.max_sources),
+                lambda: self._answer(query_request),
             )
+            if response is None:
+                await self.records.submit(query_row)
+                return await self._create_no_context_response(query_id)
+            # Shared with the callers that joined; each gets its own query ID
+            validated_response = response.model_copy(deep=True)
             
-            if not context_docs:
-                return await self._create_no_context_response(query_record.QueryID)
-            
-            # 3. Build structured prompt with context
-            prompt = self._build_rag_prompt(query_request.query, context_docs)
-            
-            # 4. Call AI provider
-            ai_response = await self._call_ai_provider(prompt)
-            
-            # 5. Validate and process response
-            validated_response = self._validate_response(ai_response, context_docs)
-            
-            # 6. Store the answer
-            answer_record = AIAnswers(
-                QueryID=query_record.QueryID,
-                AnswerText=validated_response.answer_text,
-                ConfidenceScore=validated_response.confidence,
-                DisclaimerAdded=True,
-                AnswerDate=datetime.utcnow(),
-            )
-            self.db.add(answer_record)
-            self.db.flush()
-            
-            # 7. Store source citations
-            for source in validated_response.sources:
-                source_record = AIAnswerSources(
-                    AnswerID=answer_record.AnswerID,
-                    LawID=source.law_id,
-                    ArticleID=source.article_id,
-                    Excerpt=source.excerpt,
-                    RelevanceScore=source.score,
-                )
-                self.db.add(source_record)
-            
-            self.db.commit()
+            # 3. Queue the query, the answer and its source citations
+            await self._store_answer(query_row, validated_response)
             
-            # 8. Return response with query ID
-            validated_response.query_id = str(query_record.QueryID)
+            # 4. Return response with query ID
+            validated_response.query_id = str(query_id)
             return validated_response
-            
+        
         except Exception as e:
             logger.error(f"Error processing legal query: {str(e)}")
-            self.db.rollback()
             raise
     
-    async def _retrieve_context(self, query: str, max_sources: int = 5) -> List[Dict[str, Any]]:
+    async def _answer(self, query_request: AIQueryRequest) -> Optional[AIResponse]:
+        """
+        Answer a question from the answer cache, or by retrieval and a
+        provider call; None when no relevant source is found.
+        """
+        # Reuse the answer to a near-identical question
+        cache_key = await self._answer_cache_key(query_request)
+        cached = self.answer_cache.get(*cache_key) if cache_key is not None else None
+        if cached is not None:
+            return cached
+        
+        # Answers built on an index that changed meanwhile are not cached
+        index_version = self.vector_service.index_version
+        
+        # Retrieve relevant context using hybrid search
+        context_docs = await self._retrieve_context(
+            query_request.query,
+            max_sources=query_request.max_sources
+        )
+        # Give the connection back to the pool before the slow provider call
+        self.db.close()
+        if not context_docs:
+            return None
+        
+        # Build structured prompt with context and call the AI provider
+        prompt = self._build_rag_prompt(query_request.query, context_docs)
+        ai_response = await self._call_ai_provider(prompt)
+        
+        # Validate and process response
+        response = self._validate_response(ai_response, context_docs)
+        if cache_key is not None and self.vector_service.index_version == index_version:
+            self.answer_cache.put(*cache_key, response)
+        return response
+    
+    async def stream_legal_query(
+        self,
+        query_request: AIQueryRequest,
+        user_id: Optional[int] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
         """
-        Retrieve relevant legal context using simple text search (no vector search).
+        Process a legal query, yielding the answer while it is generated.
+        
+        Yields (event, data) pairs: one 'sources' event with the retrieved
+        citations, 'delta' events with answer text as the provider streams
+        it, then 'done' with the query ID, confidence and disclaimer, or
+        'error'. The query, the answer and its sources are queued for
+        writing once the stream has ended; nothing is stored if the client
+        disconnects before.
         """
         try:
-            # Simple text search instead of vector search
-            # Search in law articles for relevant content
-            articles = (
-                self.db.query(LawArticles)
-                .join(Laws, LawArticles.LawID == Laws.LawID)
-                .filter(
-                    LawArticles.Content.contains(query) |
-                    Laws.Title.contains(query) |
-                    Laws.LawNumber.contains(query)
-                )
-                .limit(max_sources)
-                .all()
-            )
+            query_id = await self.records.new_query_id()
+            query_row = self._query_row(query_id, query_request.query, user_id)
             
-            context_docs = []
-            for article in articles:
-                law = self.db.query(Laws).filter(Laws.LawID == article.LawID).first()
-                if law:
-                    context_docs.append({
-                        'law_id': law.LawID,
-                        'law_number': law.LawNumber,
-                        'law_title': law.Title,
-                        'article_id': article.ArticleID,
-                        'article_number': article.ArticleNumber,
-                        'content': article.Content,
-                        'relevance_score': 0.8,  # Default score for text match
-                    })
+            cache_key = await self._answer_cache_key(query_request)
+            cached = self.answer_cache.get(*cache_key) if cache_key is not None else None
+            index_version = self.vector_service.index_version
+            if cached is not None:
+                response = cached
+                yield "sources", {"sources": [source.model_dump() for source in response.sources]}
+                yield "delta", {"text": response.answer_text}
+            else:
+                context_docs = await self._retrieve_context(
+                    query_request.query,
+                    max_sources=query_request.max_sources
+                )
+                self.db.close()
+                if not context_docs:
+                    await self.records.submit(query_row)
+                    response = await self._create_no_context_response(query_id)
+                    yield "sources", {"sources": []}
+                    yield "delta", {"text": response.answer_text}
+                    yield "done", self._done_event(response)
+                    return
+                
+                yield "sources", {"sources": [source.model_dump() for source in self._sources(context_docs)]}
+                
+                prompt = self._build_rag_prompt(query_request.query, context_docs)
+                parts = []
+                # Closed at once if the client goes away, releasing the provider connection
+                async with contextlib.aclosing(self._stream_ai_provider(prompt)) as deltas:
+                    async for text in deltas:
+                        parts.append(text)
+                        yield "delta", {"text": text}
+                
+                response = self._validate_response(
+                    {"answer": "".join(parts), "confidence": 0.8},  # Default confidence
+                    context_docs,
+                )
             
-            return context_docs
+            await self._store_answer(query_row, response)
+            if cached is None and cache_key is not None and self.vector_service.index_version == index_version:
+                self.answer_cache.put(*cache_key, response)
             
+            response.query_id = str(query_id)
+            yield "done", self._done_event(response)
+        
+        except Exception as e:
+            logger.error(f"Error streaming legal query: {str(e)}")
+            yield "error", {"detail": f"AI query failed: {str(e)}"}
+    
+    @staticmethod
+    def _done_event(response: AIResponse) -> Dict[str, Any]:
+        """Closing event of a streamed answer."""
+        return {
+            "query_id": response.query_id,
+            "confidence": response.confidence,
+            "disclaimer": response.disclaimer,
+        }
+    
+    @staticmethod
+    def _query_row(query_id: int, query_text: str, user_id: Optional[int]) -> Dict[str, Any]:
+        """AIQueries row of a question."""
+        return {
+            'QueryID': query_id,
+            'UserID': user_id,
+            'QueryText': query_text,
+            'QueryDate': datetime.utcnow(),
+        }
+    
+    async def _store_answer(self, query_row: Dict[str, Any], response: AIResponse):
+        """Queue a query's row with its answer and source citations for writing."""
+        answer_row = {
+            'AnswerText': response.answer_text,
+            'ConfidenceScore': response.confidence,
+            'DisclaimerAdded': True,
+            'AnswerDate': datetime.utcnow(),
+        }
+        source_rows = [
+            {
+                'LawID': source.law_id,
+                'ArticleID': source.article_id,
+                'Excerpt': source.excerpt,
+                'RelevanceScore': source.score,
+            }
+            for source in response.sources
+        ]
+        await self.records.submit(query_row, answer_row, source_rows)
+    
+    async def _answer_cache_key(self, query_request: AIQueryRequest) -> Optional[Tuple[np.ndarray, str, int]]:
+        """
+        Answer cache lookup key of a question: its embedding, language and
+        number of sources, or None when the search index is unavailable.
+        """
+        if not self.answer_cache.max_size or not self.vector_service.is_available():
+            return None
+        try:
+            embeddings = await asyncio.to_thread(self.vector_service.encode_queries, [query_request.query])
+            return embeddings[0], detect_language(query_request.query), query_request.max_sources
+        except Exception as e:
+            logger.error(f"Error encoding question for the answer cache: {str(e)}")
+            return None
+    
+    async def _retrieve_context(self, query: str, max_sources: int = 5) -> List[Dict[str, Any]]:
+        """
+        Retrieve the law articles most relevant to a question.
+        
+        Articles are ranked by hybrid keyword + semantic search of the vector
+        index, then their law columns are read in one joined primary-key
+        query. Without a search index, a single joined keyword match of the
+        database is used instead.
+        
+        Args:
+            query: User question
+            max_sources: Maximum number of articles to return
+        
+        Returns:
+            Context documents, best first, with a relevance_score in [0, 1]
+        """
+        try:
+            if self.vector_service.is_available():
+                return await self._search_context(query, max_sources)
+            logger.warning("Search index not available, matching context by keywords")
+            return self._match_context(query, max_sources)
+        
         except Exception as e:
             logger.error(f"Error retrieving context: {str(e)}")
             return []
     
+    async def _search_context(self, query: str, max_sources: int) -> List[Dict[str, Any]]:
+        """
+        Context from hybrid search of the article passages.
+        
+        The fused rank score is scaled so that 1.0 is an article ranked first
+        by both the keyword and the semantic retriever; the matched passage,
+        not the whole article, is passed to the model.
+        """
+        results = await self.vector_service.hybrid_search(
+            query,
+            k=max_sources,
+            threshold=settings.vector_similarity_threshold,
+            filters={'type': 'law_article'},
+        )
+        hits = [result for result in results if result.get('article_id') is not None]
+        if not hits:
+            return []
+        
+        rows = (
+            self.db.query(
+                LawArticles.ArticleID,
+                LawArticles.ArticleNumber,
+                Laws.LawID,
+                Laws.LawNumber,
+                Laws.Title,
+            )
+            .join(Laws, LawArticles.LawID == Laws.LawID)
+            .filter(LawArticles.ArticleID.in_([hit['article_id'] for hit in hits]))
+            .all()
+        )
+        articles = {row.ArticleID: row for row in rows}
+        best = 2.0 / (settings.vector_rrf_k + 1)
+        
+        context_docs = []
+        for hit in hits:
+            row = articles.get(hit['article_id'])
+            if row is None:
+                # Indexed but since deleted from the database
+                continue
+            context_docs.append({
+                'law_id': row.LawID,
+                'law_number': row.LawNumber,
+                'law_title': row.Title,
+                'article_id': row.ArticleID,
+                'article_number': row.ArticleNumber,
+                'content': hit['content'],
+                'relevance_score': round(min(1.0, hit['score'] / best), 4),
+                'dense_score': hit.get('dense_score'),
+                'lexical_score': hit.get('lexical_score'),
+            })
+        return context_docs
+    
+    def _match_context(self, query: str, max_sources: int) -> List[Dict[str, Any]]:
+        """
+        Context matched by keywords in the database, scored by the share of
+        query terms each article contains.
+        """
+        terms = [term for term in dict.fromkeys(query.lower().split()) if len(term) > 2]
+        if not terms:
+            return []
+        
+        matches = [LawArticles.Content.contains(term) for term in terms]
+        matches += [Laws.Title.contains(term) for term in terms]
+        matches.append(Laws.LawNumber.contains(query))
+        rows = (
+            self.db.query(
+                LawArticles.ArticleID,
+                LawArticles.ArticleNumber,
+                LawArticles.Content,
+                Laws.LawID,
+                Laws.LawNumber,
+                Laws.Title,
+            )
+            .join(Laws, LawArticles.LawID == Laws.LawID)
+            .filter(or_(*matches))
+            .limit(max_sources * 10)
+            .all()
+        )
+        
+        context_docs = []
+        for row in rows:
+            text = f"{row.Title or ''} {row.Content or ''}".lower()
+            context_docs.append({
+                'law_id': row.LawID,
+                'law_number': row.LawNumber,
+                'law_title': row.Title,
+                'article_id': row.ArticleID,
+                'article_number': row.ArticleNumber,
+                'content': row.Content or '',
+                'relevance_score': round(sum(term in text for term in terms) / len(terms), 4),
+            })
+        context_docs.sort(key=lambda doc: -doc['relevance_score'])
+        return context_docs[:max_sources]
+    
     def _build_rag_prompt(self, query: str, context_docs: List[Dict[str, Any]]) -> str:
         """
         Build a structured prompt with retrieved context.
@@ -171,7 +378,7 @@ Content: {doc['content'][:500]}...
 Relevance: {doc['relevance_score']:.2f}
 
 """
-        
+
         prompt = f"""You are a legal assistant for Moroccan law. Answer the user's question based ONLY on the provided legal sources. 
 
 IMPORTANT RULES:
@@ -188,9 +395,35 @@ SOURCES:
 QUESTION: {query}
 
 ANSWER:"""
-        
+
         return prompt
     
+    def _provider_request(self, prompt: str) -> Dict[str, Any]:
+        """
+        Request parameters for the configured AI provider.
+        """
+        if self.provider == "openai":
+            return {
+                "model": "gpt-4",
+                "messages": [
+                    {"role": "system", "content": "You are a helpful legal assistant for Moroccan law."},
+                    {"role": "user", "content": prompt}
+                ],
+                "max_tokens": 1000,
+                "temperature": 0.1,
+            }
+        elif self.provider == "anthropic":
+            return {
+                "model": "claude-3-sonnet-20240229",
+                "max_tokens": 1000,
+                "temperature": 0.1,
+                "messages": [
+                    {"role": "user", "content": prompt}
+                ],
+            }
+        else:
+            raise Exception(f"Unsupported provider: {self.provider}")
+    
     async def _call_ai_provider(self, prompt: str) -> Dict[str, Any]:
         """
         Call the configured AI provider.
@@ -199,40 +432,51 @@ ANSWER:"""
             raise Exception("AI client not initialized")
         
         try:
+            request = self._provider_request(prompt)
             if self.provider == "openai":
-                response = await self.client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {"role": "system", "content": "You are a helpful legal assistant for Moroccan law."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=1000,
-                    temperature=0.1,
-                )
+                response = await self.client.chat.completions.create(**request)
                 return {
                     "answer": response.choices[0].message.content,
                     "confidence": 0.8,  # Default confidence
                 }
             
-            elif self.provider == "anthropic":
-                response = await self.client.messages.create(
-                    model="claude-3-sonnet-20240229",
-                    max_tokens=1000,
-                    temperature=0.1,
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ],
-                )
+            else:
+                response = await self.client.messages.create(**request)
                 return {
                     "answer": response.content[0].text,
                     "confidence": 0.8,  # Default confidence
                 }
+        
+        except Exception as e:
+            logger.error(f"Error calling AI provider: {str(e)}")
+            raise
+    
+    async def _stream_ai_provider(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Call the configured AI provider in streaming mode.
+        
+        Yields:
+            Answer text deltas, as the provider produces them
+        """
+        if not self.client:
+            raise Exception("AI client not initialized")
+        
+        try:
+            request = self._provider_request(prompt)
+            if self.provider == "openai":
+                stream = await self.client.chat.completions.create(**request, stream=True)
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
             
             else:
-                raise Exception(f"Unsupported provider: {self.provider}")
-                
+                stream = await self.client.messages.create(**request, stream=True)
+                async for event in stream:
+                    if event.type == "content_block_delta" and getattr(event.delta, "text", None):
+                        yield event.delta.text
+        
         except Exception as e:
-            logger.error(f"Error calling AI provider: {str(e)}")
+            logger.error(f"Error streaming from AI provider: {str(e)}")
             raise
     
     def _validate_response(
@@ -247,6 +491,22 @@ ANSWER:"""
         confidence = ai_response.get("confidence", 0.5)
         
         # Extract sources from the answer
+        sources = self._sources(context_docs)
+        
+        # Add disclaimer
+        disclaimer = "هذه المعلومات لأغراض إعلامية فقط. استشر النشرة الرسمية أو محامياً مرخصاً للحصول على المشورة القانونية. / Cette information est à des fins informatives uniquement. Consultez le Bulletin Officiel ou un avocat agréé pour des conseils juridiques. / This information is for informational purposes only. Consult the Official Bulletin or a licensed lawyer for legal advice."
+        
+        return AIResponse(
+            answer_text=answer_text,
+            confidence=confidence,
+            sources=sources,
+            disclaimer=disclaimer,
+        )
+    
+    def _sources(self, context_docs: List[Dict[str, Any]]) -> List[AISource]:
+        """
+        Source citations of the retrieved context.
+        """
         sources = []
         for doc in context_docs:
             source = AISource(
@@ -258,16 +518,7 @@ ANSWER:"""
                 article_number=doc['article_number'],
             )
             sources.append(source)
-        
-        # Add disclaimer
-        disclaimer = "هذه المعلومات لأغراض إعلامية فقط. استشر النشرة الرسمية أو محامياً مرخصاً للحصول على المشورة القانونية. / Cette information est à des fins informatives uniquement. Consultez le Bulletin Officiel ou un avocat agréé pour des conseils juridiques. / This information is for informational purposes only. Consult the Official Bulletin or a licensed lawyer for legal advice."
-        
-        return AIResponse(
-            answer_text=answer_text,
-            confidence=confidence,
-            sources=sources,
-            disclaimer=disclaimer,
-        )
+        return sources
     
     async def _create_no_context_response(self, query_id: int) -> AIResponse:
         """
@@ -290,8 +541,16 @@ ANSWER:"""
     ) -> Dict[str, Any]:
         """
         Submit feedback on an AI response.
+        
+        Raises:
+            RecordsPendingError: If the query's records are still being written
         """
         try:
+            # The query's rows are written behind its response
+            query_id = feedback_request.query_id
+            if query_id.isdigit() and not await self.records.wait_written(query_id=int(query_id)):
+                raise RecordsPendingError(f"Query {query_id} is still being saved")
+            
             # Find the query
             query = self.db.query(AIQueries).filter(
                 AIQueries.QueryID == feedback_request.query_id
@@ -325,7 +584,7 @@ ANSWER:"""
                 "status": "submitted",
                 "message": "Feedback submitted successfully",
             }
-            
+        
         except Exception as e:
             logger.error(f"Error submitting feedback: {str(e)}")
             self.db.rollback()
@@ -338,9 +597,12 @@ ANSWER:"""
         page_size: int = 20
     ) -> Dict[str, Any]:
         """
-        Get user's query history.
+        Get user's query history, including questions whose records are
+        still being written.
         """
         try:
+            if not await self.records.wait_written(user_id=user_id):
+                logger.warning(f"Query history of user {user_id} served while some queries are still being saved")
             queries = (
                 self.db.query(AIQueries)
                 .filter(AIQueries.UserID == user_id)
@@ -371,7 +633,7 @@ ANSWER:"""
                 "page": page,
                 "page_size": page_size,
             }
-            
+        
         except Exception as e:
             logger.error(f"Error getting query history: {str(e)}")
             raise
@@ -406,8 +668,12 @@ ANSWER:"""
                 "total_answers": total_answers,
                 "average_confidence": round(avg_confidence, 2),
                 "feedback_counts": feedback_counts,
+                "answer_cache": self.answer_cache.stats(),
+                "provider_gateway": self.gateway.stats(),
+                "coalescing": _in_flight_answers.stats(),
+                "write_behind": self.records.stats(),
             }
-            
+        
         except Exception as e:
             logger.error(f"Error getting AI statistics: {str(e)}")
             raise
@@ -0,0 +1,212 @@
+"""
+Answer Cache - Reuses AI answers for near-identical legal questions.
+Questions are compared by their embedding in the search index's space; an
+answer is kept until one of the laws or articles it cites changes.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from src.core.settings import settings
+from src.schemas.legal import AIResponse
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    Semantic cache of AI responses.
+    
+    A question reuses a cached answer when its embedding is within the
+    similarity threshold of the cached question's, in the same language
+    and with the same number of sources. Entries are evicted least recently
+    used first, expire after ttl_seconds and are dropped when a law or
+    article they cite is added, changed or removed in the search index.
+    Safe to share between the event loop and worker threads.
+    """
+    
+    def __init__(self, max_size: int, threshold: float, ttl_seconds: float = 0, dimension: Optional[int] = None):
+        self.max_size = max(0, max_size)
+        self.threshold = threshold
+        # 0 disables expiry
+        self.ttl = max(0.0, ttl_seconds)
+        # One row per slot; free slots are zero and never reach the threshold
+        self._embeddings = np.zeros((self.max_size, dimension or settings.vector_dimension), dtype=np.float32)
+        self._free: List[int] = list(range(self.max_size - 1, -1, -1))
+        # Slot -> entry, least recently used first
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        # Cited law / article ID -> slots of the answers citing it
+        self._by_law: Dict[int, Set[int]] = {}
+        self._by_article: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, embedding: np.ndarray, language: str, max_sources: int) -> Optional[AIResponse]:
+        """
+        Cached answer to a question similar to the embedded one, or None.
+        
+        Args:
+            embedding: L2-normalized query embedding
+            language: Language of the question (see detect_language)
+            max_sources: Sources requested with the question
+        
+        Returns:
+            A copy of the cached response, without a query ID
+        """
+        if not self.max_size:
+            return None
+        with self._lock:
+            scores = self._embeddings @ embedding
+            for slot in np.argsort(-scores):
+                if scores[slot] < self.threshold:
+                    break
+                entry = self._entries.get(int(slot))
+                if entry is None or entry['language'] != language or entry['max_sources'] != max_sources:
+                    continue
+                if self.ttl and time.monotonic() - entry['created'] > self.ttl:
+                    self._drop(int(slot))
+                    continue
+                self._entries.move_to_end(int(slot))
+                self.hits += 1
+                return entry['response'].model_copy(deep=True, update={'query_id': None})
+            self.misses += 1
+            return None
+    
+    def put(self, embedding: np.ndarray, language: str, max_sources: int, response: AIResponse):
+        """Store an answer, evicting the least recently used one beyond max_size."""
+        if not self.max_size:
+            return
+        law_ids = {source.law_id for source in response.sources}
+        article_ids = {source.article_id for source in response.sources if source.article_id is not None}
+        with self._lock:
+            if not self._free:
+                self._drop(next(iter(self._entries)))
+            slot = self._free.pop()
+            self._embeddings[slot] = embedding
+            self._entries[slot] = {
+                'response': response.model_copy(deep=True, update={'query_id': None}),
+                'language': language,
+                'max_sources': max_sources,
+                'law_ids': law_ids,
+                'article_ids': article_ids,
+                'created': time.monotonic(),
+            }
+            for law_id in law_ids:
+                self._by_law.setdefault(law_id, set()).add(slot)
+            for article_id in article_ids:
+                self._by_article.setdefault(article_id, set()).add(slot)
+    
+    def _drop(self, slot: int):
+        """Remove one entry. Caller must hold the lock."""
+        entry = self._entries.pop(slot)
+        self._embeddings[slot] = 0.0
+        self._free.append(slot)
+        for index, ids in ((self._by_law, entry['law_ids']), (self._by_article, entry['article_ids'])):
+            for cited in ids:
+                slots = index.get(cited)
+                if slots is not None:
+                    slots.discard(slot)
+                    if not slots:
+                        del index[cited]
+    
+    def invalidate(self, law_ids: Iterable[int] = (), article_ids: Iterable[int] = ()) -> int:
+        """
+        Drop the answers citing any of the given laws or articles.
+        
+        Returns:
+            Number of answers dropped
+        """
+        with self._lock:
+            slots: Set[int] = set()
+            for law_id in law_ids:
+                slots.update(self._by_law.get(law_id, ()))
+            for article_id in article_ids:
+                slots.update(self._by_article.get(article_id, ()))
+            for slot in slots:
+                self._drop(slot)
+            self.invalidated += len(slots)
+            return len(slots)
+    
+    def documents_changed(self, doc_ids: Optional[List[str]]):
+        """
+        Search index change listener.
+        
+        Args:
+            doc_ids: Indexed documents added, replaced or removed
+                ('law_12', 'article_340'); None when the whole index was rebuilt
+        """
+        if doc_ids is None:
+            self.clear()
+            return
+        law_ids, article_ids = [], []
+        for doc_id in doc_ids:
+            kind, _, number = str(doc_id).rpartition('_')
+            if not number.isdigit():
+                continue
+            if kind == 'law':
+                law_ids.append(int(number))
+            elif kind == 'article':
+                article_ids.append(int(number))
+        if law_ids or article_ids:
+            dropped = self.invalidate(law_ids, article_ids)
+            if dropped:
+                logger.info(f"Dropped {dropped} cached AI answers citing changed laws or articles")
+    
+    def clear(self):
+        """Drop every entry; counters are kept."""
+        with self._lock:
+            self.invalidated += len(self._entries)
+            for slot in list(self._entries):
+                self._drop(slot)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit counters for this process."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidated": self.invalidated,
+        }
+
+
+_shared_cache: Optional[AnswerCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """
+    Return the process-wide answer cache, creating it on first use.
+    
+    The cache listens to the shared search index, so answers are dropped
+    as soon as a law or article they cite is re-indexed or removed.
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                from src.services.vector_service import get_vector_service
+                
+                cache = AnswerCache(
+                    settings.ai_answer_cache_size,
+                    settings.ai_answer_cache_threshold,
+                    settings.ai_answer_cache_ttl_seconds,
+                )
+                get_vector_service().add_change_listener(cache.documents_changed)
+                _shared_cache = cache
+    return _shared_cache
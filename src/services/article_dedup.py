@@ -0,0 +1,272 @@
+"""
+Article Deduplication - Finds near-duplicate law articles in the vector index.
+Texts republished or lightly amended across Bulletin Officiel issues produce
+near-identical LawArticles rows. They are clustered by embedding similarity,
+linked to one canonical article in the database, and can be dropped from the
+serving index.
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from sqlalchemy.orm import Session
+
+from src.core.settings import settings
+from src.db.models.legal import ArticleDuplicates
+from src.services.vector_eval import index_memory
+from src.services.vector_service import VectorService
+
+logger = logging.getLogger(__name__)
+
+# Articles searched per FAISS call by the duplicate scan
+SCAN_BATCH_SIZE = 4096
+
+# IDs per IN (...) list, below SQL Server's 2100 parameter limit
+DELETE_CHUNK_SIZE = 1000
+
+
+def article_vectors(service: VectorService) -> Tuple[np.ndarray, List[Dict[str, Any]], np.ndarray]:
+    """
+    One vector per indexed article: the normalized mean of its passage vectors.
+    
+    Returns:
+        Tuple of (vectors, metadata of each article's first passage, passages per article)
+    """
+    vectors, ids = service.live_vectors()
+    documents = service.metadata.get_many(ids.tolist())
+    
+    rows: Dict[str, List[int]] = {}
+    first: Dict[str, Dict[str, Any]] = {}
+    for position, vector_id in enumerate(ids.tolist()):
+        metadata = documents.get(vector_id)
+        if metadata is None or metadata.get('article_id') is None or metadata['type'] != 'law_article':
+            continue
+        parent = metadata.get('parent_id') or metadata['id']
+        rows.setdefault(parent, []).append(position)
+        if not metadata.get('chunk'):
+            first[parent] = metadata
+        else:
+            first.setdefault(parent, metadata)
+    
+    matrix = np.empty((len(rows), vectors.shape[1]), dtype=np.float32)
+    for i, positions in enumerate(rows.values()):
+        matrix[i] = vectors[positions].mean(axis=0)
+    faiss.normalize_L2(matrix)
+    passages = np.array([len(positions) for positions in rows.values()], dtype=np.int64)
+    return matrix, [first[parent] for parent in rows], passages
+
+
+def similar_pairs(
+    service: VectorService,
+    vectors: np.ndarray,
+    threshold: float,
+    neighbors: int,
+    batch_size: int = SCAN_BATCH_SIZE,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pairs of rows whose cosine similarity reaches the threshold.
+    
+    The rows are indexed with the family the service would pick for their
+    count (exact up to vector_flat_max_vectors, ANN above) and searched in
+    batches for their nearest neighbours, so the scan never holds more than
+    one batch of results.
+    
+    Returns:
+        Arrays (i, j, similarity) with i < j
+    """
+    n = len(vectors)
+    if n < 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    
+    index = service.build_index(vectors, np.arange(n, dtype=np.int64), quantization="none")
+    k = min(neighbors + 1, n)
+    left, right, similarity = [], [], []
+    for start in range(0, n, batch_size):
+        scores, labels = index.search(vectors[start:start + batch_size], k)
+        rows = np.arange(start, start + len(labels))[:, None]
+        # Each pair once, never an article with itself
+        matches = (scores >= threshold) & (labels > rows)
+        row, column = np.nonzero(matches)
+        left.append(row + start)
+        right.append(labels[row, column])
+        similarity.append(scores[row, column])
+    return np.concatenate(left), np.concatenate(right), np.concatenate(similarity)
+
+
+def _components(n: int, left: np.ndarray, right: np.ndarray) -> List[List[int]]:
+    """Connected components of the similarity graph with at least two members."""
+    parent = list(range(n))
+    
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    for i, j in zip(left.tolist(), right.tolist()):
+        a, b = root(i), root(j)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+    
+    groups: Dict[int, List[int]] = {}
+    for i in range(n):
+        groups.setdefault(root(i), []).append(i)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def _canonical_rank(article: Dict[str, Any]) -> Tuple[str, int]:
+    """Most recently published first (the text in force), then the lowest article ID."""
+    return article.get('publication_date') or '', -article['article_id']
+
+
+def _clusters(
+    vectors: np.ndarray,
+    articles: List[Dict[str, Any]],
+    left: np.ndarray,
+    right: np.ndarray,
+    threshold: float,
+) -> List[Tuple[int, List[int]]]:
+    """
+    Clusters as stars around their canonical article.
+    
+    Components of the similarity graph can chain articles that are not
+    near-duplicates of each other (A~B and B~C while A and C are apart),
+    so each component is split: in canonical order, an unassigned article
+    becomes canonical and takes every unassigned member whose own
+    similarity to it reaches the threshold.
+    
+    Returns:
+        (canonical, duplicates) of the clusters with at least one duplicate
+    """
+    clusters = []
+    for members in _components(len(articles), left, right):
+        pending = sorted(members, key=lambda i: _canonical_rank(articles[i]), reverse=True)
+        while len(pending) > 1:
+            canonical, rest = pending[0], np.array(pending[1:])
+            close = vectors[rest] @ vectors[canonical] >= threshold
+            if close.any():
+                clusters.append((canonical, rest[close].tolist()))
+            pending = rest[~close].tolist()
+    return clusters
+
+
+def find_duplicates(
+    service: VectorService,
+    threshold: Optional[float] = None,
+    neighbors: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Cluster near-duplicate articles of one vector index.
+    
+    Within a cluster the most recently published article is canonical
+    (the text in force), ties going to the lowest article ID; every other
+    member is a duplicate of it, at least threshold-similar to it.
+    
+    Args:
+        service: Vector service whose index is scanned
+        threshold: Minimum cosine similarity (default: settings.vector_dedup_threshold)
+        neighbors: Neighbours examined per article (default: settings.vector_dedup_neighbors)
+    
+    Returns:
+        Report with the duplicate links and the memory they take in the index
+    """
+    threshold = settings.vector_dedup_threshold if threshold is None else threshold
+    neighbors = neighbors or settings.vector_dedup_neighbors
+    
+    vectors, articles, passages = article_vectors(service)
+    left, right, _ = similar_pairs(service, vectors, threshold, neighbors)
+    clusters = _clusters(vectors, articles, left, right, threshold)
+    
+    links = []
+    duplicate_vectors = 0
+    for canonical, duplicates in clusters:
+        for i in duplicates:
+            links.append({
+                'article_id': articles[i]['article_id'],
+                'canonical_article_id': articles[canonical]['article_id'],
+                'similarity': round(float(vectors[i] @ vectors[canonical]), 4),
+            })
+            duplicate_vectors += int(passages[i])
+    
+    memory = index_memory(service, service.index)
+    saved = int(duplicate_vectors * memory["bytes_per_vector"])
+    logger.info(
+        f"Found {len(links)} near-duplicate articles in {len(clusters)} clusters "
+        f"among {len(articles)} articles (threshold {threshold})"
+    )
+    return {
+        "articles": len(articles),
+        "threshold": threshold,
+        "neighbors": neighbors,
+        "clusters": len(clusters),
+        "largest_cluster": max((1 + len(duplicates) for _, duplicates in clusters), default=0),
+        "duplicates": len(links),
+        "duplicate_vectors": duplicate_vectors,
+        "memory": {
+            **memory,
+            "duplicate_bytes": saved,
+            "duplicate_share": round(saved / memory["resident_bytes"], 4) if memory["resident_bytes"] else 0.0,
+        },
+        "links": links,
+        "scanned_article_ids": [article['article_id'] for article in articles],
+    }
+
+
+def save_duplicate_links(db: Session, links: List[Dict[str, Any]], scanned_article_ids: List[int]) -> int:
+    """
+    Replace the recorded links of the scanned articles with a fresh scan's.
+    
+    Links of articles absent from the index, such as duplicates already
+    pruned from it, are kept.
+    
+    Returns:
+        Number of links stored
+    """
+    detected = datetime.utcnow()
+    for start in range(0, len(scanned_article_ids), DELETE_CHUNK_SIZE):
+        chunk = scanned_article_ids[start:start + DELETE_CHUNK_SIZE]
+        db.query(ArticleDuplicates).filter(ArticleDuplicates.ArticleID.in_(chunk)).delete(synchronize_session=False)
+    db.bulk_insert_mappings(ArticleDuplicates, [
+        {
+            'ArticleID': link['article_id'],
+            'CanonicalArticleID': link['canonical_article_id'],
+            'Similarity': link['similarity'],
+            'DetectedDate': detected,
+        }
+        for link in links
+    ])
+    db.commit()
+    return len(links)
+
+
+def duplicate_article_ids(db: Session) -> List[int]:
+    """IDs of the articles recorded as duplicates."""
+    return [row[0] for row in db.query(ArticleDuplicates.ArticleID).all()]
+
+
+async def prune_duplicates(service: VectorService, article_ids: List[int]) -> Dict[str, Any]:
+    """
+    Drop duplicate articles from the serving index and compact it.
+    
+    Args:
+        service: Vector service (or one shard) to prune
+        article_ids: Articles to remove, e.g. duplicate_article_ids(db)
+    
+    Returns:
+        Index memory before and after, and the vectors removed
+    """
+    before = index_memory(service, service.index)
+    removed = await service.remove_documents([f"article_{article_id}" for article_id in article_ids])
+    if removed:
+        await service.compact_index()
+    after = index_memory(service, service.index)
+    return {
+        "removed_vectors": removed,
+        "resident_bytes_before": before["resident_bytes"],
+        "resident_bytes_after": after["resident_bytes"],
+        "saved_bytes": before["resident_bytes"] - after["resident_bytes"],
+    }
@@ -0,0 +1,97 @@
+"""
+Chunking - Splits long legal texts into overlapping passages for embedding.
+Sentence encoders truncate their input (MiniLM at 128 word pieces), so a
+long article is indexed as several passages that each fit the model.
+"""
+
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+WORD = re.compile(r"\S+")
+
+
+def chunk_id(parent_id: str, chunk: int) -> str:
+    """Index document ID of a passage of a parent document."""
+    return f"{parent_id}#{chunk}"
+
+
+class PassageChunker:
+    """
+    Token-bounded passage splitter with overlap.
+    
+    Passages are cut on word boundaries. Word lengths are measured with the
+    encoder's own tokenizer when one is given, so a passage never exceeds
+    what the model reads; otherwise they are estimated from characters.
+    """
+    
+    def __init__(self, max_tokens: int, overlap_tokens: int, tokenizer: Optional[Any] = None):
+        self.max_tokens = max(8, max_tokens)
+        # Overlap must leave room for progress
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        self.tokenizer = tokenizer
+    
+    def _token_counts(self, words: List[str]) -> List[int]:
+        """Word-piece count of every word."""
+        if self.tokenizer is not None:
+            try:
+                encoded = self.tokenizer(words, add_special_tokens=False)["input_ids"]
+                return [max(1, len(ids)) for ids in encoded]
+            except Exception:
+                pass
+        # Roughly one word piece per four characters
+        return [len(word) // 4 + 1 for word in words]
+    
+    def split(self, text: str) -> List[str]:
+        """
+        Split text into passages of at most max_tokens word pieces.
+        
+        Consecutive passages share about overlap_tokens word pieces, so a
+        sentence cut at a boundary is still seen whole by one passage.
+        """
+        matches = list(WORD.finditer(text or ""))
+        if not matches:
+            return []
+        
+        counts = self._token_counts([match.group() for match in matches])
+        if sum(counts) <= self.max_tokens:
+            return [text.strip()]
+        
+        passages = []
+        start = 0
+        while start < len(matches):
+            end = start
+            total = 0
+            # Always take at least one word, even one longer than max_tokens
+            while end < len(matches) and (end == start or total + counts[end] <= self.max_tokens):
+                total += counts[end]
+                end += 1
+            passages.append(text[matches[start].start():matches[end - 1].end()])
+            if end == len(matches):
+                break
+            
+            # Step back over trailing words worth about overlap_tokens
+            back = end
+            overlap = 0
+            while back - 1 > start and overlap + counts[back - 1] <= self.overlap_tokens:
+                back -= 1
+                overlap += counts[back]
+            start = back
+        
+        return passages
+    
+    def chunk_documents(self, documents: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Expand index documents into one document per passage.
+        
+        Each passage keeps its parent's fields, gets ID '<parent id>#<n>',
+        and links back through 'parent_id' and 'chunk'.
+        """
+        for doc in documents:
+            for n, passage in enumerate(self.split(doc['text'])):
+                yield {
+                    **doc,
+                    'id': chunk_id(doc['id'], n),
+                    'text': passage,
+                    'parent_id': doc['id'],
+                    'chunk': n,
+                }
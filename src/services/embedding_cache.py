@@ -0,0 +1,188 @@
+"""
+Embedding Cache - Persistent, content-addressed store of document embeddings.
+Lets index rebuilds re-encode only the texts that changed since the last build.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normalise text before hashing so formatting-only edits still hit the cache."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_key(text: str) -> int:
+    """64-bit content hash of the normalised text."""
+    digest = hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model name, normalised text hash).
+    
+    Each model gets its own directory holding two append-only files:
+    ``keys.u64`` (one uint64 hash per row) and ``vectors.f32`` (one float32
+    row of ``dimension`` values per key). Vectors are memory-mapped, keys
+    are kept as a sorted array, so lookups are binary searches and the
+    cache never holds per-entry Python objects.
+    """
+    
+    def __init__(self, root: Path, model_name: str, dimension: int, max_pending: int = 50000):
+        self.dimension = dimension
+        # Queued embeddings are flushed to disk once this many accumulate
+        self.max_pending = max_pending
+        self.directory = Path(root) / re.sub(r"[^A-Za-z0-9._-]+", "_", model_name)
+        self.keys_path = self.directory / "keys.u64"
+        self.vectors_path = self.directory / "vectors.f32"
+        
+        self.hits = 0
+        self.misses = 0
+        
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._sorted_keys = np.empty(0, dtype=np.uint64)
+        self._sorted_rows = np.empty(0, dtype=np.int64)
+        self._vectors = np.empty((0, dimension), dtype=np.float32)
+        self._pending_keys: List[int] = []
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_rows = {}
+    
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._sorted_keys) + len(self._pending_keys)
+    
+    def _ensure_loaded(self):
+        """Map the cache files on first use."""
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+    
+    def _load(self):
+        """Read the key file and memory-map the vectors."""
+        if not self.keys_path.exists() or not self.vectors_path.exists():
+            return
+        
+        row_bytes = self.dimension * 4
+        # A crash between the two appends leaves one file longer; ignore the tail
+        rows = min(self.keys_path.stat().st_size // 8, self.vectors_path.stat().st_size // row_bytes)
+        if rows == 0:
+            return
+        
+        keys = np.fromfile(self.keys_path, dtype=np.uint64, count=rows)
+        order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[order]
+        self._sorted_rows = order.astype(np.int64)
+        self._vectors = np.memmap(
+            self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimension)
+        )
+        logger.info(f"Loaded embedding cache with {rows} entries from {self.directory}")
+    
+    def _drop_torn_tail(self):
+        """Trim rows left by an interrupted flush so both files stay aligned."""
+        rows = len(self._sorted_keys)
+        for path, row_bytes in ((self.keys_path, 8), (self.vectors_path, self.dimension * 4)):
+            if path.exists() and path.stat().st_size != rows * row_bytes:
+                os.truncate(path, rows * row_bytes)
+    
+    def lookup(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fetch cached embeddings.
+        
+        Args:
+            keys: uint64 text hashes
+        
+        Returns:
+            Tuple of (embeddings with zero rows for misses, indices of the misses)
+        """
+        self._ensure_loaded()
+        embeddings = np.zeros((len(keys), self.dimension), dtype=np.float32)
+        found = np.zeros(len(keys), dtype=bool)
+        
+        with self._lock:
+            if len(self._sorted_keys):
+                pos = np.searchsorted(self._sorted_keys, keys)
+                pos = np.minimum(pos, len(self._sorted_keys) - 1)
+                found = self._sorted_keys[pos] == keys
+                if found.any():
+                    embeddings[found] = self._vectors[self._sorted_rows[pos[found]]]
+            
+            for i in np.flatnonzero(~found):
+                pending = self._pending_rows.get(int(keys[i]))
+                if pending is not None:
+                    embeddings[i] = self._pending_vectors[pending]
+                    found[i] = True
+        
+        missing = np.flatnonzero(~found)
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        return embeddings, missing
+    
+    def put(self, keys: np.ndarray, embeddings: np.ndarray):
+        """Queue new embeddings; they are written to disk by flush() or once max_pending is reached."""
+        self._ensure_loaded()
+        with self._lock:
+            for key, embedding in zip(keys.tolist(), embeddings):
+                if key in self._pending_rows:
+                    continue
+                self._pending_rows[key] = len(self._pending_vectors)
+                self._pending_keys.append(key)
+                self._pending_vectors.append(np.asarray(embedding, dtype=np.float32))
+            should_flush = len(self._pending_keys) >= self.max_pending
+        
+        if should_flush:
+            self.flush()
+    
+    def flush(self):
+        """
+        Append queued embeddings to the cache files and remap them.
+        
+        The new keys are merged into the sorted key array, so a flush costs
+        the size of the flushed batch plus one copy of that array, never a
+        re-read and re-sort of the key file.
+        """
+        with self._lock:
+            if not self._pending_keys:
+                return
+            
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._drop_torn_tail()
+            keys = np.asarray(self._pending_keys, dtype=np.uint64)
+            # Vectors first: a key without its vector is dropped on the next load
+            with open(self.vectors_path, "ab") as f:
+                np.stack(self._pending_vectors).astype(np.float32).tofile(f)
+            with open(self.keys_path, "ab") as f:
+                keys.tofile(f)
+            
+            rows = len(self._sorted_keys)
+            written = len(keys)
+            order = np.argsort(keys, kind="stable")
+            positions = np.searchsorted(self._sorted_keys, keys[order], side="right")
+            self._sorted_keys = np.insert(self._sorted_keys, positions, keys[order])
+            self._sorted_rows = np.insert(self._sorted_rows, positions, rows + order)
+            self._vectors = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(rows + written, self.dimension)
+            )
+            self._pending_keys = []
+            self._pending_vectors = []
+            self._pending_rows = {}
+        
+        logger.info(f"Flushed {written} new embeddings to cache")
+    
+    def stats(self) -> dict:
+        """Cumulative hit/miss counters for this process."""
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses}
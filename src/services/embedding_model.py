@@ -0,0 +1,233 @@
+"""
+Embedding Model - Loads the sentence encoder behind VectorService.
+settings.vector_model names either a sentence-transformers model (PyTorch)
+or a local directory holding an ONNX export of one, typically int8
+quantized (see scripts/export_onnx_encoder.py), which loads in a fraction
+of the time and encodes faster on CPU.
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Files of an exported encoder directory; the quantized model is preferred
+ONNX_MODEL_FILES = ("model_quantized.onnx", "model.onnx")
+ENCODER_CONFIG_FILE = "encoder_config.json"
+TOKENIZER_FILE = "tokenizer.json"
+
+# Sentences encoded by the parity check: legal wording in the corpus languages
+PARITY_TEXTS = [
+    "Loi n° 01-23 relative à l'organisation des élections communales.",
+    "Le contribuable est tenu de déposer sa déclaration de revenu avant le 1er mars.",
+    "Tout licenciement abusif ouvre droit à une indemnité au profit du salarié.",
+    "Les permis de construire sont délivrés par le président du conseil communal.",
+    "Quelles sont les conditions pour obtenir une carte d'identité nationale ?",
+    "القانون المتعلق بانتخاب أعضاء مجالس الجماعات الترابية",
+    "يعاقب بغرامة كل من أخل بالتزامات التصريح الضريبي",
+    "ما هي شروط الحصول على رخصة البناء؟",
+    "The employer must notify the labour inspectorate of any workplace accident.",
+    "Value added tax applies to sales of goods and services within the territory.",
+    "Article 12 : Les dispositions du présent décret entrent en vigueur dès sa publication.",
+    "Le ministère de la santé fixe la liste des médicaments remboursables.",
+]
+
+
+def is_onnx_model(name: str) -> bool:
+    """Whether a model name points at an exported ONNX encoder (directory or .onnx file)."""
+    path = Path(name)
+    if path.suffix == ".onnx":
+        return path.is_file()
+    return path.is_dir() and any((path / file).is_file() for file in ONNX_MODEL_FILES)
+
+
+class _TokenCounter:
+    """
+    Minimal stand-in for a Hugging Face tokenizer call, as used by
+    PassageChunker: tokenizer(texts, add_special_tokens=False)["input_ids"].
+    """
+    
+    def __init__(self, tokenizer: "Tokenizer"):
+        self._tokenizer = tokenizer
+    
+    def __call__(self, texts: List[str], add_special_tokens: bool = True) -> Dict[str, List[List[int]]]:
+        encodings = self._tokenizer.encode_batch(texts, add_special_tokens=add_special_tokens)
+        return {"input_ids": [encoding.ids for encoding in encodings]}
+
+
+class OnnxEncoder:
+    """
+    Sentence encoder running an exported transformer with ONNX Runtime.
+    
+    Tokenisation uses the model's fast tokenizer file and pooling is done in
+    NumPy, so neither PyTorch nor transformers is imported. Exposes the part
+    of the SentenceTransformer interface VectorService uses: encode(),
+    max_seq_length and tokenizer.
+    """
+    
+    def __init__(self, path: Path, threads: int = 0):
+        if not ONNX_AVAILABLE:
+            raise ImportError("onnxruntime and tokenizers are required for ONNX encoders")
+        
+        path = Path(path)
+        directory = path.parent if path.suffix == ".onnx" else path
+        if path.suffix == ".onnx":
+            model_file = path
+        else:
+            model_file = next(directory / file for file in ONNX_MODEL_FILES if (directory / file).is_file())
+        
+        config_path = directory / ENCODER_CONFIG_FILE
+        config = json.loads(config_path.read_text(encoding="utf-8")) if config_path.exists() else {}
+        self.max_seq_length = config.get("max_seq_length", 128)
+        self.pooling = config.get("pooling", "mean")
+        self.normalize = config.get("normalize", False)
+        self.source_model = config.get("source_model")
+        self.model_file = model_file
+        
+        self._tokenizer = Tokenizer.from_file(str(directory / TOKENIZER_FILE))
+        self._tokenizer.enable_truncation(self.max_seq_length)
+        self._tokenizer.enable_padding(
+            pad_id=config.get("pad_token_id", 0),
+            pad_token=config.get("pad_token", "[PAD]"),
+        )
+        # Token counting for passage chunking must not pad or truncate
+        self.tokenizer = _TokenCounter(Tokenizer.from_file(str(directory / TOKENIZER_FILE)))
+        
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self._session = onnxruntime.InferenceSession(
+            str(model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+        self.dimension = config.get("dimension") or self._session.get_outputs()[0].shape[-1]
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        """Size of the embeddings, as in SentenceTransformer."""
+        return self.dimension
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Run one padded batch through the model and pool the token states."""
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feed["token_type_ids"] = np.zeros_like(input_ids)
+        
+        hidden = self._session.run(None, feed)[0]
+        if self.pooling == "cls":
+            return hidden[:, 0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        if self.pooling == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """
+        Encode texts into float32 sentence embeddings, like SentenceTransformer.encode.
+        
+        Texts are batched by length so that little compute goes to padding.
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        embeddings = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            positions = order[start:start + batch_size]
+            embeddings[positions] = self._encode_batch([texts[i] for i in positions])
+        
+        if self.normalize:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+
+def load_encoder(name: str, threads: int = 0):
+    """
+    Load the sentence encoder named by settings.vector_model.
+    
+    Args:
+        name: Exported ONNX encoder directory/file, or a sentence-transformers model name
+        threads: CPU threads for inference (0 = library default)
+    """
+    if is_onnx_model(name):
+        encoder = OnnxEncoder(Path(name), threads=threads)
+        logger.info(f"Loaded ONNX encoder {encoder.model_file}")
+        return encoder
+    
+    # Imported here so that ONNX deployments never load PyTorch
+    if threads:
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name)
+
+
+def parity_report(
+    reference: Any,
+    candidate: Any,
+    texts: Optional[List[str]] = None,
+    tolerance: float = 0.05,
+) -> Dict[str, Any]:
+    """
+    Compare two encoders on the same texts.
+    
+    Checks that each text's embeddings point the same way (cosine of the
+    two encodings) and that similarities between texts, which is what search
+    ranks by, differ by at most the tolerance.
+    
+    Args:
+        reference: Encoder to match (e.g. the PyTorch SentenceTransformer)
+        candidate: Encoder under test (e.g. the quantized ONNX export)
+        texts: Texts to encode (default: PARITY_TEXTS)
+        tolerance: Largest accepted difference in cosine similarity
+    
+    Returns:
+        Report with 'passed' and the measured deviations
+    """
+    texts = texts or PARITY_TEXTS
+    
+    def normalized(encoder) -> np.ndarray:
+        embeddings = np.asarray(encoder.encode(texts, show_progress_bar=False), dtype=np.float32)
+        return embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+    
+    expected = normalized(reference)
+    actual = normalized(candidate)
+    self_cosine = (expected * actual).sum(axis=1)
+    similarity_error = np.abs(expected @ expected.T - actual @ actual.T)
+    
+    # Nearest other text under each encoder
+    expected_sim = expected @ expected.T
+    actual_sim = actual @ actual.T
+    np.fill_diagonal(expected_sim, -np.inf)
+    np.fill_diagonal(actual_sim, -np.inf)
+    neighbour_agreement = float(np.mean(expected_sim.argmax(axis=1) == actual_sim.argmax(axis=1)))
+    
+    return {
+        "texts": len(texts),
+        "min_cosine": round(float(self_cosine.min()), 5),
+        "mean_cosine": round(float(self_cosine.mean()), 5),
+        "max_similarity_error": round(float(similarity_error.max()), 5),
+        "mean_similarity_error": round(float(similarity_error.mean()), 5),
+        "nearest_neighbour_agreement": round(neighbour_agreement, 4),
+        "tolerance": tolerance,
+        "passed": bool(self_cosine.min() >= 1 - tolerance and similarity_error.max() <= tolerance),
+    }
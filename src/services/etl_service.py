@@ -16,7 +16,8 @@ from sqlalchemy.orm import Session
 from src.core.settings import settings
 from src.db.models.legal import LawIssues, Laws, LawArticles
 from src.db.models.system import ETLJobs
-from src.services.vector_service import VectorService
+from src.services.vector_documents import article_document, law_document
+from src.services.vector_service import get_vector_service
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +27,7 @@ class ETLService:
     
     def __init__(self, db: Session):
         self.db = db
-        self.vector_service = VectorService()
+        self.vector_service = get_vector_service()
         self.data_dir = Path("data")
         self.raw_dir = self.data_dir / "raw"
         self.raw_dir.mkdir(parents=True, exist_ok=True)
@@ -165,36 +166,30 @@ class ETLService:
                 self.db.add(law)
                 self.db.flush()
                 
-                # Create articles
-                for article_data in law_data.get("articles", []):
-                    article = LawArticles(
+                # Create articles; one flush per law assigns their IDs
+                articles = [
+                    LawArticles(
                         LawID=law.LawID,
                         ArticleNumber=article_data.get("article_number"),
                         Content=article_data.get("content", ""),
                         Keywords=article_data.get("keywords"),
                     )
-                    self.db.add(article)
-                    
-                    # Prepare for vector indexing
-                    if article_data.get("content"):
-                        documents_for_vector.append({
-                            'id': f"article_{article.ArticleID}",
-                            'text': article_data.get("content"),
-                            'type': 'law_article',
-                            'law_id': law.LawID,
-                            'article_id': article.ArticleID,
-                            'title': f"Article {article_data.get('article_number', '')}",
-                        })
+                    for article_data in law_data.get("articles", [])
+                ]
+                if articles:
+                    self.db.add_all(articles)
+                    self.db.flush()
+                
+                # Prepare for vector indexing
+                documents_for_vector.extend(
+                    article_document(article, law.Category, issue.PublicationDate)
+                    for article in articles
+                )
                 
                 # Add law title to vector index
-                if law.Title:
-                    documents_for_vector.append({
-                        'id': f"law_{law.LawID}",
-                        'text': f"{law.Title}. {law.Summary or ''}",
-                        'type': 'law',
-                        'law_id': law.LawID,
-                        'title': law.Title,
-                    })
+                documents_for_vector.append(law_document(law, issue.PublicationDate))
+            
+            documents_for_vector = [doc for doc in documents_for_vector if doc is not None]
             
             # Commit all database changes
             self.db.commit()
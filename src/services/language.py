@@ -0,0 +1,47 @@
+"""
+Language Detection - Cheap script and stopword based language guess.
+Tells Arabic, French and English legal texts apart well enough to route
+documents and queries to their language shard, without a model.
+"""
+
+import re
+
+ARABIC_LETTER = re.compile(r"[؀-ۿݐ-ݿࢠ-ࣿﭐ-﷿ﹰ-﻿]")
+LATIN_LETTER = re.compile(r"[A-Za-zÀ-ÿ]")
+LATIN_WORD = re.compile(r"[a-zà-ÿ']+")
+FRENCH_ACCENT = re.compile(r"[àâçéèêëîïôûùüÿœ]")
+
+FRENCH_MARKERS = frozenset(
+    "le la les des du de et est une un dans pour par sur au aux que qui ne pas sont ou "
+    "relative relatif portant décret dahir présent présente vigueur".split()
+)
+ENGLISH_MARKERS = frozenset(
+    "the of and is are to in for on by with that this shall be any which from or "
+    "act regarding concerning provided".split()
+)
+
+# Enough text to decide; long articles are not scanned to the end
+SAMPLE_CHARS = 2000
+
+
+def detect_language(text: str, default: str = "fr") -> str:
+    """
+    Guess whether a text is Arabic ('ar'), French ('fr') or English ('en').
+
+    Arabic is recognised by script. Latin-script text is French or English
+    by stopword counts, accents counting for French. Texts without letters
+    get the default.
+    """
+    sample = (text or "")[:SAMPLE_CHARS]
+    arabic = len(ARABIC_LETTER.findall(sample))
+    latin = len(LATIN_LETTER.findall(sample))
+    if not arabic and not latin:
+        return default
+    if arabic >= latin:
+        return "ar"
+
+    lowered = sample.lower()
+    words = LATIN_WORD.findall(lowered)
+    french = sum(word in FRENCH_MARKERS for word in words) + len(FRENCH_ACCENT.findall(lowered)) / 2
+    english = sum(word in ENGLISH_MARKERS for word in words)
+    return "en" if english > french else "fr"
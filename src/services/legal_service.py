@@ -4,11 +4,12 @@ Handles law search, creation, and management.
 """
 
 from datetime import date
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func, desc
 from sqlalchemy.sql import text
 
+from src.core.settings import settings
 from src.db.models.legal import LawIssues, Laws, LawArticles, LawTags
 from src.db.models.security import Users
 from src.schemas.legal import (
@@ -20,6 +21,7 @@ from src.schemas.legal import (
     LawTagCreate,
     LawTagResponse,
 )
+from src.services.vector_service import get_vector_service
 
 
 class LegalService:
@@ -39,12 +41,26 @@ class LegalService:
     ) -> LawSearchResponse:
         """
         Search laws with filters and pagination.
+        
+        With a query, laws are ranked by hybrid keyword + semantic search
+        when the search index is available, and matched with LIKE otherwise.
+        Ranked search goes as deep as the requested page needs, up to
+        vector_hybrid_max_results hits; total then counts the laws reached
+        and total_capped tells that more may match.
         """
         # Build base query
         base_query = self.db.query(Laws).join(LawIssues, Laws.IssueID == LawIssues.IssueID)
         
-        # Apply filters
+        ranked_ids, total_capped = None, False
         if query:
+            ranked = await self._ranked_law_ids(query, page * page_size, from_date, to_date, category)
+            if ranked is not None:
+                ranked_ids, total_capped = ranked
+        
+        # Apply filters
+        if ranked_ids is not None:
+            base_query = base_query.filter(Laws.LawID.in_(ranked_ids))
+        elif query:
             # Full-text search on title and summary
             search_condition = or_(
                 Laws.Title.contains(query),
@@ -62,17 +78,25 @@ class LegalService:
         if category:
             base_query = base_query.filter(Laws.Category == category)
         
-        # Get total count
-        total = base_query.count()
-        
-        # Apply pagination and ordering
-        laws = (
-            base_query
-            .order_by(desc(LawIssues.PublicationDate))
-            .offset((page - 1) * page_size)
-            .limit(page_size)
-            .all()
-        )
+        if ranked_ids is not None:
+            # The candidate set is bounded, so order it by relevance here
+            laws = base_query.all()
+            total = len(laws)
+            position = {law_id: i for i, law_id in enumerate(ranked_ids)}
+            laws.sort(key=lambda law: position[law.LawID])
+            laws = laws[(page - 1) * page_size:page * page_size]
+        else:
+            # Get total count
+            total = base_query.count()
+            
+            # Apply pagination and ordering
+            laws = (
+                base_query
+                .order_by(desc(LawIssues.PublicationDate))
+                .offset((page - 1) * page_size)
+                .limit(page_size)
+                .all()
+            )
         
         # Convert to response models
         law_summaries = []
@@ -93,11 +117,59 @@ class LegalService:
         
         return LawSearchResponse(
             total=total,
+            total_capped=total_capped,
             page=page,
             page_size=page_size,
             items=law_summaries,
         )
     
+    async def _ranked_law_ids(
+        self,
+        query: str,
+        wanted: int,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        category: Optional[str] = None,
+    ) -> Optional[Tuple[List[int], bool]]:
+        """
+        Law IDs ranked by hybrid search, or None if the search index is unavailable.
+        
+        The filters are applied inside the search, so the candidates are not
+        used up by laws the SQL filters would drop. The search is widened
+        until it finds wanted laws (several hits may share one law), runs
+        out of matches or reaches vector_hybrid_max_results.
+        
+        Args:
+            query: Search query
+            wanted: Laws needed to fill the requested page
+        
+        Returns:
+            Tuple of (law IDs, whether the search stopped before running out
+            of matches, so more laws may match)
+        """
+        vector_service = get_vector_service()
+        if not vector_service.is_available():
+            return None
+        
+        limit = max(settings.vector_hybrid_max_results, 1)
+        k = min(max(settings.vector_hybrid_candidates, wanted), limit)
+        while True:
+            results = await vector_service.hybrid_search(
+                query,
+                k=k,
+                threshold=settings.vector_similarity_threshold,
+                filters={
+                    'category': category,
+                    'published_after': from_date,
+                    'published_before': to_date,
+                },
+            )
+            # An article hit ranks its law; keep each law's best position
+            law_ids = list(dict.fromkeys(result['law_id'] for result in results if result.get('law_id') is not None))
+            if len(law_ids) >= wanted or len(results) < k or k >= limit:
+                return law_ids, len(results) >= k
+            k = min(k * 2, limit)
+    
     async def get_law_detail(self, law_id: int) -> Optional[LawDetail]:
         """
         Get detailed information about a specific law.
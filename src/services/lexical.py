@@ -0,0 +1,105 @@
+"""
+Lexical Search - Text normalisation and rank fusion for keyword retrieval.
+Prepares Arabic and French legal text for the BM25 index and merges
+keyword and semantic rankings with reciprocal-rank fusion.
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Arabic letter variants folded onto one form, and tatweel removed
+ARABIC_FOLDING = str.maketrans({
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ٱ": "ا",
+    "ى": "ي",
+    "ة": "ه",
+    "ؤ": "و",
+    "ئ": "ي",
+    "ـ": None,
+})
+
+# Arabic-Indic and Eastern Arabic-Indic digits
+DIGIT_FOLDING = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+
+# Separators inside references such as "01-23", "2.11.45" or "1/2024"
+NUMBER_SEPARATOR = re.compile(r"(?<=\d)\s*[-/.]\s*(?=\d)")
+
+# Tokens are runs of letters/digits; '-' survives only between digits
+TOKEN = re.compile(r"\d+(?:-\d+)+|\w+")
+
+STOPWORDS = frozenset(
+    # French
+    "a au aux avec ce ces dans de des du elle en et il ils la le les leur lui ma mais me "
+    "meme mes moi mon ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta "
+    "te tes toi ton tu un une vos votre vous y l d s n c j m t est sont ete etre "
+    # English
+    "an and are as at be by for from has in is it its of on or that the to was were will with "
+    # Arabic
+    "في من على الى عن مع هذا هذه ذلك التي الذي الذين او ان ما لا ثم قد كل بين كان هو هي".split()
+)
+
+
+def normalize_for_search(text: str) -> str:
+    """
+    Fold text for keyword matching.
+    
+    Lower-cases, strips accents and Arabic diacritics, unifies Arabic letter
+    variants and digits, and joins number references ("01 - 23" -> "01-23")
+    so they stay one token.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.casefold().translate(ARABIC_FOLDING).translate(DIGIT_FOLDING)
+    return NUMBER_SEPARATOR.sub("-", text)
+
+
+def tokenize(text: str) -> List[str]:
+    """Search tokens of a text, without stopwords."""
+    return [token for token in TOKEN.findall(normalize_for_search(text)) if token not in STOPWORDS]
+
+
+def index_text(text: str) -> str:
+    """Text as stored in the full-text index: its tokens, space-separated."""
+    return " ".join(TOKEN.findall(normalize_for_search(text or "")))
+
+
+def match_expression(query: str) -> str:
+    """
+    FTS5 MATCH expression for a free-text query: any of its tokens.
+    
+    Tokens are quoted so user input can never be parsed as FTS5 syntax;
+    BM25 ranks documents matching more, and rarer, tokens first.
+    """
+    tokens = dict.fromkeys(tokenize(query))
+    return " OR ".join(f'"{token}"' for token in tokens)
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Iterable[str]],
+    k: int = 60,
+    weights: Sequence[float] = (),
+) -> List[Tuple[str, float]]:
+    """
+    Merge ranked lists of IDs with reciprocal-rank fusion.
+    
+    Each list contributes weight / (k + rank) for every ID it contains, so
+    IDs ranked well by several retrievers rise to the top without having to
+    calibrate their raw scores against each other.
+    
+    Args:
+        rankings: Ranked ID lists, best first
+        k: Rank offset damping the influence of top positions
+        weights: Optional per-list weights (default 1.0)
+    
+    Returns:
+        (id, fused score) pairs, best first
+    """
+    fused: Dict[str, float] = {}
+    for i, ranking in enumerate(rankings):
+        weight = weights[i] if i < len(weights) else 1.0
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda pair: pair[1], reverse=True)
@@ -0,0 +1,106 @@
+"""
+Query Batcher - Micro-batching of concurrent requests onto a worker thread.
+Requests arriving within a short window are handed to the handler as one
+batch, so model and index calls are amortised and the event loop never
+runs them itself.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBatcher:
+    """
+    Collects requests for up to max_wait_ms (or until max_batch_size are
+    queued) and runs handler(requests) -> results on a dedicated thread.
+    
+    The handler must return one result per request, in order. While a batch
+    runs, the next one keeps filling, so batches grow with load.
+    """
+    
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0,
+        thread_name: str = "query-batcher",
+    ):
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=thread_name)
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        self.batches = 0
+        self.requests = 0
+        self.largest_batch = 0
+    
+    async def submit(self, request: Any) -> Any:
+        """Queue a request and wait for its result."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Requests queued on a loop that has since closed can never run
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+        
+        future = loop.create_future()
+        self._pending.append((request, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+    
+    def _flush(self):
+        """Hand the queued requests to the worker thread as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        
+        batch, self._pending = self._pending, []
+        # Callers cancelled while waiting need no work
+        batch = [(request, future) for request, future in batch if not future.done()]
+        if not batch:
+            return
+        
+        self.batches += 1
+        self.requests += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        
+        work = self._loop.run_in_executor(self._executor, self.handler, [request for request, _ in batch])
+        work.add_done_callback(partial(self._resolve, batch))
+    
+    @staticmethod
+    def _resolve(batch: List[Tuple[Any, asyncio.Future]], work: asyncio.Future):
+        """Deliver the batch results (or its error) to every waiting caller."""
+        error = work.exception() if not work.cancelled() else asyncio.CancelledError()
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(work.result()[i])
+    
+    def stats(self) -> Dict[str, Any]:
+        """Batching counters for this process."""
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": round(self.requests / self.batches, 2) if self.batches else 0,
+            "largest_batch": self.largest_batch,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+    
+    def shutdown(self):
+        """Stop the worker thread once the running batch completes."""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,111 @@
+"""
+Rebuild Job - Runs a vector index rebuild in the background and tracks it.
+The index keeps serving searches from its current version until the
+rebuilt one is swapped in; the job's status is polled over the API.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RebuildJob:
+    """State of the most recent background rebuild of one vector service."""
+    
+    def __init__(self):
+        self.job_id = 0
+        self.state = "idle"  # idle, running, succeeded, failed
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.expected_total = 0
+        # Updated by the rebuild as it goes: phase, documents, passages, ...
+        self.progress: Dict[str, Any] = {}
+        self.result: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self._started = 0.0
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def running(self) -> bool:
+        """Whether a rebuild is in progress."""
+        return self._task is not None and not self._task.done()
+    
+    def start(
+        self,
+        rebuild: Callable[[Dict[str, Any]], Awaitable[bool]],
+        expected_total: int,
+        result: Callable[[], Dict[str, Any]],
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Start a rebuild on the event loop.
+        
+        Args:
+            rebuild: Coroutine function taking the progress dict to update
+            expected_total: Documents the rebuild is expected to index
+            result: Returns the rebuild's statistics once it has finished
+            on_done: Called when the job ends, e.g. to close its database session
+        
+        Returns:
+            The job status
+        
+        Raises:
+            RuntimeError: If a rebuild is already running
+        """
+        if self.running:
+            raise RuntimeError(f"Vector index rebuild {self.job_id} is already running")
+        
+        self.job_id += 1
+        self.state = "running"
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at = None
+        self.expected_total = expected_total
+        self.progress = {"phase": "starting", "documents": 0, "passages": 0}
+        self.result = {}
+        self.error = None
+        self._started = time.perf_counter()
+        self._task = asyncio.create_task(self._run(rebuild, result, on_done))
+        return self.status()
+    
+    async def _run(self, rebuild, result, on_done):
+        """Run the rebuild and record how it ended."""
+        try:
+            success = await rebuild(self.progress)
+            self.result = result()
+            self.state = "succeeded" if success else "failed"
+            if not success:
+                self.error = "Rebuild failed; the previous index is still being served"
+        except Exception as e:
+            logger.error(f"Background vector index rebuild failed: {str(e)}")
+            self.state = "failed"
+            self.error = str(e)
+        finally:
+            self.finished_at = datetime.now(timezone.utc)
+            self.progress["phase"] = "done"
+            if on_done is not None:
+                on_done()
+    
+    def status(self) -> Dict[str, Any]:
+        """Job state and progress, as returned by the status endpoint."""
+        if self.started_at is None:
+            return {"state": self.state}
+        
+        end = self.finished_at
+        elapsed = (end - self.started_at).total_seconds() if end else time.perf_counter() - self._started
+        done = self.progress.get("documents", 0)
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": end.isoformat() if end else None,
+            "elapsed_seconds": round(elapsed, 1),
+            "expected_documents": self.expected_total,
+            "progress": dict(self.progress),
+            "percent": round(min(100.0, 100.0 * done / self.expected_total), 1) if self.expected_total else None,
+            "result": self.result,
+            "error": self.error,
+        }
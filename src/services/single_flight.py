@@ -0,0 +1,67 @@
+"""
+Single Flight - Coalesces concurrent identical calls into one execution.
+Callers asking for a key that is already being computed wait for that
+computation and share its result instead of starting their own.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    At most one in-flight computation per key.
+    
+    The computation runs as its own task: a caller that is cancelled (its
+    client went away) stops waiting without cancelling it for the others.
+    Its result or exception is delivered to every caller that joined it;
+    the key is free again as soon as it finishes, so results are never
+    cached beyond the calls that overlapped. Event-loop only.
+    """
+    
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        
+        self.calls = 0
+        self.coalesced = 0
+    
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        """
+        Result of compute() for the key, shared with concurrent callers.
+        
+        Args:
+            key: Identifies equivalent calls
+            compute: Started only if no call with this key is in flight
+        
+        Returns:
+            The computation's result (the same object for every caller)
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(compute())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+    
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        """Free the key, and mark a failure retrieved in case every caller has gone."""
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Coalesced call failed: {str(task.exception())}")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Computations started and calls that joined one already in flight."""
+        return {
+            "in_flight": len(self._tasks),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
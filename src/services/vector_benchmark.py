@@ -0,0 +1,405 @@
+"""
+Vector Benchmark - Retrieval latency and quality of every index configuration.
+Builds each configuration over the same corpus in a scratch directory and
+drives it through VectorService.search_similar, reporting latency
+percentiles, throughput under concurrency, memory and recall@k.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.core.settings import settings
+from src.services.vector_eval import index_memory
+from src.services.vector_service import VectorService
+
+logger = logging.getLogger(__name__)
+
+# index_type:quantization pairs; the first is exact search, the reference for recall
+DEFAULT_CONFIGS = ("flat:none", "hnsw:none", "ivf:none", "flat:sq8", "hnsw:sq8", "ivf:pq")
+
+# Vocabulary of the synthetic corpus, one theme per law category
+SYNTHETIC_THEMES = {
+    "Fiscalité": [
+        "impôt", "revenu", "taxe", "valeur", "ajoutée", "déclaration", "contribuable", "exonération",
+        "assiette", "recouvrement", "pénalité", "douane", "droits", "enregistrement", "timbre",
+    ],
+    "Travail": [
+        "salarié", "employeur", "contrat", "licenciement", "préavis", "salaire", "congé", "durée",
+        "syndicat", "grève", "indemnité", "inspection", "accident", "formation", "sécurité",
+    ],
+    "Santé": [
+        "médecin", "hôpital", "patient", "médicament", "pharmacie", "vaccination", "assurance",
+        "maladie", "soins", "urgence", "clinique", "prescription", "santé", "prévention", "hygiène",
+    ],
+    "Urbanisme": [
+        "permis", "construire", "lotissement", "terrain", "aménagement", "commune", "plan", "zone",
+        "bâtiment", "voirie", "habitat", "foncier", "expropriation", "agence", "cadastre",
+    ],
+    "Élections": [
+        "électeur", "scrutin", "candidat", "liste", "bureau", "vote", "campagne", "circonscription",
+        "dépouillement", "recours", "mandat", "conseil", "élection", "commission", "inscription",
+    ],
+}
+
+SYNTHETIC_CONNECTORS = [
+    "conformément aux dispositions de", "sous réserve de", "dans un délai de", "en application de",
+    "à compter de", "sans préjudice de", "au titre de", "pour l'application de",
+]
+
+
+def _sentence(rng: random.Random, words: List[str]) -> str:
+    """One pseudo-legal sentence over a theme's vocabulary."""
+    head = rng.sample(words, 4)
+    tail = rng.sample(words, 3)
+    return (
+        f"Le {head[0]} et la {head[1]} relatifs au {head[2]} {rng.choice(SYNTHETIC_CONNECTORS)} "
+        f"la {head[3]}, la {tail[0]} du {tail[1]} est fixée par {tail[2]} dans un délai de "
+        f"{rng.randint(2, 90)} jours."
+    )
+
+
+def synthetic_corpus(num_laws: int, articles_per_law: int = 4, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Generate a reproducible corpus of laws and articles shaped like the indexed one.
+    
+    Args:
+        num_laws: Number of laws; each also gets articles_per_law articles
+        articles_per_law: Articles generated per law
+        seed: Random seed
+    
+    Returns:
+        Index documents (see vector_documents)
+    """
+    rng = random.Random(seed)
+    categories = list(SYNTHETIC_THEMES)
+    documents = []
+    for law_id in range(1, num_laws + 1):
+        category = categories[law_id % len(categories)]
+        words = SYNTHETIC_THEMES[category]
+        law_number = f"{rng.randint(1, 99):02d}-{rng.randint(1, 24):02d}"
+        title = f"Loi n° {law_number} relative au {rng.choice(words)} et à la {rng.choice(words)}"
+        publication_date = f"{rng.randint(1990, 2025)}-{rng.randint(1, 12):02d}-01"
+        documents.append({
+            'id': f"law_{law_id}",
+            'text': f"{title}. {_sentence(rng, words)}",
+            'type': 'law',
+            'law_id': law_id,
+            'title': title,
+            'keywords': law_number,
+            'category': category,
+            'publication_date': publication_date,
+        })
+        for n in range(1, articles_per_law + 1):
+            article_id = law_id * 1000 + n
+            documents.append({
+                'id': f"article_{article_id}",
+                'text': " ".join(_sentence(rng, words) for _ in range(rng.randint(2, 6))),
+                'type': 'law_article',
+                'law_id': law_id,
+                'article_id': article_id,
+                'title': f"Article {n}",
+                'keywords': None,
+                'category': category,
+                'publication_date': publication_date,
+            })
+    return documents
+
+
+def sample_queries(
+    documents: List[Dict[str, Any]],
+    num_queries: int,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Labelled queries drawn from the corpus: a span of 5-12 words from a
+    document, labelled with that document as the relevant result.
+    """
+    rng = random.Random(seed)
+    picked = rng.sample(documents, min(num_queries, len(documents)))
+    queries = []
+    for doc in picked:
+        words = doc['text'].split()
+        length = min(len(words), rng.randint(5, 12))
+        start = rng.randint(0, len(words) - length)
+        queries.append({'query': " ".join(words[start:start + length]), 'relevant': [doc['id']]})
+    return queries
+
+
+def load_jsonl(path: Path) -> List[Dict[str, Any]]:
+    """Read one JSON object per line, skipping blank lines."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentiles(latencies_ms: Sequence[float]) -> Dict[str, float]:
+    """Mean and p50/p95/p99 of latencies in milliseconds."""
+    if not latencies_ms:
+        return {}
+    values = np.asarray(latencies_ms)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+@contextlib.contextmanager
+def overridden_settings(**values) -> Iterator[None]:
+    """Temporarily change settings, restoring the previous values on exit."""
+    previous = {name: getattr(settings, name) for name in values}
+    try:
+        for name, value in values.items():
+            setattr(settings, name, value)
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(settings, name, value)
+
+
+def git_revision() -> Optional[str]:
+    """Commit of the working tree, so reports can be matched to code."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+        return result.stdout.strip() or None
+    except Exception:
+        return None
+
+
+async def _search_all(
+    service: VectorService,
+    queries: List[str],
+    k: int,
+    concurrency: int,
+) -> Tuple[List[List[str]], List[float], float]:
+    """
+    Run every query through search_similar with at most `concurrency` in flight.
+    
+    Returns:
+        Tuple of (result IDs per query, per-query latency in ms, wall time in s)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = [0.0] * len(queries)
+    
+    async def one(i: int) -> List[str]:
+        async with semaphore:
+            start = time.perf_counter()
+            results = await service.search_similar(queries[i], k=k, threshold=-1.0)
+            latencies[i] = (time.perf_counter() - start) * 1000
+            return [result['id'] for result in results]
+    
+    start = time.perf_counter()
+    found = await asyncio.gather(*(one(i) for i in range(len(queries))))
+    return found, latencies, time.perf_counter() - start
+
+
+def _overlap_recall(found: List[List[str]], reference: List[List[str]]) -> float:
+    """Mean share of the reference top-k found in each result list."""
+    shares = [
+        len(set(ids) & set(expected)) / len(expected)
+        for ids, expected in zip(found, reference)
+        if expected
+    ]
+    return float(np.mean(shares)) if shares else 0.0
+
+
+def _label_metrics(found: List[List[str]], labelled: List[Dict[str, Any]], k: int) -> Dict[str, float]:
+    """Hit rate and MRR of the labelled relevant documents within the top-k."""
+    hits = 0
+    reciprocal_ranks = []
+    for ids, query in zip(found, labelled):
+        relevant = set(query.get('relevant') or [])
+        rank = next((i for i, doc_id in enumerate(ids, start=1) if doc_id in relevant), None)
+        hits += rank is not None
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    return {
+        f"label_hit@{k}": round(hits / max(len(labelled), 1), 4),
+        "mrr": round(float(np.mean(reciprocal_ranks)) if reciprocal_ranks else 0.0, 4),
+    }
+
+
+async def benchmark_config(
+    config: str,
+    documents: List[Dict[str, Any]],
+    labelled: List[Dict[str, Any]],
+    k: int,
+    concurrency_levels: Sequence[int],
+    work_dir: Path,
+    embedding_cache_dir: Path,
+    reference: Optional[List[List[str]]] = None,
+) -> Tuple[Dict[str, Any], List[List[str]]]:
+    """
+    Build one index configuration over the corpus and measure it.
+    
+    Query and result caches are disabled so every search pays for encoding
+    and the index lookup, as a first-time question does.
+    
+    Returns:
+        Tuple of (report entry, top-k result IDs per query)
+    """
+    index_type, _, quantization = config.partition(":")
+    data_dir = work_dir / config.replace(":", "_")
+    queries = [query['query'] for query in labelled]
+    
+    with overridden_settings(
+        vector_index_type=index_type,
+        vector_quantization=quantization or "none",
+        vector_query_cache_size=0,
+        vector_result_cache_size=0,
+        vector_embedding_cache_enabled=True,
+        vector_embedding_cache_dir=str(embedding_cache_dir),
+    ):
+        service = VectorService(data_dir=data_dir)
+        try:
+            build_start = time.perf_counter()
+            if not await service.rebuild_index(documents):
+                raise RuntimeError("index build failed")
+            build_seconds = time.perf_counter() - build_start
+            
+            # Warm-up: model, thread pools and the index pages
+            await _search_all(service, queries[:20], k, 1)
+            
+            # Latency: one query at a time
+            found, latencies, _ = await _search_all(service, queries, k, 1)
+            
+            throughput = []
+            for concurrency in concurrency_levels:
+                _, concurrent_latencies, elapsed = await _search_all(service, queries, k, concurrency)
+                throughput.append({
+                    "concurrency": concurrency,
+                    "qps": round(len(queries) / elapsed, 1),
+                    "latency_ms": percentiles(concurrent_latencies),
+                })
+            
+            entry = {
+                "config": config,
+                **service.describe_index(),
+                "vectors": int(service.index.ntotal),
+                "build_seconds": round(build_seconds, 2),
+                **index_memory(service, service.index),
+                "search_params": service._search_params(),
+                "latency_ms": percentiles(latencies),
+                "throughput": throughput,
+                f"recall@{k}": round(_overlap_recall(found, reference), 4) if reference is not None else 1.0,
+                **_label_metrics(found, labelled, k),
+            }
+            return entry, found
+        finally:
+            if service.query_batcher is not None:
+                service.query_batcher.shutdown()
+            if service.metadata is not None:
+                service.metadata.close()
+            if service.full_vectors is not None:
+                service.full_vectors.close()
+
+
+async def run_benchmark(
+    documents: List[Dict[str, Any]],
+    labelled: List[Dict[str, Any]],
+    k: int = 10,
+    configs: Sequence[str] = DEFAULT_CONFIGS,
+    concurrency_levels: Sequence[int] = (1, 8, 32),
+    work_dir: Optional[Path] = None,
+    embedding_cache_dir: Optional[Path] = None,
+    corpus_source: str = "synthetic",
+) -> Dict[str, Any]:
+    """
+    Benchmark every configuration over the same corpus and queries.
+    
+    Recall@k is measured against the results of exact (flat, uncompressed)
+    search, which is run first whether or not it is listed in configs.
+    Document embeddings go through an embedding cache, so the corpus is
+    encoded once for all configurations.
+    
+    Args:
+        documents: Index documents
+        labelled: Queries as {'query': str, 'relevant': [document IDs]}
+        k: Results per query
+        configs: 'index_type:quantization' pairs
+        concurrency_levels: Concurrent clients for the throughput runs
+        work_dir: Scratch directory for the indexes (temporary by default)
+        embedding_cache_dir: Embedding cache to use (default: one in the
+            scratch directory, so synthetic texts stay out of the live cache)
+        corpus_source: Description of the corpus for the report
+    
+    Returns:
+        JSON-serialisable report
+    """
+    configs = ["flat:none"] + [config for config in configs if config != "flat:none"]
+    scratch = Path(work_dir) if work_dir else Path(tempfile.mkdtemp(prefix="vector-benchmark-"))
+    cache_dir = Path(embedding_cache_dir) if embedding_cache_dir else scratch / "embedding_cache"
+    
+    entries = []
+    reference = None
+    try:
+        for config in configs:
+            logger.info(f"Benchmarking {config} over {len(documents)} documents")
+            try:
+                entry, found = await benchmark_config(
+                    config, documents, labelled, k, concurrency_levels, scratch, cache_dir, reference
+                )
+                if reference is None:
+                    reference = found
+                entries.append(entry)
+            except Exception as e:
+                logger.error(f"Failed to benchmark {config}: {str(e)}")
+                entries.append({"config": config, "error": str(e)})
+    finally:
+        if work_dir is None:
+            shutil.rmtree(scratch, ignore_errors=True)
+    
+    return {
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+        "git_revision": git_revision(),
+        "model": settings.vector_model,
+        "corpus": {"source": corpus_source, "documents": len(documents)},
+        "queries": len(labelled),
+        "k": k,
+        "concurrency_levels": list(concurrency_levels),
+        "configs": entries,
+    }
+
+
+def compare_reports(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Per-configuration changes between two reports: p95 latency, best QPS and
+    recall, as (current, baseline) pairs.
+    """
+    k = current.get("k")
+    previous = {entry["config"]: entry for entry in baseline.get("configs", [])}
+    rows = []
+    for entry in current.get("configs", []):
+        before = previous.get(entry["config"])
+        if before is None or "error" in entry or "error" in before:
+            continue
+        rows.append({
+            "config": entry["config"],
+            "p95_ms": (entry["latency_ms"].get("p95"), before["latency_ms"].get("p95")),
+            "max_qps": (
+                max((run["qps"] for run in entry["throughput"]), default=None),
+                max((run["qps"] for run in before["throughput"]), default=None),
+            ),
+            f"recall@{k}": (entry.get(f"recall@{k}"), before.get(f"recall@{k}")),
+            "resident_bytes": (entry.get("resident_bytes"), before.get("resident_bytes")),
+        })
+    return rows
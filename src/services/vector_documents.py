@@ -0,0 +1,139 @@
+"""
+Vector Documents - Builds vector index documents from the legal corpus.
+Streams laws and articles from the database in bounded batches.
+"""
+
+from datetime import date
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from src.db.models.legal import ArticleDuplicates, LawIssues, Laws, LawArticles
+
+
+def law_document(law: Laws, publication_date: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    """
+    Vector document for a law's title and summary, or None if it has no title.
+    
+    Category and publication date (of the law's issue) are stored for
+    filtered searches.
+    """
+    if not law.Title:
+        return None
+    return {
+        'id': f"law_{law.LawID}",
+        'text': f"{law.Title}. {law.Summary or ''}",
+        'type': 'law',
+        'law_id': law.LawID,
+        'title': law.Title,
+        'keywords': law.LawNumber,
+        'category': law.Category,
+        'publication_date': publication_date,
+    }
+
+
+def article_document(
+    article: LawArticles,
+    category: Optional[str] = None,
+    publication_date: Optional[date] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Vector document for an article's content, or None if it is empty.
+    
+    Articles are filtered by the category and publication date of their law.
+    """
+    if not article.Content:
+        return None
+    return {
+        'id': f"article_{article.ArticleID}",
+        'text': article.Content,
+        'type': 'law_article',
+        'law_id': article.LawID,
+        'article_id': article.ArticleID,
+        'title': f"Article {article.ArticleNumber}",
+        'keywords': article.Keywords,
+        'category': category,
+        'publication_date': publication_date,
+    }
+
+
+def batched(documents: Iterable[Optional[Dict[str, Any]]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Group documents into lists of at most batch_size, skipping None."""
+    documents = (doc for doc in documents if doc is not None)
+    while True:
+        batch = list(islice(documents, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _without_duplicates(articles):
+    """Leave out articles recorded as near-duplicates of another one."""
+    return (
+        articles
+        .outerjoin(ArticleDuplicates, ArticleDuplicates.ArticleID == LawArticles.ArticleID)
+        .filter(ArticleDuplicates.ArticleID.is_(None))
+    )
+
+
+def count_corpus_documents(db: Session, skip_duplicates: bool = False) -> Dict[str, int]:
+    """Number of laws and articles that will be indexed."""
+    articles = db.query(LawArticles).filter(LawArticles.Content.isnot(None))
+    if skip_duplicates:
+        articles = _without_duplicates(articles)
+    return {
+        "laws": db.query(Laws).filter(Laws.Title.isnot(None)).count(),
+        "articles": articles.count(),
+    }
+
+
+def iter_corpus_documents(
+    db: Session,
+    batch_size: int,
+    sample_every: int = 1,
+    skip_duplicates: bool = False,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Stream the indexable legal corpus in fixed-size batches.
+    
+    Rows are fetched with yield_per, so only one batch of ORM objects is
+    alive at a time no matter how large the corpus is. Each row comes with
+    its law's category and issue date, joined in the same query.
+    
+    Args:
+        db: Database session
+        batch_size: Documents per batch (also the fetch size)
+        sample_every: Keep only rows whose ID is a multiple of this, giving a
+            sample spread evenly over the whole corpus (e.g. for IVF training)
+        skip_duplicates: Leave out articles recorded in ArticleDuplicates
+    """
+    laws = (
+        db.query(Laws, LawIssues.PublicationDate)
+        .outerjoin(LawIssues, Laws.IssueID == LawIssues.IssueID)
+        .filter(Laws.Title.isnot(None))
+    )
+    articles = (
+        db.query(LawArticles, Laws.Category, LawIssues.PublicationDate)
+        .join(Laws, LawArticles.LawID == Laws.LawID)
+        .outerjoin(LawIssues, Laws.IssueID == LawIssues.IssueID)
+        .filter(LawArticles.Content.isnot(None))
+    )
+    
+    if skip_duplicates:
+        articles = _without_duplicates(articles)
+    if sample_every > 1:
+        laws = laws.filter(Laws.LawID % sample_every == 0)
+        articles = articles.filter(LawArticles.ArticleID % sample_every == 0)
+    
+    documents = chain(
+        (
+            law_document(law, publication_date)
+            for law, publication_date in laws.order_by(Laws.LawID).yield_per(batch_size)
+        ),
+        (
+            article_document(article, category, publication_date)
+            for article, category, publication_date in articles.order_by(LawArticles.ArticleID).yield_per(batch_size)
+        ),
+    )
+    return batched(documents, batch_size)
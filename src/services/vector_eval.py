@@ -0,0 +1,144 @@
+"""
+Vector Evaluation - Compares vector index modes on the indexed corpus.
+Reports memory footprint, recall@k against exact search and query latency
+so the index family and compression can be chosen from real data.
+"""
+
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from src.core.settings import settings
+from src.services.vector_rerank import rerank
+from src.services.vector_service import QUANTIZATION_TYPES, VectorService
+
+logger = logging.getLogger(__name__)
+
+
+def index_memory(service: VectorService, index) -> Dict[str, int]:
+    """
+    Memory footprint of an index.
+    
+    The whole index is resident once searched, memory-mapped or not. The
+    full vectors compressed indexes are re-ranked with live in a separate
+    memory-mapped file, of which only the re-ranked candidates are read,
+    so they are reported apart and not counted as resident.
+    """
+    total = int(faiss.serialize_index(index).nbytes)
+    full_vectors = 0
+    if service.describe_index(index)["quantization"] != "none":
+        full_vectors = index.ntotal * index.d * 4
+    
+    return {
+        "index_bytes": total,
+        "rerank_vectors_bytes": full_vectors,
+        "resident_bytes": total,
+        "bytes_per_vector": round(total / max(index.ntotal, 1), 1),
+    }
+
+
+def _timed_search(index, queries: np.ndarray, k: int, lookup=None) -> Tuple[np.ndarray, float]:
+    """
+    Search all queries one at a time, as the API does; return labels and mean latency in ms.
+    
+    With lookup (vector IDs -> full vectors), candidates are re-ranked as
+    the service does for compressed indexes.
+    """
+    labels = np.empty((len(queries), k), dtype=np.int64)
+    start = time.perf_counter()
+    for i in range(len(queries)):
+        if lookup is None:
+            _, labels[i:i + 1] = index.search(queries[i:i + 1], k)
+        else:
+            _, candidates = index.search(queries[i:i + 1], k * settings.vector_rerank_factor)
+            _, labels[i:i + 1] = rerank(queries[i:i + 1], candidates, lookup, k)
+    elapsed = time.perf_counter() - start
+    return labels, elapsed * 1000 / max(len(queries), 1)
+
+
+def recall_at_k(labels: np.ndarray, truth: np.ndarray) -> float:
+    """Mean share of the exact top-k found by the approximate search."""
+    found = [len(np.intersect1d(row, expected[expected >= 0])) for row, expected in zip(labels, truth)]
+    return float(np.mean(found) / truth.shape[1]) if len(found) else 0.0
+
+
+def evaluate_index_modes(
+    service: VectorService,
+    k: int = 10,
+    num_queries: int = 500,
+    query_texts: Optional[List[str]] = None,
+    quantizations: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Build every compression mode over the live vectors and compare them with exact search.
+    
+    Args:
+        service: Vector service whose active index supplies the corpus
+        k: Cut-off for recall@k
+        num_queries: Corpus vectors sampled as queries when no texts are given
+        query_texts: Real queries to encode instead of sampled vectors
+        quantizations: Modes to evaluate (default: all)
+    
+    Returns:
+        Report with one entry per mode
+    """
+    vectors, ids = service.live_vectors()
+    if not len(ids):
+        return {"error": "vector index is empty"}
+    
+    if query_texts:
+        queries = service.encode_queries(query_texts)
+    else:
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(ids), min(num_queries, len(ids)), replace=False)
+        queries = np.ascontiguousarray(vectors[sample])
+    k = min(k, len(ids))
+    order = np.argsort(ids)
+    
+    def lookup(labels: np.ndarray) -> np.ndarray:
+        """Full vectors by ID, standing in for the service's full-vector store."""
+        return vectors[order[np.searchsorted(ids, labels, sorter=order)]]
+    
+    # Exact ground truth over the same vectors
+    exact = service.build_index(vectors, ids, index_type="flat", quantization="none")
+    truth, exact_ms = _timed_search(exact, queries, k)
+    
+    modes = [{
+        "mode": "exact",
+        **service.describe_index(exact),
+        **index_memory(service, exact),
+        f"recall@{k}": 1.0,
+        "mean_query_ms": round(exact_ms, 3),
+    }]
+    del exact
+    
+    for quantization in quantizations or QUANTIZATION_TYPES:
+        try:
+            build_start = time.perf_counter()
+            index = service.build_index(vectors, ids, quantization=quantization)
+            build_seconds = time.perf_counter() - build_start
+            compressed = service.describe_index(index)["quantization"] != "none"
+            labels, mean_ms = _timed_search(index, queries, k, lookup if compressed else None)
+            modes.append({
+                "mode": quantization,
+                **service.describe_index(index),
+                **index_memory(service, index),
+                f"recall@{k}": round(recall_at_k(labels, truth), 4),
+                "mean_query_ms": round(mean_ms, 3),
+                "build_seconds": round(build_seconds, 2),
+            })
+        except Exception as e:
+            logger.error(f"Failed to evaluate {quantization} index: {str(e)}")
+            modes.append({"mode": quantization, "error": str(e)})
+    
+    return {
+        "vectors": int(len(ids)),
+        "dimension": int(vectors.shape[1]),
+        "queries": int(len(queries)),
+        "query_source": "texts" if query_texts else "corpus_sample",
+        "k": k,
+        "modes": modes,
+    }
@@ -0,0 +1,353 @@
+"""
+Vector Metadata - SQLite-backed store for the documents behind vector IDs.
+Keeps titles and excerpts on disk instead of in Python dicts; search
+results are filled in with one primary-key lookup per query. The same
+database holds the BM25 full-text index used for keyword retrieval.
+"""
+
+import logging
+import sqlite3
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.services.lexical import index_text, match_expression
+
+logger = logging.getLogger(__name__)
+
+# Document fields stored next to each vector ID ('id' is the passage ID,
+# 'parent_id' the law/article document it was cut from)
+FIELDS = (
+    'id', 'type', 'law_id', 'article_id', 'title', 'content',
+    'category', 'publication_date', 'parent_id', 'chunk',
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    vector_id INTEGER PRIMARY KEY,
+    doc_id TEXT NOT NULL UNIQUE,
+    type TEXT,
+    law_id INTEGER,
+    article_id INTEGER,
+    title TEXT,
+    content TEXT,
+    category TEXT,
+    publication_date TEXT,
+    parent_id TEXT,
+    chunk INTEGER
+)
+"""
+
+COLUMNS = (
+    "vector_id, doc_id, type, law_id, article_id, title, content, "
+    "category, publication_date, parent_id, chunk"
+)
+
+# Per-attribute indexes backing filtered searches
+FILTER_INDEXES = ('type', 'category', 'law_id', 'publication_date')
+
+# Search filters: list filters match any of their values, dates are inclusive
+LIST_FILTERS = ('type', 'category', 'law_id')
+DATE_FILTERS = {'published_after': '>=', 'published_before': '<='}
+
+# Full-text index keyed by vector ID. Text is normalised before insertion;
+# '-' is a token character so references like "01-23" stay whole.
+LEXICAL_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, body, keywords,
+    tokenize = "unicode61 remove_diacritics 0 tokenchars '-'"
+)
+"""
+
+# BM25 column weights: title, body, keywords (law numbers, article keywords)
+LEXICAL_WEIGHTS = (2.0, 1.0, 4.0)
+
+# SQLite's default limit on bound parameters per statement
+MAX_VARIABLES = 999
+
+
+def _entry(row: Tuple) -> Dict[str, Any]:
+    """Convert a documents row (without vector_id) to a metadata dict."""
+    return dict(zip(FIELDS, row))
+
+
+def _iso_date(value: Any) -> Optional[str]:
+    """Dates are stored as ISO strings, which sort chronologically."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    raise ValueError(f"Invalid date: {value!r}")
+
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Tuple:
+    """
+    Canonical, hashable form of search filters.
+    
+    Supported keys are 'type', 'category' and 'law_id' (a value or a list
+    of values) and 'published_after' / 'published_before' (dates or ISO
+    strings). Keys set to None are ignored.
+    
+    Raises:
+        ValueError: On an unknown filter key
+    """
+    normalized = []
+    for key, value in (filters or {}).items():
+        if value is None:
+            continue
+        if key in LIST_FILTERS:
+            values = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+            if key == 'law_id':
+                values = [int(v) for v in values]
+            normalized.append((key, tuple(sorted(set(values)))))
+        elif key in DATE_FILTERS:
+            normalized.append((key, _iso_date(value)))
+        else:
+            raise ValueError(f"Unknown search filter: {key}")
+    return tuple(sorted(normalized))
+
+
+def _filter_clause(filters: Tuple) -> Tuple[str, List[Any]]:
+    """SQL condition on the documents table for normalized filters."""
+    conditions = []
+    params: List[Any] = []
+    for key, value in filters:
+        if key in DATE_FILTERS:
+            conditions.append(f"publication_date {DATE_FILTERS[key]} ?")
+            params.append(value)
+        else:
+            conditions.append(f"{key} IN ({','.join('?' * len(value))})")
+            params.extend(value)
+    return " AND ".join(conditions) or "1", params
+
+
+class VectorMetadataStore:
+    """
+    Document metadata keyed by vector ID, with a unique index on document ID.
+    
+    Both vector ID -> document and document ID -> vector ID are B-tree
+    lookups, and nothing is held in memory beyond SQLite's page cache.
+    Writes are grouped into a transaction that the caller ends with
+    commit(), so they can be made durable only after the matching segment.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        # Searches may run on executor threads; access is serialised by _lock
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(SCHEMA)
+        self._ensure_parent_columns()
+        self._ensure_filter_columns()
+        self._ensure_lexical_index()
+        self._conn.commit()
+    
+    def _ensure_parent_columns(self):
+        """Add passage columns to databases written before chunking; old rows are their own parent."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+        if 'parent_id' not in columns:
+            self._conn.execute("ALTER TABLE documents ADD COLUMN parent_id TEXT")
+            self._conn.execute("ALTER TABLE documents ADD COLUMN chunk INTEGER")
+            self._conn.execute("UPDATE documents SET parent_id = doc_id, chunk = 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_parent ON documents (parent_id)")
+    
+    def _ensure_filter_columns(self):
+        """Add the filterable attributes to older databases and index each of them."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+        if 'category' not in columns:
+            self._conn.execute("ALTER TABLE documents ADD COLUMN category TEXT")
+            self._conn.execute("ALTER TABLE documents ADD COLUMN publication_date TEXT")
+            logger.info("Added filter columns to vector documents; rebuild the vector index to fill them")
+        for column in FILTER_INDEXES:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS documents_{column} ON documents ({column})")
+    
+    def _ensure_lexical_index(self):
+        """Create the full-text index, backfilling it from stored excerpts for older databases."""
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'documents_fts'"
+        ).fetchone()
+        self._conn.execute(LEXICAL_SCHEMA)
+        if exists:
+            return
+        
+        rows = self._conn.execute("SELECT vector_id, title, content FROM documents").fetchall()
+        if rows:
+            self._conn.executemany(
+                "INSERT INTO documents_fts (rowid, title, body, keywords) VALUES (?, ?, ?, '')",
+                [(vector_id, index_text(title), index_text(content)) for vector_id, title, content in rows],
+            )
+            logger.info(
+                f"Indexed {len(rows)} stored excerpts for keyword search; rebuild the vector index to index full texts"
+            )
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    
+    def get(self, vector_id: int) -> Optional[Dict[str, Any]]:
+        """Metadata of one vector, or None if it has no live document."""
+        return self.get_many([vector_id]).get(vector_id)
+    
+    def get_many(self, vector_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Metadata of the given vectors; IDs without a live document are left out."""
+        vector_ids = [int(vector_id) for vector_id in vector_ids if vector_id >= 0]
+        found = {}
+        with self._lock:
+            for start in range(0, len(vector_ids), MAX_VARIABLES):
+                chunk = vector_ids[start:start + MAX_VARIABLES]
+                rows = self._conn.execute(
+                    f"SELECT {COLUMNS} FROM documents WHERE vector_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for row in rows:
+                    found[row[0]] = _entry(row[1:])
+        return found
+    
+    def vector_id(self, doc_id: str) -> Optional[int]:
+        """Vector ID currently holding a document, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector_id FROM documents WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def parent_vector_ids(self, parent_ids: Iterable[str]) -> List[int]:
+        """Vector IDs of every passage of the given parent documents."""
+        parent_ids = list(parent_ids)
+        vector_ids = []
+        with self._lock:
+            for start in range(0, len(parent_ids), MAX_VARIABLES):
+                chunk = parent_ids[start:start + MAX_VARIABLES]
+                rows = self._conn.execute(
+                    f"SELECT vector_id FROM documents WHERE parent_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                vector_ids.extend(row[0] for row in rows)
+        return vector_ids
+    
+    def parent_count(self) -> int:
+        """Number of distinct parent documents."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(DISTINCT parent_id) FROM documents").fetchone()[0]
+    
+    def vector_ids(self, filters: Tuple = ()) -> np.ndarray:
+        """
+        Live vector IDs, sorted, optionally only those matching normalized
+        filters (see normalize_filters); each attribute is an indexed lookup.
+        """
+        condition, params = _filter_clause(filters)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT vector_id FROM documents WHERE {condition} ORDER BY vector_id", params
+            ).fetchall()
+        return np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    
+    def put(self, entries: Iterable[Tuple[int, Dict[str, Any]]]):
+        """
+        Insert or replace (vector_id, metadata) pairs.
+        
+        A document already stored under another vector ID is replaced, so
+        re-applying the same write is harmless. The full text to index for
+        keyword search is taken from the entry's optional 'text' and
+        'keywords' (falling back to the stored excerpt).
+        """
+        entries = [(int(vector_id), entry) for vector_id, entry in entries]
+        rows = [
+            (
+                vector_id,
+                *(entry.get(field) for field in FIELDS[:-3]),
+                _iso_date(entry.get('publication_date')),
+                # Unchunked documents are their own single passage
+                entry.get('parent_id') or entry.get('id'),
+                entry.get('chunk') or 0,
+            )
+            for vector_id, entry in entries
+        ]
+        lexical_rows = [
+            (
+                vector_id,
+                index_text(entry.get('title')),
+                index_text(entry.get('text') or entry.get('content')),
+                index_text(entry.get('keywords')),
+            )
+            for vector_id, entry in entries
+        ]
+        with self._lock:
+            # Drop the full-text rows of documents stored under another vector ID
+            self._conn.executemany(
+                "DELETE FROM documents_fts WHERE rowid IN (SELECT vector_id FROM documents WHERE doc_id = ?)",
+                [(entry.get('id'),) for _, entry in entries],
+            )
+            self._conn.executemany(
+                "DELETE FROM documents_fts WHERE rowid = ?", [(vector_id,) for vector_id, _ in entries]
+            )
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO documents ({COLUMNS}) VALUES ({', '.join('?' * (len(FIELDS) + 1))})",
+                rows,
+            )
+            self._conn.executemany(
+                "INSERT INTO documents_fts (rowid, title, body, keywords) VALUES (?, ?, ?, ?)", lexical_rows
+            )
+    
+    def remove(self, vector_ids: List[int]):
+        """Delete the documents stored under the given vector IDs."""
+        rows = [(int(vector_id),) for vector_id in vector_ids]
+        with self._lock:
+            self._conn.executemany("DELETE FROM documents WHERE vector_id = ?", rows)
+            self._conn.executemany("DELETE FROM documents_fts WHERE rowid = ?", rows)
+    
+    def lexical_search(self, query: str, limit: int, filters: Tuple = ()) -> List[Tuple[int, float]]:
+        """
+        Rank documents by BM25 against the query's tokens, among those
+        matching the normalized filters.
+        
+        Returns:
+            (vector_id, score) pairs, best first; higher scores are better
+        """
+        expression = match_expression(query)
+        if not expression:
+            return []
+        weights = ", ".join(str(weight) for weight in LEXICAL_WEIGHTS)
+        if filters:
+            condition, params = _filter_clause(filters)
+            sql = (
+                f"SELECT documents_fts.rowid, bm25(documents_fts, {weights}) AS score FROM documents_fts "
+                "JOIN documents ON documents.vector_id = documents_fts.rowid "
+                f"WHERE documents_fts MATCH ? AND {condition} ORDER BY score LIMIT ?"
+            )
+        else:
+            sql = (
+                f"SELECT rowid, bm25(documents_fts, {weights}) AS score FROM documents_fts "
+                "WHERE documents_fts MATCH ? ORDER BY score LIMIT ?"
+            )
+            params = []
+        with self._lock:
+            rows = self._conn.execute(sql, (expression, *params, limit)).fetchall()
+        # SQLite's bm25() is negated so that ascending order is best first
+        return [(vector_id, -score) for vector_id, score in rows]
+    
+    def commit(self):
+        """Make the pending writes durable."""
+        with self._lock:
+            self._conn.commit()
+    
+    def close(self):
+        """Commit pending writes and close the database."""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+    
+    @staticmethod
+    def delete_files(path: Path):
+        """Remove a store's database together with its WAL and shared-memory files."""
+        path = Path(path)
+        for suffix in ("", "-wal", "-shm"):
+            path.with_name(path.name + suffix).unlink(missing_ok=True)
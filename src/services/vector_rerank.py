@@ -0,0 +1,107 @@
+"""
+Vector Rerank - Full-precision vectors of a compressed index, kept out of RAM.
+Compressed (sq8, pq) indexes search on their codes; the best candidates are
+re-scored exactly against the full vectors, read from a memory-mapped file
+so only the pages of those candidates become resident.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+
+def rerank(queries: np.ndarray, labels: np.ndarray, lookup: Callable[[np.ndarray], np.ndarray], k: int):
+    """
+    Exact top-k among the candidates of an approximate search.
+    
+    Args:
+        queries: L2-normalized float32 query vectors
+        labels: Candidate vector IDs per query, padded with -1
+        lookup: Full-precision vectors of the given vector IDs
+        k: Results kept per query
+    
+    Returns:
+        (scores, ids) arrays of shape (len(queries), k), padded with -1 IDs
+    """
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    ids = np.full((len(queries), k), -1, dtype=np.int64)
+    found = labels >= 0
+    if not found.any():
+        return scores, ids
+    
+    # Candidates shared by several queries are read once
+    candidates, rows = np.unique(labels[found], return_inverse=True)
+    vectors = lookup(candidates)
+    for i, (query, positions) in enumerate(zip(queries, np.split(rows, np.cumsum(found.sum(axis=1))[:-1]))):
+        exact = vectors[positions] @ query
+        top = np.argsort(-exact, kind="stable")[:k]
+        scores[i, :len(top)] = exact[top]
+        ids[i, :len(top)] = candidates[positions[top]]
+    return scores, ids
+
+
+class RerankVectorStore:
+    """
+    Flat file of float32 vectors addressed by vector ID.
+    
+    Row i holds the vector of ID i, written in place, so replaying a write
+    after a crash is harmless. Reads go through a read-only memory map that
+    is widened as the file grows.
+    """
+    
+    def __init__(self, path: Path, dimension: int):
+        self.path = Path(path)
+        self.dimension = dimension
+        self.row_bytes = dimension * 4
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock = threading.Lock()
+        self._vectors = np.empty((0, dimension), dtype=np.float32)
+    
+    @property
+    def nbytes(self) -> int:
+        """Size of the file, mapped rather than resident."""
+        return os.fstat(self._fd).st_size
+    
+    def write(self, ids: np.ndarray, vectors: np.ndarray):
+        """Store vectors at the rows of their IDs."""
+        if not len(ids):
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        if ids[-1] - ids[0] + 1 == len(ids) and (np.diff(ids) == 1).all():
+            # Appended IDs are consecutive: one write
+            os.pwrite(self._fd, vectors.tobytes(), int(ids[0]) * self.row_bytes)
+            return
+        for vector_id, vector in zip(ids.tolist(), vectors):
+            os.pwrite(self._fd, vector.tobytes(), vector_id * self.row_bytes)
+    
+    def get(self, ids: np.ndarray) -> np.ndarray:
+        """Copy the vectors of the given IDs."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return np.empty((0, self.dimension), dtype=np.float32)
+        with self._lock:
+            if ids.max() >= len(self._vectors):
+                self._remap()
+            vectors = self._vectors
+        return np.asarray(vectors[ids])
+    
+    def _remap(self):
+        """Map every complete row of the file."""
+        rows = self.nbytes // self.row_bytes
+        if rows:
+            self._vectors = np.memmap(self.path, dtype=np.float32, mode="r", shape=(rows, self.dimension))
+    
+    def sync(self):
+        """Make the written vectors durable, before a snapshot refers to them."""
+        os.fsync(self._fd)
+    
+    def close(self):
+        """Close the file; readers holding the old mapping keep it."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
@@ -0,0 +1,146 @@
+"""
+Vector Segments - Append-only write log for the vector index.
+Each index write is persisted as a small segment file instead of rewriting
+the whole index, and segments are merged into a base snapshot later.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, IO, Iterator, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".seg"
+
+
+def atomic_write(path: Path, write: Callable[[IO[bytes]], None], exclusive: bool = False):
+    """
+    Write a file so readers only ever see the old or the complete new
+    contents: write a temporary file, fsync it, then rename it into place.
+    
+    Raises:
+        FileExistsError: If exclusive and the file already exists
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    if exclusive:
+        # A hard link, unlike a rename, fails instead of replacing the target
+        try:
+            os.link(tmp_path, path)
+        finally:
+            os.unlink(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    
+    # Persist the rename itself (not supported on Windows)
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class SegmentLog:
+    """
+    Directory of numbered segment files, one per index write.
+    
+    A segment holds the vectors and IDs added by the write plus a JSON
+    payload (metadata of added documents, tombstoned IDs). Segments are
+    written atomically, so a crash mid-write leaves at most a stray
+    temporary file, never a torn segment.
+    
+    Segment numbers and the IDs in them come from the writer's own state,
+    so a directory has a single writer: the process holding its writer
+    lock (see acquire_writer).
+    """
+    
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._writer_fd: Optional[int] = None
+    
+    def _path(self, seq: int) -> Path:
+        return self.directory / f"{seq:012d}{SEGMENT_SUFFIX}"
+    
+    def _sequence_numbers(self):
+        if not self.directory.exists():
+            return []
+        return sorted(
+            int(path.stem) for path in self.directory.glob(f"*{SEGMENT_SUFFIX}") if path.stem.isdigit()
+        )
+    
+    def acquire_writer(self) -> bool:
+        """
+        Take the directory's writer lock, held until this process exits.
+        
+        Returns:
+            False if another process holds it
+        """
+        if self._writer_fd is not None:
+            return True
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.directory / "writer.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+        self._writer_fd = fd
+        return True
+    
+    def append(self, seq: int, ids: np.ndarray, vectors: np.ndarray, payload: Dict[str, Any]):
+        """
+        Durably write segment number seq.
+        
+        Raises:
+            FileExistsError: If segment seq was already written, e.g. by another process
+        """
+        encoded = np.frombuffer(json.dumps(payload, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+        atomic_write(
+            self._path(seq),
+            lambda f: np.savez(f, ids=ids.astype(np.int64), vectors=vectors.astype(np.float32), payload=encoded),
+            exclusive=True,
+        )
+    
+    def replay(self, after_seq: int) -> Iterator[Tuple[int, np.ndarray, np.ndarray, Dict[str, Any]]]:
+        """
+        Yield (seq, ids, vectors, payload) for every segment newer than after_seq, in order.
+        
+        Stops at the first unreadable segment: later writes depend on it.
+        """
+        for seq in self._sequence_numbers():
+            if seq <= after_seq:
+                continue
+            try:
+                with np.load(self._path(seq)) as data:
+                    payload = json.loads(data["payload"].tobytes().decode("utf-8"))
+                    yield seq, data["ids"], data["vectors"], payload
+            except Exception as e:
+                logger.error(f"Stopping segment replay at unreadable segment {seq}: {str(e)}")
+                return
+    
+    def prune(self, upto_seq: int):
+        """Delete segments already merged into a snapshot."""
+        for seq in self._sequence_numbers():
+            if seq <= upto_seq:
+                self._path(seq).unlink(missing_ok=True)
+    
+    def discard_partial(self):
+        """Remove temporary files left by writes interrupted by a crash."""
+        if self.directory.exists():
+            for tmp_path in self.directory.glob("*.tmp"):
+                tmp_path.unlink(missing_ok=True)
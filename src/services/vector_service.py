@@ -3,85 +3,880 @@ Vector Service - Semantic search using FAISS and sentence transformers.
 Handles document embeddings and similarity search for legal content.
 """
 
+import asyncio
+import contextlib
+import importlib.util
 import json
 import logging
-from typing import List, Dict, Any, Optional
+import math
+import multiprocessing
+import os
+import shutil
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Set, Tuple
 from pathlib import Path
 import pickle
 
 try:
     import faiss
-    from sentence_transformers import SentenceTransformer
     import numpy as np
+    from src.services.embedding_model import ONNX_AVAILABLE, is_onnx_model, load_encoder
+    from src.services.embedding_cache import EmbeddingCache, normalize_text, text_key
+    from src.services.vector_metadata import VectorMetadataStore, normalize_filters
+    from src.services.vector_segments import SegmentLog, atomic_write
+    from src.services.vector_rerank import RerankVectorStore, rerank
+    from src.services.query_batcher import QueryBatcher
+    from src.services.query_cache import LRUCache
+    from src.services.lexical import reciprocal_rank_fusion
+    from src.services.chunking import PassageChunker
+    from src.services.rebuild_job import RebuildJob
+    # sentence-transformers (and PyTorch) is only imported when the model loads
+    if not ONNX_AVAILABLE and importlib.util.find_spec("sentence_transformers") is None:
+        raise ImportError("no sentence encoder backend installed")
     VECTOR_AVAILABLE = True
 except ImportError:
     VECTOR_AVAILABLE = False
-    logging.warning("FAISS, sentence-transformers, or numpy not available. Vector search will be disabled.")
+    logging.warning("FAISS, numpy or a sentence encoder backend (sentence-transformers or ONNX Runtime) not available. Vector search will be disabled.")
 
 from src.core.settings import settings
 
 logger = logging.getLogger(__name__)
 
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+QUANTIZATION_TYPES = ("none", "sq8", "pq")
+
+# FAISS warns below ~39 training points per IVF centroid
+IVF_MIN_POINTS_PER_CENTROID = 39
+
+# Training sample size per IVF centroid when building from a stream
+IVF_TRAIN_POINTS_PER_CENTROID = 64
+
+# Enough to estimate the per-dimension ranges of an 8-bit scalar quantizer
+SQ_TRAIN_POINTS = 20000
+
+METADATA_FORMAT_VERSION = 4
+
+# Filtered ANN searches widen nprobe/efSearch by 1/selectivity, up to this
+# factor, so that the same number of matching vectors is visited
+FILTER_MAX_WIDENING = 16
+
+# Map flat vector storage read-only instead of copying it into each worker
+if VECTOR_AVAILABLE:
+    INDEX_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    INDEX_READ_FLAGS = INDEX_MMAP_FLAGS | faiss.IO_FLAG_READ_ONLY if INDEX_MMAP_FLAGS else 0
+
+
+def _full_vectors_path(documents_path: Path) -> Path:
+    """Full-vector store of the same generation as a documents database."""
+    return documents_path.with_suffix(".vectors")
+
 
 class VectorService:
     """Service class for vector-based semantic search."""
     
-    def __init__(self):
-        self.model = None
+    def __init__(self, data_dir: Optional[Path] = None):
+        self._model = None
+        self._model_failed = False
+        self._model_lock = threading.Lock()
+        self._chunker = None
         self.index = None
-        self.metadata = []
-        self.index_path = Path("data/vector_index")
-        self.metadata_path = Path("data/vector_metadata.json")
+        # Whether self.index is backed by a read-only mapping of the index file
+        self.index_mmapped = False
+        # Vector ID <-> document metadata, kept on disk
+        self.metadata: Optional[VectorMetadataStore] = None
+        # Full vectors of a compressed index, for re-ranking (None when uncompressed)
+        self.full_vectors: Optional[RerankVectorStore] = None
+        # Vector IDs still stored in FAISS whose document was removed or replaced
+        self.tombstones: Set[int] = set()
+        self.next_id = 0
+        # Tools such as the benchmark build indexes beside the live one
+        self.data_dir = Path(data_dir) if data_dir is not None else Path("data")
+        # The metadata file is the commit point of a snapshot; it names the
+        # index file it belongs to and the last segment merged into it
+        self.metadata_path = self.data_dir / "vector_metadata.json"
+        self.index_path = self.data_dir / "vector_index"
+        # Rebuilds fill a new documents database; the snapshot switches to it
+        self.documents_generation = 0
+        self.committed_documents_path: Optional[Path] = None
+        self.segments = SegmentLog(self.data_dir / "vector_segments") if VECTOR_AVAILABLE else None
+        self.snapshot_no = 0
+        self.snapshot_seq = 0
+        self.segment_seq = 0
+        # Whether this process logged segments of its own (merged on close)
+        self.segments_written = False
+        
+        self._write_lock = threading.Lock()
+        self._tombstone_selector = None
+        # Normalized filters -> matching live vector IDs (and their selector),
+        # dropped whenever the live documents change
+        self._filter_cache: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self.filter_stats = {"exact": 0, "selector": 0}
+        # Bumped by every add, remove, compaction and rebuild; cached results
+        # of older versions are never served
+        self.index_version = 0
+        self._compaction_task: Optional[asyncio.Task] = None
+        self._merge_task: Optional[asyncio.Task] = None
+        # Serialises snapshot writes from merges, compactions and rebuilds
+        self._save_lock = asyncio.Lock()
+        
+        # Persistent document embeddings, so rebuilds only encode changed text
+        self.embedding_cache = None
+        # Concurrent searches are encoded and searched together off the event loop
+        self.query_batcher = None
+        # Repeated questions skip the model (embeddings) and the index (results)
+        self.query_embedding_cache = LRUCache(
+            settings.vector_query_cache_size, settings.vector_query_cache_ttl_seconds
+        ) if VECTOR_AVAILABLE else None
+        self.result_cache = LRUCache(
+            settings.vector_result_cache_size, settings.vector_result_cache_ttl_seconds
+        ) if VECTOR_AVAILABLE else None
+        # Counters from the most recent rebuild_index call
+        self.last_rebuild_stats: Dict[str, Any] = {}
+        # Writes made while a rebuild runs, replayed onto the new index
+        self._rebuild_journal: Optional[List[Tuple[str, Any]]] = None
+        # Set while the rebuilt index is being snapshotted; writes wait for it
+        self._swapping: Optional[asyncio.Event] = None
+        self.rebuild_job = RebuildJob() if VECTOR_AVAILABLE else None
+        # Called with the IDs of documents added, replaced or removed, or with
+        # None once a rebuild has replaced every document (e.g. answer caches)
+        self.change_listeners: List[Callable[[Optional[List[str]]], None]] = []
         
         if VECTOR_AVAILABLE:
-            self._initialize_model()
+            self.query_batcher = QueryBatcher(
+                self._search_batch,
+                max_batch_size=settings.vector_query_batch_size,
+                max_wait_ms=settings.vector_query_batch_wait_ms,
+                thread_name="vector-search",
+            )
+            if settings.vector_embedding_cache_enabled:
+                self.embedding_cache = EmbeddingCache(
+                    Path(settings.vector_embedding_cache_dir),
+                    settings.vector_model,
+                    settings.vector_dimension,
+                )
             self._load_or_create_index()
     
+    @property
+    def model(self):
+        """Sentence transformer model, loaded on first use."""
+        if self._model is None and VECTOR_AVAILABLE and not self._model_failed:
+            with self._model_lock:
+                if self._model is None and not self._model_failed:
+                    self._initialize_model()
+        return self._model
+    
+    @property
+    def chunker(self) -> "PassageChunker":
+        """Passage splitter sized to what the model reads, measured with its tokenizer."""
+        if self._chunker is None:
+            model = self.model
+            max_tokens = settings.vector_chunk_max_tokens
+            if not max_tokens:
+                # Leave room for the [CLS]/[SEP] tokens the encoder adds
+                max_tokens = (getattr(model, 'max_seq_length', None) or 128) - 2
+            self._chunker = PassageChunker(
+                max_tokens,
+                settings.vector_chunk_overlap_tokens,
+                tokenizer=getattr(model, 'tokenizer', None),
+            )
+        return self._chunker
+    
+    def _passages(self, documents: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Split documents into the passages that are actually embedded."""
+        return list(self.chunker.chunk_documents(documents))
+    
+    def _chunk_batches(self, batches: Iterable[List[Dict[str, Any]]]) -> Iterator[List[Dict[str, Any]]]:
+        """Split each batch of documents into passages, dropping batches left empty."""
+        for batch in batches:
+            passages = self._passages(batch)
+            if passages:
+                yield passages
+    
     def _initialize_model(self):
-        """Initialize the sentence transformer model."""
+        """Initialize the sentence encoder (PyTorch model, or its ONNX export)."""
         try:
             # Use a multilingual model that supports Arabic, French, and English
-            self.model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+            self._model = _shared_encoder(settings.vector_model)
             logger.info("Vector model initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize vector model: {str(e)}")
-            self.model = None
+            self._model = None
+            self._model_failed = True
     
     def _load_or_create_index(self):
-        """Load existing index or create a new one."""
+        """Load the latest snapshot and replay newer segments, or create a new index."""
         try:
-            if self.index_path.exists() and self.metadata_path.exists():
-                # Load existing index
-                self.index = faiss.read_index(str(self.index_path))
+            stored = None
+            if self.metadata_path.exists():
                 with open(self.metadata_path, 'r', encoding='utf-8') as f:
-                    self.metadata = json.load(f)
-                logger.info(f"Loaded existing vector index with {self.index.ntotal} vectors")
+                    stored = json.load(f)
+                if isinstance(stored, dict) and stored.get('index_file'):
+                    self.index_path = self.data_dir / stored['index_file']
+            
+            if stored is not None and self.index_path.exists():
+                # Load existing index, memory-mapped so workers share its pages
+                index = faiss.read_index(str(self.index_path), INDEX_READ_FLAGS)
+                self.index_mmapped = bool(INDEX_READ_FLAGS)
+                
+                if isinstance(stored, list):
+                    self._load_legacy_index(index, stored)
+                else:
+                    self.index = index
+                    self._load_metadata(stored)
+                    if self._refine_index(index) is not None:
+                        self._convert_refine_index(index)
+                
+                self._apply_search_params()
+                logger.info(
+                    f"Loaded existing {self._index_type()} vector index with {self.index.ntotal} vectors"
+                )
             else:
                 # Create new index
                 self._create_new_index()
+            
+            self._replay_segments()
         except Exception as e:
             logger.error(f"Failed to load vector index: {str(e)}")
             self._create_new_index()
     
-    def _create_new_index(self):
-        """Create a new FAISS index."""
+    def _open_documents(self, generation: int, fresh: bool = False):
+        """
+        Switch to the documents database of the given generation, and to its
+        full-vector store if the index is compressed.
+        
+        Args:
+            generation: Database generation number
+            fresh: Start from an empty database, discarding leftovers of an
+                interrupted rebuild
+        """
+        path = self.data_dir / f"vector_documents.{generation:06d}.db"
+        if self.metadata is not None:
+            self.metadata.close()
+        if fresh:
+            VectorMetadataStore.delete_files(path)
+            _full_vectors_path(path).unlink(missing_ok=True)
+        self.metadata = VectorMetadataStore(path)
+        self.documents_generation = generation
+        self._open_full_vectors()
+    
+    def _open_full_vectors(self):
+        """Open the full-vector store of the documents database if the index is compressed."""
+        if self.full_vectors is not None:
+            self.full_vectors.close()
+            self.full_vectors = None
+        if self._quantization() not in (None, "none"):
+            self.full_vectors = RerankVectorStore(_full_vectors_path(self.metadata.path), self.index.d)
+    
+    def _load_metadata(self, stored: Dict[str, Any]):
+        """Restore the documents database and tombstones from the persisted metadata."""
+        if stored.get('documents_file'):
+            self._open_documents(stored['documents_generation'])
+            self.committed_documents_path = self.metadata.path
+        else:
+            # Snapshots before format 4 kept the documents in the JSON file
+            self._open_documents(self.documents_generation + 1, fresh=True)
+            self.metadata.put((entry.pop('vector_id'), entry) for entry in stored.get('documents', []))
+            self.metadata.commit()
+        self.tombstones = set(stored.get('tombstones', []))
+        self.next_id = stored.get('next_id', int(self.metadata.vector_ids().max(initial=-1)) + 1)
+        self.snapshot_no = stored.get('snapshot_no', 0)
+        self.snapshot_seq = self.segment_seq = stored.get('segment_seq', 0)
+        self._tombstone_selector = None
+    
+    def _replay_segments(self):
+        """Re-apply writes logged after the loaded snapshot."""
+        self.segments.discard_partial()
+        replayed = 0
+        for seq, ids, vectors, payload in self.segments.replay(self.snapshot_seq):
+            self._apply_segment(ids, vectors, payload)
+            self.segment_seq = seq
+            replayed += 1
+        self.metadata.commit()
+        if replayed:
+            logger.info(f"Replayed {replayed} vector index segments")
+    
+    def _apply_segment(self, ids: "np.ndarray", vectors: "np.ndarray", payload: Dict[str, Any]):
+        """Apply one logged write: added vectors and metadata, then tombstones."""
+        if len(ids):
+            with self._write_lock:
+                self._ensure_writable()
+                self.index.add_with_ids(vectors, ids)
+                if self.full_vectors is not None:
+                    self.full_vectors.write(ids, vectors)
+        
+        self.metadata.put((entry.pop('vector_id'), entry) for entry in payload.get('documents', []))
+        
+        removed = payload.get('removed', [])
+        self.metadata.remove(removed)
+        self._add_tombstones(removed)
+        
+        self.next_id = max(self.next_id, payload.get('next_id', 0))
+        self._documents_changed()
+    
+    def _load_legacy_index(self, index, stored: List[Dict[str, Any]]):
+        """
+        Convert a positional index (row number == metadata position) to an
+        ID-mapped one. Rows are assigned their position as vector ID.
+        """
+        vectors = index.reconstruct_n(0, index.ntotal)
+        ids = np.arange(index.ntotal, dtype=np.int64)
+        
+        self.index = self._new_index(index.ntotal)
+        self.index_mmapped = False
+        self._train_index(self.index, vectors)
+        self.index.add_with_ids(vectors, ids)
+        
+        self._open_documents(self.documents_generation + 1, fresh=True)
+        if self.full_vectors is not None:
+            self.full_vectors.write(ids, vectors)
+        self.metadata.put(enumerate(stored[:index.ntotal]))
+        self.metadata.commit()
+        # Rows left behind by the old remove_document have no metadata
+        self.tombstones = set(range(index.ntotal)) - set(self.metadata.vector_ids().tolist())
+        self.next_id = index.ntotal
+        self._documents_changed()
+        logger.info(f"Converted legacy vector index with {index.ntotal} vectors to ID-mapped format")
+    
+    def _convert_refine_index(self, index):
+        """
+        Move the full vectors of a compressed index saved with its re-ranking
+        wrapper (IndexRefineFlat, which keeps them in RAM) into the
+        full-vector store, rebuild the index without them and snapshot it.
+        """
+        refine = self._refine_index(index)
+        vectors = faiss.downcast_index(refine.refine_index).reconstruct_n(0, index.ntotal)
+        ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+        base = faiss.downcast_index(refine.base_index)
+        quantization = self._quantization(base)
+        
+        self.index = self.build_index(vectors, ids, index_type=self._index_type(base), quantization=quantization)
+        self.index_mmapped = False
+        self._open_full_vectors()
+        self.full_vectors.write(ids, vectors)
+        # Other workers convert their own copy until the writer restarts
+        if self.segments.acquire_writer():
+            self._write_snapshot(*self._snapshot_state())
+        logger.info(f"Moved the re-ranking vectors of the {quantization} vector index out of memory")
+    
+    def _select_index_type(self, num_vectors: int) -> str:
+        """Pick the index family for a corpus of the given size."""
+        configured = settings.vector_index_type.lower()
+        if configured in INDEX_TYPES:
+            return configured
+        if configured != "auto":
+            logger.warning(f"Unknown vector_index_type '{configured}', selecting automatically")
+        
+        if num_vectors <= settings.vector_flat_max_vectors:
+            return "flat"
+        if num_vectors <= settings.vector_hnsw_max_vectors:
+            return "hnsw"
+        return "ivf"
+    
+    def _ivf_nlist(self, num_vectors: int) -> int:
+        """Number of IVF centroids for a corpus of the given size."""
+        nlist = settings.vector_ivf_nlist or int(4 * math.sqrt(max(num_vectors, 1)))
+        # Never ask for more centroids than the training set can support
+        return max(1, min(nlist, num_vectors // IVF_MIN_POINTS_PER_CENTROID or 1))
+    
+    def _pq_min_vectors(self) -> int:
+        """Smallest corpus whose PQ codebooks can be trained without degenerate centroids."""
+        return (1 << settings.vector_pq_nbits) * IVF_MIN_POINTS_PER_CENTROID
+    
+    def _select_quantization(self, num_vectors: int, quantization: Optional[str] = None) -> str:
+        """Pick the vector compression for a corpus of the given size."""
+        quantization = (quantization or settings.vector_quantization).lower()
+        if quantization not in QUANTIZATION_TYPES:
+            logger.warning(f"Unknown vector_quantization '{quantization}', storing full vectors")
+            return "none"
+        if quantization == "pq" and num_vectors < self._pq_min_vectors():
+            logger.warning(
+                f"Corpus of {num_vectors} vectors is too small to train PQ codebooks, using sq8"
+            )
+            return "sq8"
+        return quantization
+    
+    def _new_index(
+        self,
+        num_vectors: int = 0,
+        index_type: Optional[str] = None,
+        quantization: Optional[str] = None,
+    ):
+        """
+        Build an empty ID-mapped FAISS index sized for the expected corpus.
+        
+        Compressed indexes (sq8, pq) only hold their codes; searches re-rank
+        the best candidates against the full vectors of the full-vector
+        store, which is memory-mapped and only read for those candidates.
+        
+        Args:
+            num_vectors: Expected number of vectors, used for automatic index selection
+            index_type: Index family; defaults to the configured/automatic choice
+            quantization: Vector compression; defaults to settings.vector_quantization
+        """
+        dimension = settings.vector_dimension
+        quantization = self._select_quantization(num_vectors, quantization)
+        # Product quantization is only offered on top of IVF
+        index_type = "ivf" if quantization == "pq" else (index_type or self._select_index_type(num_vectors))
+        sq8 = faiss.ScalarQuantizer.QT_8bit
+        
+        # Inner product on normalized vectors gives cosine similarity
+        if index_type == "hnsw":
+            if quantization == "sq8":
+                index = faiss.IndexHNSWSQ(dimension, sq8, settings.vector_hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexHNSWFlat(dimension, settings.vector_hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = settings.vector_hnsw_ef_construction
+        elif index_type == "ivf":
+            quantizer = faiss.IndexFlatIP(dimension)
+            nlist = self._ivf_nlist(num_vectors)
+            if quantization == "pq":
+                index = faiss.IndexIVFPQ(
+                    quantizer, dimension, nlist, settings.vector_pq_m, settings.vector_pq_nbits,
+                    faiss.METRIC_INNER_PRODUCT,
+                )
+            elif quantization == "sq8":
+                index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, sq8, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        elif quantization == "sq8":
+            index = faiss.IndexScalarQuantizer(dimension, sq8, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexFlatIP(dimension)
+        
+        # Stable int64 IDs that survive deletes, with reconstruction by ID
+        return faiss.IndexIDMap2(index)
+    
+    def _create_new_index(self, num_vectors: int = 0):
+        """Create a new, empty FAISS index and reset the metadata."""
         try:
-            # Create index for 384-dimensional vectors (multilingual model)
-            dimension = 384
-            self.index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
-            self.metadata = []
-            logger.info("Created new vector index")
+            self.index = self._new_index(num_vectors)
+            self.index_mmapped = False
+            self._open_documents(self.documents_generation + 1, fresh=True)
+            self.tombstones = set()
+            self.next_id = 0
+            self._documents_changed()
+            self._apply_search_params()
+            logger.info(f"Created new {self._index_type()} vector index")
         except Exception as e:
             logger.error(f"Failed to create vector index: {str(e)}")
             self.index = None
     
+    def _refine_index(self, index=None):
+        """Return the re-ranking wrapper of an index saved before the full-vector store, or None."""
+        index = self.index if index is None else index
+        if isinstance(index, faiss.IndexIDMap2):
+            index = faiss.downcast_index(index.index)
+        return index if isinstance(index, faiss.IndexRefine) else None
+    
+    def _inner_index(self, index=None):
+        """Return the index family wrapped by the ID map."""
+        index = self.index if index is None else index
+        if isinstance(index, faiss.IndexIDMap2):
+            index = faiss.downcast_index(index.index)
+        return index
+    
+    def _index_type(self, index=None) -> Optional[str]:
+        """Return the family of the active index."""
+        if (self.index if index is None else index) is None:
+            return None
+        inner = self._inner_index(index)
+        if isinstance(inner, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(inner, faiss.IndexIVF):
+            return "ivf"
+        return "flat"
+    
+    def _quantization(self, index=None) -> Optional[str]:
+        """Return the vector compression of the active index."""
+        if (self.index if index is None else index) is None:
+            return None
+        inner = self._inner_index(index)
+        if isinstance(inner, faiss.IndexIVFPQ):
+            return "pq"
+        if isinstance(inner, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer, faiss.IndexHNSWSQ)):
+            return "sq8"
+        return "none"
+    
+    def _apply_search_params(self, index=None):
+        """Apply query-time tuning knobs (nprobe / efSearch) to an index."""
+        inner = self._inner_index(index)
+        index_type = self._index_type(index)
+        if index_type == "ivf":
+            inner.nprobe = min(settings.vector_ivf_nprobe, inner.nlist)
+        elif index_type == "hnsw":
+            inner.hnsw.efSearch = settings.vector_hnsw_ef_search
+    
+    def _search_parameters(self, selector=None, widening: float = 1.0):
+        """
+        Build per-query search parameters for the active index family.
+        
+        FAISS ignores the index-level nprobe/efSearch once explicit parameters
+        are passed, so they are copied over here, scaled by widening.
+        """
+        if selector is None:
+            return None
+        
+        index_type = self._index_type()
+        inner = self._inner_index()
+        if index_type == "ivf":
+            params = faiss.SearchParametersIVF()
+            params.nprobe = min(inner.nlist, math.ceil(inner.nprobe * widening))
+        elif index_type == "hnsw":
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = math.ceil(inner.hnsw.efSearch * widening)
+        else:
+            params = faiss.SearchParameters()
+        params.sel = selector
+        return params
+    
+    def _live_selector(self):
+        """Selector excluding tombstoned vectors, rebuilt only after deletes."""
+        if not self.tombstones:
+            return None
+        if self._tombstone_selector is None:
+            dead = np.fromiter(self.tombstones, dtype=np.int64, count=len(self.tombstones))
+            batch = faiss.IDSelectorBatch(dead)
+            self._tombstone_selector = faiss.IDSelectorNot(batch)
+            # Keep the wrapped selector alive as long as the outer one
+            self._tombstone_selector.referenced_objects = [batch]
+        return self._tombstone_selector
+    
+    def _train_index(self, index, embeddings: "np.ndarray"):
+        """Train the index on a sample of the corpus if its family requires it."""
+        if index.is_trained:
+            return
+        
+        inner = self._inner_index(index)
+        if isinstance(inner, faiss.IndexIVF):
+            max_points = inner.nlist * 256
+        else:
+            max_points = SQ_TRAIN_POINTS
+        if isinstance(inner, faiss.IndexIVFPQ):
+            max_points = max(max_points, self._pq_min_vectors() * 4)
+        if len(embeddings) > max_points:
+            rng = np.random.default_rng(0)
+            sample = embeddings[rng.choice(len(embeddings), max_points, replace=False)]
+        else:
+            sample = embeddings
+        
+        index.train(sample)
+        logger.info(f"Trained {self._index_type(index)} index on {len(sample)} vectors")
+    
+    def _encode(self, texts: List[str]) -> "np.ndarray":
+        """Encode texts into L2-normalized float32 embeddings."""
+        embeddings = self.model.encode(texts, show_progress_bar=False)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        faiss.normalize_L2(embeddings)
+        return embeddings
+    
+    def encode_queries(self, queries: List[str]) -> "np.ndarray":
+        """
+        Encode search queries into the index's embedding space.
+        
+        Embeddings of recently seen queries (after whitespace/Unicode
+        normalisation) come from the query cache; only new queries reach
+        the model, each once per call.
+        """
+        texts = [normalize_text(query) for query in queries]
+        embeddings = np.empty((len(texts), settings.vector_dimension), dtype=np.float32)
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            cached = self.query_embedding_cache.get(text)
+            if cached is None:
+                missing.setdefault(text, []).append(i)
+            else:
+                embeddings[i] = cached
+        
+        if missing:
+            encoded = self._encode(list(missing))
+            for (text, positions), embedding in zip(missing.items(), encoded):
+                embeddings[positions] = embedding
+                self.query_embedding_cache.put(text, embedding.copy())
+        return embeddings
+    
+    def _cached_embeddings(self, texts: List[str]):
+        """
+        Look texts up in the embedding cache.
+        
+        Returns:
+            Tuple of (text keys, embeddings with zero rows for misses, indices of the misses)
+        """
+        if self.embedding_cache is None:
+            embeddings = np.zeros((len(texts), settings.vector_dimension), dtype=np.float32)
+            return None, embeddings, np.arange(len(texts))
+        
+        keys = np.fromiter((text_key(text) for text in texts), dtype=np.uint64, count=len(texts))
+        embeddings, missing = self.embedding_cache.lookup(keys)
+        return keys, embeddings, missing
+    
+    def _encode_documents(self, texts: List[str]) -> Tuple["np.ndarray", int, int]:
+        """
+        Encode document texts, reusing cached embeddings of unchanged text.
+        
+        Returns:
+            Tuple of (embeddings, cache hits, cache misses)
+        """
+        keys, embeddings, missing = self._cached_embeddings(texts)
+        
+        if len(missing):
+            encoded = self._encode([texts[i] for i in missing])
+            embeddings[missing] = encoded
+            if self.embedding_cache is not None:
+                # Written once max_pending accumulate, by the next rebuild or on close()
+                self.embedding_cache.put(keys[missing], encoded)
+        
+        return embeddings, len(texts) - len(missing), len(missing)
+    
+    async def _encode_documents_in_pool(self, texts: List[str], pool) -> Tuple["np.ndarray", int, int]:
+        """
+        Like _encode_documents, but cache misses are encoded in the given
+        executor and the cache is read and written off the event loop.
+        """
+        keys, embeddings, missing = await asyncio.to_thread(self._cached_embeddings, texts)
+        
+        if len(missing):
+            loop = asyncio.get_running_loop()
+            misses = [texts[i] for i in missing]
+            if pool is None:
+                encoded = await loop.run_in_executor(None, self._encode, misses)
+            else:
+                encoded = await loop.run_in_executor(pool, _encode_in_worker, misses)
+            embeddings[missing] = encoded
+            if self.embedding_cache is not None:
+                await asyncio.to_thread(self.embedding_cache.put, keys[missing], encoded)
+        
+        return embeddings, len(texts) - len(missing), len(missing)
+    
+    def _encoder_pool(self, workers: int):
+        """
+        Process pool encoding rebuild batches on every core, or a null context
+        (encode in a thread of this process) when a single worker is configured.
+        """
+        if workers <= 1:
+            return contextlib.nullcontext(None)
+        
+        # Split the cores between workers instead of letting each use all of them
+        threads = max(1, (os.cpu_count() or workers) // workers)
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            # Never fork a process that already runs torch/FAISS threads
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_encode_worker,
+            initargs=(settings.vector_model, threads),
+        )
+    
+    async def _encode_stream(self, batches: Iterable[List[Dict[str, Any]]]):
+        """
+        Encode document batches with bounded read-ahead.
+        
+        Yields (documents, embeddings, cache hits, cache misses) in input
+        order. At most two batches per worker are in flight, so memory stays
+        bounded regardless of corpus size. Batches are pulled in a worker
+        thread, since producing one may fetch rows and split text.
+        """
+        workers = settings.vector_encode_workers or os.cpu_count() or 1
+        batches = iter(batches)
+        with self._encoder_pool(workers) as pool:
+            max_in_flight = 2 * workers
+            in_flight = deque()
+            
+            while True:
+                documents = await asyncio.to_thread(next, batches, None)
+                if documents is None:
+                    break
+                texts = [doc['text'] for doc in documents]
+                task = asyncio.ensure_future(self._encode_documents_in_pool(texts, pool))
+                in_flight.append((documents, task))
+                if len(in_flight) >= max_in_flight:
+                    documents, task = in_flight.popleft()
+                    yield (documents, *await task)
+            
+            while in_flight:
+                documents, task = in_flight.popleft()
+                yield (documents, *await task)
+        
+        if self.embedding_cache is not None:
+            await asyncio.to_thread(self.embedding_cache.flush)
+    
+    def _tombstone(self, parent_ids: List[str]) -> List[int]:
+        """
+        Mark every passage vector of the given documents as deleted. The
+        vectors stay in FAISS until compaction.
+        
+        Returns:
+            The tombstoned vector IDs (empty if none of the documents is indexed)
+        """
+        vector_ids = self.metadata.parent_vector_ids(parent_ids)
+        if vector_ids:
+            self.metadata.remove(vector_ids)
+            self._add_tombstones(vector_ids)
+        return vector_ids
+    
+    def _add_tombstones(self, vector_ids: List[int]):
+        """Record deleted vector IDs under the write lock, so the search thread sees a consistent set."""
+        with self._write_lock:
+            self.tombstones.update(vector_ids)
+            self._tombstone_selector = None
+            self._filter_cache.clear()
+            self._bump_index_version()
+    
+    def _documents_changed(self):
+        """Drop the selectors derived from the live documents; searches rebuild them."""
+        with self._write_lock:
+            self._tombstone_selector = None
+            self._filter_cache.clear()
+            self._bump_index_version()
+    
+    def add_change_listener(self, listener: Callable[[Optional[List[str]]], None]):
+        """Register a callable notified of document changes (see change_listeners)."""
+        self.change_listeners.append(listener)
+    
+    def _notify_changed(self, doc_ids: Optional[List[str]]):
+        """Tell the change listeners which documents changed; their errors are only logged."""
+        for listener in self.change_listeners:
+            try:
+                listener(doc_ids)
+            except Exception as e:
+                logger.error(f"Vector index change listener failed: {str(e)}")
+    
+    def _bump_index_version(self):
+        """Invalidate cached search results. Caller must hold the write lock."""
+        self.index_version += 1
+        if self.result_cache is not None:
+            self.result_cache.clear()
+    
+    def _claim_writer(self):
+        """
+        Make this process the only one writing the index's data directory.
+        
+        Segment numbers and vector IDs are allocated from this process's own
+        state, so writes from a second process (another uvicorn worker)
+        would overwrite its segments and reuse its IDs. The first process
+        to write keeps the role until it exits; send index writes (ETL,
+        rebuilds, duplicate pruning) to that one, or run a single worker.
+        
+        Raises:
+            RuntimeError: If another process is the writer
+        """
+        if not self.segments.acquire_writer():
+            raise RuntimeError(f"vector index in {self.data_dir} is written by another process")
+    
+    def _ensure_writable(self):
+        """
+        Swap a memory-mapped index for a private in-memory copy before the
+        first write. FAISS aborts when asked to grow a mapped vector. Caller
+        must hold the write lock.
+        
+        The copy ends page sharing with the other workers, which is why
+        close() merges this process's segments into the snapshot: the next
+        start then maps the index without replaying vectors onto it.
+        """
+        if not self.index_mmapped:
+            return
+        self.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+        self._apply_search_params()
+        self.index_mmapped = False
+        logger.warning(
+            f"Copied the memory-mapped vector index ({self.index.ntotal} vectors) into private memory "
+            "for writing; this process no longer shares its pages"
+        )
+    
+    def _append(
+        self,
+        embeddings: "np.ndarray",
+        documents: List[Dict[str, Any]],
+    ) -> Tuple["np.ndarray", List[int], List[Tuple[int, Dict[str, Any]]]]:
+        """
+        Upsert encoded passages and their metadata into the active index.
+        
+        Returns:
+            Tuple of (new vector IDs, vector IDs retired by replaced documents,
+            stored (vector ID, metadata) entries)
+        """
+        ids = np.arange(self.next_id, self.next_id + len(documents), dtype=np.int64)
+        
+        with self._write_lock:
+            self._ensure_writable()
+            self.index.add_with_ids(embeddings, ids)
+            if self.full_vectors is not None:
+                self.full_vectors.write(ids, embeddings)
+        self.next_id += len(documents)
+        
+        # Replacing a document retires all passages of its previous version
+        removed = self._tombstone(list(dict.fromkeys(doc.get('parent_id', doc['id']) for doc in documents)))
+        
+        # A document passed twice in one write keeps only its last copy,
+        # whose passages start at its last chunk 0
+        last_copy: Dict[str, int] = {}
+        for position, doc in enumerate(documents):
+            if not doc.get('chunk'):
+                last_copy[doc.get('parent_id', doc['id'])] = position
+        
+        entries = []
+        superseded = []
+        for position, (vector_id, doc) in enumerate(zip(ids.tolist(), documents)):
+            if position < last_copy[doc.get('parent_id', doc['id'])]:
+                superseded.append(vector_id)
+                continue
+            entries.append((vector_id, {
+                'id': doc['id'],
+                'type': doc.get('type', 'unknown'),
+                'law_id': doc.get('law_id'),
+                'article_id': doc.get('article_id'),
+                'title': doc.get('title', ''),
+                'content': doc['text'],  # The whole passage
+                'category': doc.get('category'),
+                'publication_date': doc.get('publication_date'),
+                'parent_id': doc.get('parent_id', doc['id']),
+                'chunk': doc.get('chunk', 0),
+                # Indexed for keyword search only
+                'keywords': doc.get('keywords'),
+            }))
+        if superseded:
+            self._add_tombstones(superseded)
+            removed.extend(superseded)
+        self.metadata.put(entries)
+        self._documents_changed()
+        
+        return ids, removed, entries
+    
+    def _log_write(
+        self,
+        ids: "np.ndarray",
+        embeddings: "np.ndarray",
+        removed: List[int],
+        entries: List[Tuple[int, Dict[str, Any]]] = (),
+    ):
+        """
+        Persist one write as a new segment instead of rewriting the index.
+        O(size of the write); merged into the snapshot in the background.
+        """
+        payload = {
+            'next_id': self.next_id,
+            'documents': [{'vector_id': vector_id, **entry} for vector_id, entry in entries],
+            'removed': removed,
+        }
+        self.segment_seq += 1
+        self.segments.append(self.segment_seq, ids, embeddings, payload)
+        self.segments_written = True
+        # The segment is durable, so the documents database may now commit
+        self.metadata.commit()
+        self._schedule_merge()
+    
     async def add_documents(self, documents: List[Dict[str, Any]]) -> bool:
         """
         Add documents to the vector index.
         
+        Documents whose ID is already indexed are replaced. Each document is
+        split into overlapping passages that fit the model, one vector each.
+        
         Args:
-            documents: List of documents with 'text', 'id', and 'metadata' fields
-            
+            documents: List of documents with 'text', 'id', and 'metadata' fields;
+                optional 'keywords' (e.g. law numbers) are indexed for keyword search only
+        
         Returns:
             bool: True if successful, False otherwise
         """
@@ -89,139 +884,1004 @@ class VectorService:
             logger.warning("Vector service not available")
             return False
         
+        if not self.index.is_trained:
+            logger.warning("Vector index is not trained; rebuild the index first")
+            return False
+        
         try:
-            # Extract texts
-            texts = [doc['text'] for doc in documents]
-            
-            # Generate embeddings
-            embeddings = self.model.encode(texts, show_progress_bar=False)
-            
-            # Normalize embeddings for cosine similarity
-            faiss.normalize_L2(embeddings)
+            await self._wait_for_swap()
+            self._claim_writer()
+            passages = self._passages(documents)
+            if not passages:
+                return True
+            embeddings, _, _ = self._encode_documents([doc['text'] for doc in passages])
+            ids, removed, entries = self._append(embeddings, passages)
             
-            # Add to index
-            self.index.add(embeddings.astype(np.float32))
+            # Log the write; the snapshot is rewritten by the background merge
+            self._log_write(ids, embeddings, removed, entries)
+            self._schedule_compaction()
+            if self._rebuild_journal is not None:
+                self._rebuild_journal.append(("add", documents))
+            self._notify_changed([doc['id'] for doc in documents])
             
-            # Add metadata
-            for doc in documents:
-                self.metadata.append({
-                    'id': doc['id'],
-                    'type': doc.get('type', 'unknown'),
-                    'law_id': doc.get('law_id'),
-                    'article_id': doc.get('article_id'),
-                    'title': doc.get('title', ''),
-                    'content': doc['text'][:500],  # Store first 500 chars
-                })
-            
-            # Save index and metadata
-            await self._save_index()
-            
-            logger.info(f"Added {len(documents)} documents to vector index")
+            logger.info(f"Added {len(documents)} documents ({len(passages)} passages) to vector index")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Failed to add documents to vector index: {str(e)}")
             return False
     
     async def search_similar(
-        self, 
-        query: str, 
-        k: int = 5, 
-        threshold: float = 0.7
+        self,
+        query: str,
+        k: int = 5,
+        threshold: float = 0.7,
+        group_by: str = "document",
+        filters: Optional[Dict[str, Any]] = None,
     ) -> List[Dict[str, Any]]:
         """
         Search for similar documents using vector similarity.
         
+        Passages are searched and grouped back to their article/law document
+        (or to their law with group_by="law"); a group scores as its best
+        passage, so k is not filled by several passages of one article.
+        
+        Filters are applied inside the search, not to its results, so a
+        filtered search still returns k hits when k documents match.
+        
+        Concurrent calls are micro-batched: encoding and the FAISS search
+        run once per batch on the batcher's thread, not on the event loop.
+        Results are cached per index version, so a repeated question is
+        answered without touching the model or the index.
+        
         Args:
             query: Search query
             k: Number of results to return
             threshold: Minimum similarity threshold
-            
+            group_by: "document" (article or law) or "law"
+            filters: Optional 'type', 'category', 'law_id' (value or list),
+                'published_after' and 'published_before' (inclusive dates)
+        
         Returns:
-            List of similar documents with scores
+            List of similar documents with scores and their best passage
+        
+        Raises:
+            ValueError: On an unknown filter
         """
-        if not VECTOR_AVAILABLE or not self.model or not self.index:
+        filters = normalize_filters(filters)
+        if not VECTOR_AVAILABLE or self._model_failed or not self.index:
             logger.warning("Vector service not available")
             return []
         
         try:
-            # Generate query embedding
-            query_embedding = self.model.encode([query])
-            faiss.normalize_L2(query_embedding)
-            
-            # Search
-            scores, indices = self.index.search(query_embedding.astype(np.float32), k)
-            
-            # Format results
-            results = []
-            for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-                if idx >= 0 and score >= threshold:
-                    metadata = self.metadata[idx]
-                    results.append({
-                        'id': metadata['id'],
-                        'type': metadata['type'],
-                        'law_id': metadata.get('law_id'),
-                        'article_id': metadata.get('article_id'),
-                        'title': metadata.get('title', ''),
-                        'content': metadata.get('content', ''),
-                        'score': float(score),
-                        'rank': i + 1,
-                    })
+            key = ("dense", self.index_version, normalize_text(query), k, threshold, group_by, filters)
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                return [dict(result) for result in cached]
             
+            results = await self.query_batcher.submit((query, k, threshold, group_by, filters))
+            self.result_cache.put(key, [dict(result) for result in results])
             logger.info(f"Found {len(results)} similar documents for query: {query[:50]}...")
             return results
-            
+        
         except Exception as e:
             logger.error(f"Failed to search vector index: {str(e)}")
             return []
     
-    async def _save_index(self):
-        """Save the vector index and metadata to disk."""
-        try:
-            # Create data directory if it doesn't exist
-            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+    def _search_batch(self, requests: List[Tuple[str, int, float, str, Tuple]]) -> List[List[Dict[str, Any]]]:
+        """
+        Encode and search a batch of (query, k, threshold, group_by, filters) requests.
+        
+        Runs on the batcher's thread: one encode call for the whole batch
+        and one FAISS search per distinct filter. Passages are over-fetched
+        so that k distinct groups remain after grouping.
+        """
+        query_embeddings = self.encode_queries([request[0] for request in requests])
+        # A rebuild swapped in meanwhile would pair old vector IDs with new documents
+        generation = self.documents_generation
+        by_filters: Dict[Tuple, List[int]] = {}
+        for i, request in enumerate(requests):
+            by_filters.setdefault(request[4], []).append(i)
+        
+        hits = [None] * len(requests)
+        for filters, positions in by_filters.items():
+            fetch = max(requests[i][1] for i in positions) * settings.vector_chunk_search_factor
+            scores, ids = self._search_vectors(query_embeddings[positions], fetch, filters)
+            for row, i in enumerate(positions):
+                hits[i] = (scores[row], ids[row])
+        
+        documents = self.metadata.get_many(np.unique(np.concatenate([ids for _, ids in hits])).tolist())
+        if self.documents_generation != generation:
+            return self._search_batch(requests)
+        return [
+            self._format_results(scores, ids, documents, k, threshold, group_by)
+            for (scores, ids), (_, k, threshold, group_by, _) in zip(hits, requests)
+        ]
+    
+    def _search_vectors(self, queries: "np.ndarray", k: int, filters: Tuple = ()):
+        """
+        Search the live vectors matching the filters.
+        
+        Small filtered sets are scored exactly, which always fills k. Larger
+        ones are searched through an ID selector with nprobe/efSearch widened
+        by the inverse selectivity, so about as many candidate vectors are
+        compared as in an unfiltered search.
+        
+        Compressed indexes fetch vector_rerank_factor times k candidates,
+        re-scored against their full vectors.
+        
+        Returns:
+            (scores, ids) arrays of shape (len(queries), k), padded with -1 IDs
+        """
+        with self._write_lock:
+            if not filters:
+                # Skip tombstoned vectors inside FAISS
+                return self._index_search(queries, k, self._search_parameters(self._live_selector()))
             
-            # Save FAISS index
-            faiss.write_index(self.index, str(self.index_path))
+            allowed = self._filter_selection(filters)
+            ids = allowed["ids"]
+            approximate = self.full_vectors is not None or self._index_type() != "flat"
+            if approximate and len(ids) <= settings.vector_filter_exact_max:
+                self.filter_stats["exact"] += 1
+                vectors = self._reconstruct(ids)
+            else:
+                self.filter_stats["selector"] += 1
+                if allowed["selector"] is None:
+                    allowed["selector"] = faiss.IDSelectorBatch(ids)
+                live = self.index.ntotal - len(self.tombstones)
+                widening = min(FILTER_MAX_WIDENING, live / max(len(ids), 1))
+                params = self._search_parameters(allowed["selector"], max(1.0, widening))
+                return self._index_search(queries, k, params)
+        
+        return self._exact_search(queries, vectors, ids, k)
+    
+    def _index_search(self, queries: "np.ndarray", k: int, params=None):
+        """FAISS search, re-ranked with the full vectors on a compressed index. Caller must hold the write lock."""
+        if self.full_vectors is None:
+            return self.index.search(queries, k, params=params)
+        _, candidates = self.index.search(queries, k * settings.vector_rerank_factor, params=params)
+        return rerank(queries, candidates, self.full_vectors.get, k)
+    
+    def _filter_selection(self, filters: Tuple) -> Dict[str, Any]:
+        """
+        Live vector IDs matching normalized filters, looked up through the
+        per-attribute indexes of the documents database and kept in an LRU
+        cache until the documents change. Caller must hold the write lock.
+        """
+        allowed = self._filter_cache.get(filters)
+        if allowed is None:
+            allowed = {"ids": self.metadata.vector_ids(filters), "selector": None}
+            self._filter_cache[filters] = allowed
+            while len(self._filter_cache) > settings.vector_filter_cache_size:
+                self._filter_cache.popitem(last=False)
+        else:
+            self._filter_cache.move_to_end(filters)
+        return allowed
+    
+    def _reconstruct(self, ids: "np.ndarray") -> "np.ndarray":
+        """Full-precision stored vectors for the given IDs. Caller must hold the write lock."""
+        if not len(ids):
+            return np.empty((0, self.index.d), dtype=np.float32)
+        if self.full_vectors is not None:
+            return self.full_vectors.get(ids)
+        inner = self._inner_index()
+        if isinstance(inner, faiss.IndexIVF) and inner.direct_map.no():
+            # IVF lists are not addressable by position until mapped
+            inner.make_direct_map()
+        return self.index.reconstruct_batch(ids)
+    
+    @staticmethod
+    def _exact_search(queries: "np.ndarray", vectors: "np.ndarray", ids: "np.ndarray", k: int):
+        """Brute-force inner-product top-k, shaped like a FAISS search result."""
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        labels = np.full((len(queries), k), -1, dtype=np.int64)
+        if not len(ids):
+            return scores, labels
+        
+        similarities = queries @ vectors.T
+        n = min(k, len(ids))
+        top = np.argpartition(-similarities, n - 1, axis=1)[:, :n]
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        scores[:, :n] = np.take_along_axis(top_scores, order, axis=1)
+        labels[:, :n] = ids[np.take_along_axis(top, order, axis=1)]
+        return scores, labels
+    
+    @staticmethod
+    def _group_key(metadata: Dict[str, Any], group_by: str) -> str:
+        """ID of the result a passage belongs to."""
+        if group_by == "law" and metadata.get('law_id') is not None:
+            return f"law_{metadata['law_id']}"
+        return metadata.get('parent_id') or metadata['id']
+    
+    def _result(self, metadata: Dict[str, Any], group_by: str = "document") -> Dict[str, Any]:
+        """Search result for a group, described by its best passage."""
+        return {
+            'id': self._group_key(metadata, group_by),
+            'document_id': metadata.get('parent_id') or metadata['id'],
+            'type': 'law' if group_by == "law" else metadata['type'],
+            'law_id': metadata.get('law_id'),
+            'article_id': metadata.get('article_id'),
+            'title': metadata.get('title', ''),
+            'content': metadata.get('content', ''),
+            'category': metadata.get('category'),
+            'publication_date': metadata.get('publication_date'),
+            'chunk': metadata.get('chunk', 0),
+        }
+    
+    def _format_results(
+        self,
+        scores: "np.ndarray",
+        ids: "np.ndarray",
+        documents: Dict[int, Dict[str, Any]],
+        k: int,
+        threshold: float,
+        group_by: str = "document",
+    ) -> List[Dict[str, Any]]:
+        """
+        Group one row of FAISS passage hits into the top-k documents (or
+        laws) above the threshold. Hits arrive best first, so the first
+        passage seen of a group is its max-sim score.
+        """
+        results = []
+        groups: Dict[str, Dict[str, Any]] = {}
+        for score, vector_id in zip(scores, ids):
+            metadata = documents.get(int(vector_id))
+            if metadata is None or score < threshold:
+                continue
+            key = self._group_key(metadata, group_by)
+            if key in groups:
+                groups[key]['matched_passages'] += 1
+                continue
+            if len(results) == k:
+                continue
+            result = {
+                **self._result(metadata, group_by),
+                'score': float(score),
+                'matched_passages': 1,
+                'rank': len(results) + 1,
+            }
+            groups[key] = result
+            results.append(result)
+        return results
+    
+    async def hybrid_search(
+        self,
+        query: str,
+        k: int = 10,
+        threshold: Optional[float] = None,
+        candidates: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Search with BM25 keyword matching and vector similarity, fused by rank.
+        
+        Keyword search catches exact references (law numbers such as
+        "01-23", rare terms) that embeddings blur; dense search catches
+        paraphrases. Both run concurrently and their rankings are merged
+        with reciprocal-rank fusion.
+        
+        Args:
+            query: Search query
+            k: Number of results to return
+            threshold: Minimum similarity for dense candidates (default: none)
+            candidates: Results taken from each retriever before fusion
+            filters: Restrict both retrievers (see search_similar)
+        
+        Returns:
+            List of documents with fused 'score', plus 'dense_score' and
+            'lexical_score' where the document was found by that retriever
+        
+        Raises:
+            ValueError: On an unknown filter
+        """
+        normalized = normalize_filters(filters)
+        if not VECTOR_AVAILABLE or not self.index:
+            logger.warning("Vector service not available")
+            return []
+        
+        candidates = max(k, candidates or settings.vector_hybrid_candidates)
+        key = ("hybrid", self.index_version, normalize_text(query), k, threshold, candidates, normalized)
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return [dict(result) for result in cached]
+        
+        dense, lexical = await asyncio.gather(
+            self.search_similar(
+                query,
+                k=candidates,
+                threshold=-1.0 if threshold is None else threshold,
+                filters=filters,
+            ),
+            # Passages are ranked; several may belong to one document
+            self._lexical_search(query, candidates * settings.vector_chunk_search_factor, normalized),
+        )
+        
+        try:
+            dense_scores = {result['id']: result['score'] for result in dense}
+            found = {result['id']: result for result in dense}
+            lexical_scores = {}
+            lexical_ranking = []
+            documents = self.metadata.get_many([vector_id for vector_id, _ in lexical])
+            for vector_id, score in lexical:
+                document = documents.get(vector_id)
+                if document is None:
+                    continue
+                group = self._group_key(document, "document")
+                if group in lexical_scores:
+                    continue
+                lexical_scores[group] = score
+                lexical_ranking.append(group)
+                found.setdefault(group, self._result(document))
             
-            # Save metadata
-            with open(self.metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+            fused = reciprocal_rank_fusion(
+                [[result['id'] for result in dense], lexical_ranking],
+                k=settings.vector_rrf_k,
+            )
             
+            results = []
+            for doc_id, score in fused[:k]:
+                result = found[doc_id]
+                results.append({
+                    **result,
+                    'score': score,
+                    'dense_score': dense_scores.get(doc_id),
+                    'lexical_score': lexical_scores.get(doc_id),
+                    'rank': len(results) + 1,
+                })
+            self.result_cache.put(key, [dict(result) for result in results])
+            return results
+        
+        except Exception as e:
+            logger.error(f"Failed to fuse hybrid search results: {str(e)}")
+            return dense[:k]
+    
+    async def _lexical_search(self, query: str, limit: int, filters: Tuple = ()) -> List[Tuple[int, float]]:
+        """BM25 search of the documents database, off the event loop."""
+        try:
+            return await asyncio.to_thread(self.metadata.lexical_search, query, limit, filters)
+        except Exception as e:
+            logger.error(f"Failed to run keyword search: {str(e)}")
+            return []
+    
+    async def similar_documents(
+        self,
+        doc_id: str,
+        k: int = 10,
+        group_by: str = "document",
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Find documents similar to an indexed one ("more like this").
+        
+        The document's stored passage vectors are read back from the index
+        instead of re-encoding its text, and searched as one batch; a result
+        scores as its best match with any of those passages. The document
+        itself (or its whole law, with group_by="law") is excluded. Results
+        are cached per document until the index changes.
+        
+        Args:
+            doc_id: Indexed document ID (e.g. 'law_12', 'article_340')
+            k: Number of results to return
+            group_by: "document" (article or law) or "law"
+            filters: Restrict the results (see search_similar)
+        
+        Returns:
+            List of similar documents with cosine scores, or None if the
+            document is not indexed
+        
+        Raises:
+            ValueError: On an unknown filter
+        """
+        normalized = normalize_filters(filters)
+        if not VECTOR_AVAILABLE or not self.index:
+            logger.warning("Vector service not available")
+            return []
+        
+        key = ("similar", self.index_version, doc_id, k, group_by, normalized)
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return [dict(result) for result in cached]
+        
+        try:
+            found = await asyncio.to_thread(self.document_vectors, doc_id)
+            if found is None:
+                return None
+            vectors, first_passage = found
+            results = await asyncio.to_thread(
+                self.search_by_vectors,
+                vectors,
+                k,
+                group_by,
+                normalized,
+                self._group_key(first_passage, group_by),
+            )
+            self.result_cache.put(key, [dict(result) for result in results])
+            return results
+        
+        except Exception as e:
+            logger.error(f"Failed to find similar documents: {str(e)}")
+            return []
+    
+    def document_vectors(self, doc_id: str) -> Optional[Tuple["np.ndarray", Dict[str, Any]]]:
+        """
+        Stored passage vectors of an indexed document, reconstructed from FAISS.
+        
+        Returns:
+            Tuple of (vectors, metadata of its first passage), or None if it is not indexed
+        """
+        vector_ids = self.metadata.parent_vector_ids([doc_id])
+        documents = self.metadata.get_many(vector_ids)
+        if not documents:
+            return None
+        with self._write_lock:
+            vectors = self._reconstruct(np.asarray(list(documents), dtype=np.int64))
+        first_passage = min(documents.values(), key=lambda metadata: metadata.get('chunk') or 0)
+        return np.ascontiguousarray(vectors, dtype=np.float32), first_passage
+    
+    def search_by_vectors(
+        self,
+        vectors: "np.ndarray",
+        k: int,
+        group_by: str = "document",
+        filters: Tuple = (),
+        exclude: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k documents for a batch of stored vectors taken together.
+        
+        All rows are searched in one FAISS call; a passage scores as its best
+        hit over the rows, and a document as its best passage.
+        
+        Args:
+            vectors: L2-normalized float32 query vectors
+            k: Number of results to return
+            group_by: "document" (article or law) or "law"
+            filters: Normalized filters (see normalize_filters)
+            exclude: Result ID (document or law) to leave out
+        """
+        scores, ids = self._search_vectors(vectors, (k + 1) * settings.vector_chunk_search_factor, filters)
+        scores, ids = scores.ravel(), ids.ravel()
+        found = ids >= 0
+        order = np.argsort(-scores[found], kind="stable")
+        scores, ids = scores[found][order], ids[found][order]
+        # First, i.e. best, hit of each passage
+        _, first = np.unique(ids, return_index=True)
+        first.sort()
+        scores, ids = scores[first], ids[first]
+        
+        documents = self.metadata.get_many(ids.tolist())
+        if exclude is not None:
+            documents = {
+                vector_id: metadata
+                for vector_id, metadata in documents.items()
+                if self._group_key(metadata, group_by) != exclude
+            }
+        return self._format_results(scores, ids, documents, k, -1.0, group_by)
+    
+    def _snapshot_state(self) -> Tuple["np.ndarray", Dict[str, Any]]:
+        """Capture a consistent copy of the index and metadata for a snapshot."""
+        with self._write_lock:
+            index_bytes = faiss.serialize_index(self.index)
+            self.metadata.commit()
+            stored = {
+                'version': METADATA_FORMAT_VERSION,
+                'snapshot_no': self.snapshot_no + 1,
+                'segment_seq': self.segment_seq,
+                'next_id': self.next_id,
+                'tombstones': sorted(self.tombstones),
+                'documents_file': self.metadata.path.name,
+                'documents_generation': self.documents_generation,
+            }
+        return index_bytes, stored
+    
+    def _write_snapshot(self, index_bytes: "np.ndarray", stored: Dict[str, Any]):
+        """
+        Write a base snapshot and drop the segments merged into it.
+        
+        The index goes to a new file first; replacing the metadata file is
+        the commit point, so a crash at any step leaves the previous
+        snapshot and its segments intact.
+        """
+        index_path = self.data_dir / f"vector_index.{stored['snapshot_no']:06d}"
+        stored['index_file'] = index_path.name
+        
+        atomic_write(index_path, lambda f: f.write(index_bytes.tobytes()))
+        if self.full_vectors is not None:
+            self.full_vectors.sync()
+        atomic_write(
+            self.metadata_path,
+            lambda f: f.write(json.dumps(stored, ensure_ascii=False, separators=(',', ':')).encode('utf-8')),
+        )
+        
+        previous_path, self.index_path = self.index_path, index_path
+        self.snapshot_no = stored['snapshot_no']
+        self.snapshot_seq = stored['segment_seq']
+        
+        # Other workers may still map the old file; unlinking keeps their pages valid
+        if previous_path != index_path:
+            previous_path.unlink(missing_ok=True)
+        # A rebuild switched to a new documents database; retire the old one
+        documents_path = self.data_dir / stored['documents_file']
+        if self.committed_documents_path and self.committed_documents_path != documents_path:
+            VectorMetadataStore.delete_files(self.committed_documents_path)
+            _full_vectors_path(self.committed_documents_path).unlink(missing_ok=True)
+        self.committed_documents_path = documents_path
+        self.segments.prune(self.snapshot_seq)
+    
+    async def _save_index(self):
+        """Save the vector index and metadata to disk as a new base snapshot."""
+        try:
+            async with self._save_lock:
+                index_bytes, stored = self._snapshot_state()
+                await asyncio.to_thread(self._write_snapshot, index_bytes, stored)
             logger.info("Vector index and metadata saved successfully")
-            
+        
         except Exception as e:
             logger.error(f"Failed to save vector index: {str(e)}")
     
+    def _schedule_merge(self):
+        """Fold segments into a new snapshot in the background once enough accumulate."""
+        if self.segment_seq - self.snapshot_seq < settings.vector_segment_merge_threshold:
+            return
+        if self._merge_task and not self._merge_task.done():
+            return
+        self._merge_task = asyncio.create_task(self.merge_segments())
+    
+    async def merge_segments(self) -> bool:
+        """
+        Merge all logged segments into a new base snapshot.
+        
+        Returns:
+            bool: True if a snapshot was written, False otherwise
+        """
+        if not self.index or self.segment_seq == self.snapshot_seq:
+            return False
+        merged = self.segment_seq - self.snapshot_seq
+        await self._save_index()
+        logger.info(f"Merged {merged} segments into vector index snapshot {self.snapshot_no}")
+        return True
+    
+    async def close(self):
+        """
+        Merge the segments this process logged into a snapshot, e.g. on app
+        shutdown, so the next start maps the index file instead of
+        replaying vectors onto a private copy. Processes that only read
+        leave the files to the writer. Embeddings still queued for the
+        embedding cache are written.
+        """
+        if self._merge_task and not self._merge_task.done():
+            await self._merge_task
+        if self.segments_written:
+            await self.merge_segments()
+        if self.embedding_cache is not None:
+            await asyncio.to_thread(self.embedding_cache.flush)
+    
     async def rebuild_index(self, documents: List[Dict[str, Any]]) -> bool:
         """
         Rebuild the entire vector index with new documents.
         
+        The index family is chosen from the corpus size and trained on the
+        new embeddings when it needs training (IVF). Only texts missing from
+        the embedding cache are encoded; the hit/miss counts are kept in
+        last_rebuild_stats.
+        
         Args:
             documents: List of documents to index
-            
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        batch_size = settings.vector_encode_batch_size
+        batches = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+        
+        training = None
+        train_size = self.training_sample_size(len(documents))
+        if train_size and train_size < len(documents):
+            rng = np.random.default_rng(0)
+            training = [[documents[i] for i in rng.choice(len(documents), train_size, replace=False)]]
+        
+        return await self.rebuild_from_batches(batches, len(documents), training_batches=training)
+    
+    def training_sample_size(self, num_vectors: int) -> int:
+        """Vectors needed to train an index for this corpus size (0 if it needs no training)."""
+        quantization = self._select_quantization(num_vectors)
+        if quantization == "pq":
+            needed = max(self._ivf_nlist(num_vectors) * IVF_TRAIN_POINTS_PER_CENTROID, self._pq_min_vectors() * 2)
+        elif self._select_index_type(num_vectors) == "ivf":
+            needed = self._ivf_nlist(num_vectors) * IVF_TRAIN_POINTS_PER_CENTROID
+            if quantization == "sq8":
+                needed = max(needed, SQ_TRAIN_POINTS)
+        elif quantization == "sq8":
+            needed = SQ_TRAIN_POINTS
+        else:
+            return 0
+        return min(num_vectors, needed)
+    
+    async def rebuild_from_batches(
+        self,
+        batches: Iterable[List[Dict[str, Any]]],
+        expected_total: int,
+        training_batches: Optional[Iterable[List[Dict[str, Any]]]] = None,
+        progress: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """
+        Rebuild the entire vector index from a stream of document batches.
+        
+        The new index is built beside the live one (blue/green), in its own
+        directory: searches keep using the current index until the new one
+        is complete, then the two are swapped in one step. Writes made in
+        the meantime are applied to the current index and replayed onto the
+        new one before the swap.
+        
+        Documents are split into passages, batches are encoded in a process
+        pool (cache misses only) and added to the index as they complete, so
+        peak memory is a few batches plus the two indexes.
+        
+        Args:
+            batches: Iterable of document lists, consumed once
+            expected_total: Approximate corpus size, used to pick the index family
+            training_batches: Representative sample for indexes that need
+                training; defaults to the first documents of the stream
+            progress: Dictionary updated with the phase and the documents and
+                passages indexed so far
+        
         Returns:
             bool: True if successful, False otherwise
         """
         if not VECTOR_AVAILABLE or not self.model:
             logger.warning("Vector service not available")
             return False
+        if self._rebuild_journal is not None:
+            logger.warning("A vector index rebuild is already running")
+            return False
         
+        progress = progress if progress is not None else {}
+        staging_dir = self.data_dir / "vector_rebuild"
+        staging = None
+        self._rebuild_journal = []
         try:
-            # Create new index
-            self._create_new_index()
+            self._claim_writer()
+            # Leftovers of an interrupted rebuild
+            await asyncio.to_thread(shutil.rmtree, staging_dir, True)
+            staging = VectorService(data_dir=staging_dir)
+            staging._model = self.model
+            staging.embedding_cache = self.embedding_cache
             
-            # Add all documents
-            success = await self.add_documents(documents)
-            
-            if success:
-                logger.info(f"Rebuilt vector index with {len(documents)} documents")
+            stats = await staging._build_from_batches(batches, expected_total, training_batches, progress)
+            if stats is None:
+                return False
             
-            return success
+            progress["phase"] = "swapping"
+            async with self._save_lock:
+                # Writes wait from here until the snapshot is written, so none
+                # can slip between the journal replay and the swap
+                self._swapping = asyncio.Event()
+                try:
+                    await asyncio.to_thread(self._swap_in_rebuilt, staging)
+                finally:
+                    self._swapping.set()
+                    self._swapping = None
             
+            self.last_rebuild_stats = stats
+            self._notify_changed(None)
+            logger.info(
+                f"Rebuilt {self._index_type()} vector index with {stats['documents']} documents "
+                f"in {stats['passages']} passages ({stats['cache_misses']} encoded, {stats['cache_hits']} from cache)"
+            )
+            return True
+        
         except Exception as e:
             logger.error(f"Failed to rebuild vector index: {str(e)}")
             return False
+        finally:
+            self._rebuild_journal = None
+            if staging is not None and staging.metadata is not None:
+                staging.metadata.close()
+            if staging is not None and staging.full_vectors is not None:
+                staging.full_vectors.close()
+            await asyncio.to_thread(shutil.rmtree, staging_dir, True)
+    
+    async def _build_from_batches(
+        self,
+        batches: Iterable[List[Dict[str, Any]]],
+        expected_total: int,
+        training_batches: Optional[Iterable[List[Dict[str, Any]]]],
+        progress: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Fill this (staging) service's index in place from document batches.
+        
+        Returns:
+            Rebuild counters, or None if the index could not be created
+        """
+        stats = {"documents": 0, "passages": 0, "cache_hits": 0, "cache_misses": 0}
+        
+        # Create a new index sized for the corpus
+        self._create_new_index(expected_total)
+        if not self.index:
+            return None
+        
+        if not self.index.is_trained and training_batches is not None:
+            progress["phase"] = "training"
+            sample = [
+                embeddings
+                async for _, embeddings, _, _ in self._encode_stream(self._chunk_batches(training_batches))
+            ]
+            if sample:
+                await asyncio.to_thread(self._train_index, self.index, np.concatenate(sample))
+        
+        # Without a separate sample, train on the head of the stream
+        train_size = self.training_sample_size(expected_total)
+        untrained: List[Tuple["np.ndarray", List[Dict[str, Any]]]] = []
+        
+        progress["phase"] = "indexing"
+        async for documents, embeddings, hits, misses in self._encode_stream(self._chunk_batches(batches)):
+            added = sum(1 for doc in documents if not doc['chunk'])
+            stats["documents"] += added
+            stats["passages"] += len(documents)
+            stats["cache_hits"] += hits
+            stats["cache_misses"] += misses
+            progress["documents"] = progress.get("documents", 0) + added
+            progress["passages"] = progress.get("passages", 0) + len(documents)
+            
+            # Adding (HNSW graph inserts), training and the documents database
+            # writes run in a worker thread; searches keep being served
+            if self.index.is_trained:
+                await asyncio.to_thread(self._append, embeddings, documents)
+                continue
+            
+            untrained.append((embeddings, documents))
+            if sum(len(docs) for _, docs in untrained) >= train_size:
+                await asyncio.to_thread(self._train_buffered, untrained)
+                untrained = []
+        
+        if untrained:
+            await asyncio.to_thread(self._train_buffered, untrained)
+        return stats
+    
+    def _replay_journal(self, journal: List[Tuple[str, Any]]):
+        """Apply writes made to the live index during a rebuild to this (staging) index."""
+        for operation, payload in journal:
+            if operation == "remove":
+                self._tombstone([payload])
+                continue
+            passages = self._passages(payload)
+            if passages:
+                embeddings, _, _ = self._encode_documents([doc['text'] for doc in passages])
+                self._append(embeddings, passages)
+        if journal:
+            logger.info(f"Replayed {len(journal)} writes made during the vector index rebuild")
+    
+    def _swap_in_rebuilt(self, staging: "VectorService"):
+        """
+        Replay the rebuild's journal onto the rebuilt index, adopt it and
+        write its snapshot. Runs in a worker thread while writes are held.
+        """
+        staging._replay_journal(self._rebuild_journal)
+        self._rebuild_journal = None
+        self._swap_in(staging)
+        self._write_snapshot(*self._snapshot_state())
+    
+    def _swap_in(self, staging: "VectorService"):
+        """
+        Adopt a rebuilt index, its documents database and full-vector store
+        in one step.
+        
+        Both files move into this service's directory as the next
+        generation; the snapshot written next commits the switch.
+        """
+        generation = self.documents_generation + 1
+        path = self.data_dir / f"vector_documents.{generation:06d}.db"
+        VectorMetadataStore.delete_files(path)
+        staged = staging.metadata.path
+        staging.metadata.close()
+        staging.metadata = None
+        for suffix in ("", "-wal", "-shm"):
+            source = staged.with_name(staged.name + suffix)
+            if source.exists():
+                source.replace(path.with_name(path.name + suffix))
+        metadata = VectorMetadataStore(path)
+        previous = self.metadata.path
+        
+        full_vectors = None
+        if staging.full_vectors is not None:
+            staging.full_vectors.sync()
+            staging.full_vectors.close()
+            staging.full_vectors = None
+            _full_vectors_path(staged).replace(_full_vectors_path(path))
+            full_vectors = RerankVectorStore(_full_vectors_path(path), staging.index.d)
+        
+        with self._write_lock:
+            self.index = staging.index
+            self.index_mmapped = False
+            # Searches still reading the previous database finish on it; its
+            # files are deleted by the snapshot and it closes once released
+            self.metadata = metadata
+            previous_vectors, self.full_vectors = self.full_vectors, full_vectors
+            self.documents_generation = generation
+            self.tombstones = set(staging.tombstones)
+            self.next_id = staging.next_id
+            self._tombstone_selector = None
+            self._filter_cache.clear()
+            self._bump_index_version()
+        self._apply_search_params()
+        if previous_vectors is not None:
+            previous_vectors.close()
+        # A database no snapshot refers to would never be cleaned up
+        if previous != self.committed_documents_path:
+            VectorMetadataStore.delete_files(previous)
+            _full_vectors_path(previous).unlink(missing_ok=True)
+    
+    async def _wait_for_swap(self):
+        """Hold writes while a rebuilt index is being snapshotted."""
+        if self._swapping is not None:
+            await self._swapping.wait()
+    
+    def start_rebuild(
+        self,
+        batches: Iterable[List[Dict[str, Any]]],
+        expected_total: int,
+        training_batches: Optional[Iterable[List[Dict[str, Any]]]] = None,
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run rebuild_from_batches as a background job.
+        
+        Args:
+            batches: Iterable of document lists, consumed by the job
+            expected_total: Approximate corpus size
+            training_batches: Representative sample for indexes that need training
+            on_done: Called when the job ends, e.g. to close the batches' database session
+        
+        Returns:
+            The job status; rebuild_job.status() reports its progress
+        
+        Raises:
+            RuntimeError: If a rebuild is already running
+        """
+        return self.rebuild_job.start(
+            lambda progress: self.rebuild_from_batches(
+                batches, expected_total, training_batches=training_batches, progress=progress
+            ),
+            expected_total,
+            lambda: self.last_rebuild_stats,
+            on_done,
+        )
+    
+    def _train_buffered(self, buffered: List[Tuple["np.ndarray", List[Dict[str, Any]]]]):
+        """Train the index on buffered batches, then add them."""
+        self._train_index(self.index, np.concatenate([embeddings for embeddings, _ in buffered]))
+        for embeddings, documents in buffered:
+            self._append(embeddings, documents)
+    
+    def _needs_compaction(self) -> bool:
+        """Whether enough tombstones accumulated to be worth a compaction pass."""
+        if not self.index or not self.tombstones:
+            return False
+        return len(self.tombstones) >= max(
+            settings.vector_compaction_min_tombstones,
+            settings.vector_compaction_ratio * self.index.ntotal,
+        )
+    
+    def _schedule_compaction(self):
+        """Start a background compaction pass once tombstones pass the threshold."""
+        if not self._needs_compaction():
+            return
+        if self._compaction_task and not self._compaction_task.done():
+            return
+        self._compaction_task = asyncio.create_task(self.compact_index())
+    
+    def build_index(
+        self,
+        vectors: "np.ndarray",
+        ids: "np.ndarray",
+        index_type: Optional[str] = None,
+        quantization: Optional[str] = None,
+    ):
+        """
+        Build a standalone index over the given vectors without touching the active one.
+        
+        Args:
+            vectors: L2-normalized float32 vectors
+            ids: Vector IDs
+            index_type: Index family; defaults to the configured/automatic choice
+            quantization: Vector compression; defaults to settings.vector_quantization
+        
+        Returns:
+            Trained, populated ID-mapped FAISS index
+        """
+        index = self._new_index(len(ids), index_type=index_type, quantization=quantization)
+        self._train_index(index, vectors)
+        index.add_with_ids(vectors, ids)
+        self._apply_search_params(index)
+        return index
+    
+    def _stored_vectors(self, index, start: int, end: int):
+        """Copy rows [start, end) of an ID-mapped index as (vectors, ids)."""
+        ids = faiss.vector_to_array(index.id_map)[start:end].astype(np.int64)
+        if self._quantization(index) != "none":
+            # Not the lossy codes: the full vectors of the full-vector store
+            return self.full_vectors.get(ids), ids
+        stored = self._inner_index(index)
+        if isinstance(stored, faiss.IndexIVF):
+            stored.make_direct_map()
+        return stored.reconstruct_n(start, end - start), ids
+    
+    def live_vectors(self) -> Tuple["np.ndarray", "np.ndarray"]:
+        """
+        Copy every non-tombstoned vector out of the active index.
+        
+        Returns:
+            Tuple of (full-precision vectors, vector IDs)
+        """
+        with self._write_lock:
+            vectors, ids = self._stored_vectors(self.index, 0, self.index.ntotal)
+            dead = np.fromiter(self.tombstones, dtype=np.int64, count=len(self.tombstones))
+        if len(dead):
+            live = ~np.isin(ids, dead)
+            vectors, ids = vectors[live], ids[live]
+        return vectors, ids
+    
+    def describe_index(self, index=None) -> Dict[str, Any]:
+        """Family and compression of an index (the active one by default)."""
+        return {
+            "index_type": self._index_type(index),
+            "quantization": self._quantization(index),
+        }
+    
+    async def compact_index(self) -> bool:
+        """
+        Drop tombstoned vectors by rebuilding the index from the live ones.
+        
+        The new index is built in a worker thread while searches keep using
+        the current one; writes that land in the meantime are carried over
+        before the swap.
+        
+        Returns:
+            bool: True if a compaction ran, False otherwise
+        """
+        if not self.index or not self.tombstones:
+            return False
+        
+        try:
+            self._claim_writer()
+            index = self.index
+            dead = set(self.tombstones)
+            
+            with self._write_lock:
+                count = index.ntotal
+                vectors, ids = self._stored_vectors(index, 0, count)
+            
+            live = ~np.isin(ids, np.fromiter(dead, dtype=np.int64, count=len(dead)))
+            # Same family and compression: re-picking them for the smaller
+            # corpus could turn PQ into sq8 or an ANN index into a flat one
+            compacted = await asyncio.to_thread(
+                self.build_index, vectors[live], ids[live], self._index_type(index), self._quantization(index)
+            )
+            
+            with self._write_lock:
+                if self.index is not index:
+                    # A rebuild replaced the index; its vectors are already compact
+                    return False
+                # Carry over vectors added while the compacted index was built
+                if index.ntotal > count:
+                    tail_vectors, tail_ids = self._stored_vectors(index, count, index.ntotal)
+                    compacted.add_with_ids(tail_vectors, tail_ids)
+                self.index = compacted
+                self.index_mmapped = False
+                self.tombstones -= dead
+                self._tombstone_selector = None
+                self._bump_index_version()
+            
+            await self._save_index()
+            
+            logger.info(f"Compacted vector index: dropped {len(dead)} tombstoned vectors")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Failed to compact vector index: {str(e)}")
+            return False
     
     async def get_index_stats(self) -> Dict[str, Any]:
         """
@@ -234,24 +1894,67 @@ class VectorService:
             return {"status": "not_available"}
         
         try:
+            live_vectors = len(self.metadata)
             return {
                 "status": "available",
+                "documents": self.metadata.parent_count(),
                 "total_vectors": self.index.ntotal,
+                "live_vectors": live_vectors,
+                "tombstones": len(self.tombstones),
                 "dimension": self.index.d,
-                "metadata_count": len(self.metadata),
-                "model_name": "paraphrase-multilingual-MiniLM-L12-v2",
+                "metadata_count": live_vectors,
+                "model_name": settings.vector_model,
+                "model_backend": "onnx" if is_onnx_model(settings.vector_model) else "pytorch",
+                "model_loaded": self._model is not None,
+                "index_memory_mapped": self.index_mmapped,
+                "index_type": self._index_type(),
+                "quantization": self._quantization(),
+                "is_trained": self.index.is_trained,
+                "search_params": self._search_params(),
+                "snapshot": self.snapshot_no,
+                "pending_segments": self.segment_seq - self.snapshot_seq,
+                "query_batching": self.query_batcher.stats(),
+                "filtered_searches": {**self.filter_stats, "cached_filters": len(self._filter_cache)},
+                "index_version": self.index_version,
+                "query_embedding_cache": self.query_embedding_cache.stats(),
+                "result_cache": self.result_cache.stats(),
+                "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None,
             }
         except Exception as e:
             logger.error(f"Failed to get index stats: {str(e)}")
             return {"status": "error", "error": str(e)}
     
+    def _search_params(self) -> Dict[str, Any]:
+        """Describe the query-time parameters of the active index."""
+        inner = self._inner_index()
+        index_type = self._index_type()
+        params: Dict[str, Any] = {}
+        if index_type == "ivf":
+            params = {"nlist": inner.nlist, "nprobe": inner.nprobe}
+        elif index_type == "hnsw":
+            params = {
+                "m": inner.hnsw.nb_neighbors(1),
+                "ef_construction": inner.hnsw.efConstruction,
+                "ef_search": inner.hnsw.efSearch,
+            }
+        if isinstance(inner, faiss.IndexIVFPQ):
+            params["pq_m"] = inner.pq.M
+            params["pq_nbits"] = inner.pq.nbits
+        
+        if self.full_vectors is not None:
+            params["rerank_factor"] = settings.vector_rerank_factor
+        return params
+    
     async def remove_document(self, doc_id: str) -> bool:
         """
         Remove a document from the vector index.
         
+        Its passage vectors are tombstoned and excluded from searches
+        immediately; they are physically dropped by the next compaction pass.
+        
         Args:
             doc_id: Document ID to remove
-            
+        
         Returns:
             bool: True if successful, False otherwise
         """
@@ -259,61 +1962,92 @@ class VectorService:
             return False
         
         try:
-            # Find document in metadata
-            doc_index = None
-            for i, meta in enumerate(self.metadata):
-                if meta['id'] == doc_id:
-                    doc_index = i
-                    break
-            
-            if doc_index is None:
+            await self._wait_for_swap()
+            self._claim_writer()
+            if self._rebuild_journal is not None:
+                self._rebuild_journal.append(("remove", doc_id))
+            vector_ids = self._tombstone([doc_id])
+            if not vector_ids:
                 logger.warning(f"Document {doc_id} not found in index")
                 return False
             
-            # Remove from metadata
-            self.metadata.pop(doc_index)
-            
-            # Rebuild index without the removed document
-            # Note: FAISS doesn't support direct removal, so we rebuild
-            await self._save_index()
+            self._log_write(
+                np.empty(0, dtype=np.int64),
+                np.empty((0, self.index.d), dtype=np.float32),
+                vector_ids,
+            )
+            self._schedule_compaction()
+            self._notify_changed([doc_id])
             
             logger.info(f"Removed document {doc_id} from vector index")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Failed to remove document from vector index: {str(e)}")
             return False
     
+    async def remove_documents(self, doc_ids: List[str]) -> int:
+        """
+        Remove many documents from the vector index in one logged write.
+        
+        Args:
+            doc_ids: Document IDs to remove; IDs not in the index are ignored
+        
+        Returns:
+            Number of passage vectors tombstoned
+        """
+        if not self.index:
+            return 0
+        
+        try:
+            await self._wait_for_swap()
+            self._claim_writer()
+            if self._rebuild_journal is not None:
+                self._rebuild_journal.extend(("remove", doc_id) for doc_id in doc_ids)
+            vector_ids = self._tombstone(list(doc_ids))
+            if vector_ids:
+                self._log_write(
+                    np.empty(0, dtype=np.int64),
+                    np.empty((0, self.index.d), dtype=np.float32),
+                    vector_ids,
+                )
+                self._schedule_compaction()
+                self._notify_changed(list(doc_ids))
+            
+            logger.info(f"Removed {len(doc_ids)} documents ({len(vector_ids)} vectors) from vector index")
+            return len(vector_ids)
+        
+        except Exception as e:
+            logger.error(f"Failed to remove documents from vector index: {str(e)}")
+            return 0
+    
     async def update_document(self, doc_id: str, new_text: str, metadata: Dict[str, Any]) -> bool:
         """
-        Update a document in the vector index.
+        Update a document in the vector index, inserting it if it is new.
         
         Args:
             doc_id: Document ID to update
             new_text: New document text
             metadata: Updated metadata
-            
+        
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            # Remove old document
-            await self.remove_document(doc_id)
-            
-            # Add updated document
             updated_doc = {
+                **metadata,
                 'id': doc_id,
                 'text': new_text,
-                **metadata
             }
             
+            # add_documents retires the previous vector of the same document
             success = await self.add_documents([updated_doc])
             
             if success:
                 logger.info(f"Updated document {doc_id} in vector index")
             
             return success
-            
+        
         except Exception as e:
             logger.error(f"Failed to update document in vector index: {str(e)}")
             return False
@@ -322,7 +2056,73 @@ class VectorService:
         """
         Check if vector service is available.
         
+        Does not load the model; a model that fails to load on first use
+        marks the service unavailable from then on.
+        
         Returns:
             bool: True if vector service is available, False otherwise
         """
-        return VECTOR_AVAILABLE and self.model is not None and self.index is not None
+        return VECTOR_AVAILABLE and not self._model_failed and self.index is not None
+
+
+# Encoders loaded in this process, shared by all VectorService instances
+# (language shards, benchmark indexes) instead of one copy each
+_shared_encoders: Dict[str, Any] = {}
+_shared_encoders_lock = threading.Lock()
+
+
+def _shared_encoder(model_name: str):
+    """Load a sentence encoder once per process."""
+    with _shared_encoders_lock:
+        if model_name not in _shared_encoders:
+            _shared_encoders[model_name] = load_encoder(model_name, threads=settings.vector_onnx_threads)
+        return _shared_encoders[model_name]
+
+
+# Model of a rebuild encoder process, see VectorService._encoder_pool
+_worker_model = None
+
+
+def _init_encode_worker(model_name: str, threads: int):
+    """Load the embedding model once per encoder process."""
+    global _worker_model
+    _worker_model = load_encoder(model_name, threads=threads)
+
+
+def _encode_in_worker(texts: List[str]) -> "np.ndarray":
+    """Encode texts into L2-normalized float32 embeddings inside an encoder process."""
+    embeddings = _worker_model.encode(texts, show_progress_bar=False)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+_shared_service: Optional[VectorService] = None
+_shared_service_lock = threading.Lock()
+
+
+async def close_vector_service():
+    """Close the process-wide vector service if it was created, e.g. on app shutdown."""
+    if _shared_service is not None:
+        await _shared_service.close()
+
+
+def get_vector_service() -> VectorService:
+    """
+    Return the process-wide VectorService, creating it on first use.
+    
+    The embedding model and the FAISS index are loaded once per process and
+    shared by every request. With settings.vector_shard_languages set, this
+    is a ShardedVectorService with the same interface.
+    """
+    global _shared_service
+    if _shared_service is None:
+        with _shared_service_lock:
+            if _shared_service is None:
+                languages = [lang.strip() for lang in settings.vector_shard_languages.split(",") if lang.strip()]
+                if languages and VECTOR_AVAILABLE:
+                    from src.services.vector_shards import ShardedVectorService
+                    _shared_service = ShardedVectorService(languages)
+                else:
+                    _shared_service = VectorService()
+    return _shared_service
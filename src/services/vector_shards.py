@@ -0,0 +1,562 @@
+"""
+Vector Shards - Language-sharded vector search over Arabic, French and English.
+Documents are routed to a per-language VectorService at ingest time; queries
+search the shard of their own language first and fan out to the others in
+parallel when needed, with the hits merged by score.
+"""
+
+import asyncio
+import json
+import logging
+import shutil
+import tempfile
+from collections import Counter
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from src.core.settings import settings
+from src.services.language import detect_language
+from src.services.query_cache import LRUCache
+from src.services.rebuild_job import RebuildJob
+from src.services.vector_metadata import normalize_filters
+from src.services.vector_service import VectorService
+
+logger = logging.getLogger(__name__)
+
+FANOUT_MODES = ("auto", "always", "never")
+
+
+def _json_default(value: Any) -> str:
+    """Dates of spilled documents, as stored by the metadata database."""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _read_spill(path: Path, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Read back a spilled JSONL file in batches."""
+    batch = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+class ShardedVectorService:
+    """
+    One VectorService per language behind the VectorService interface.
+    
+    A query scans only its own language's index unless it fans out, and
+    each shard can be rebuilt on its own. The shards share the encoder and
+    the query embedding cache, so a fanned-out query is encoded once.
+    """
+    
+    def __init__(self, languages: List[str], data_dir: Optional[Path] = None):
+        if not languages:
+            raise ValueError("At least one shard language is required")
+        self.languages = list(dict.fromkeys(languages))
+        # Documents and queries of other languages go to the first shard
+        self.default_language = self.languages[0]
+        self.data_dir = Path(data_dir) if data_dir is not None else Path("data")
+        self.shards: Dict[str, VectorService] = {
+            language: VectorService(data_dir=self.data_dir / "shards" / language)
+            for language in self.languages
+        }
+        
+        first = self.shards[self.default_language]
+        for shard in self.shards.values():
+            shard.query_embedding_cache = first.query_embedding_cache
+            # One writer for the on-disk cache files
+            shard.embedding_cache = first.embedding_cache
+        
+        # "More like this" results, keyed by the summed shard versions
+        self.result_cache = LRUCache(settings.vector_result_cache_size, settings.vector_result_cache_ttl_seconds)
+        self.routing_stats = {"queries": 0, "primary_only": 0, "fanned_out": 0, "by_language": Counter()}
+        # Counters from the most recent rebuild, summed over the rebuilt shards
+        self.last_rebuild_stats: Dict[str, Any] = {}
+        self.rebuild_job = RebuildJob()
+    
+    @property
+    def index_version(self) -> int:
+        """Changes whenever any shard changes."""
+        return sum(shard.index_version for shard in self.shards.values())
+    
+    def language_of(self, document: Dict[str, Any]) -> str:
+        """Shard language of a document: its 'language' field if it names a shard, else detected."""
+        language = document.get('language')
+        if language not in self.shards:
+            language = detect_language(document.get('text', ''), default=self.default_language)
+        return language if language in self.shards else self.default_language
+    
+    def _split(self, documents: Iterable[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Group documents by shard language."""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for document in documents:
+            groups.setdefault(self.language_of(document), []).append(document)
+        return groups
+    
+    def _shard_of(self, doc_id: str) -> Optional[str]:
+        """Language of the shard holding a document, if any."""
+        for language, shard in self.shards.items():
+            if shard.metadata is not None and shard.metadata.parent_vector_ids([doc_id]):
+                return language
+        return None
+    
+    async def add_documents(self, documents: List[Dict[str, Any]]) -> bool:
+        """
+        Add documents to the shard of their language.
+        
+        A document re-added in another language (its text was translated or
+        corrected) is removed from the shard that held it.
+        
+        Args:
+            documents: List of documents with 'text', 'id', and 'metadata' fields;
+                an optional 'language' overrides detection
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not self.is_available():
+            logger.warning("Vector service not available")
+            return False
+        
+        try:
+            groups = self._split(documents)
+            for language, group in groups.items():
+                for other, shard in self.shards.items():
+                    if other == language or shard.metadata is None:
+                        continue
+                    for document in group:
+                        if shard.metadata.parent_vector_ids([document['id']]):
+                            await shard.remove_document(document['id'])
+            
+            results = await asyncio.gather(
+                *(self.shards[language].add_documents(group) for language, group in groups.items())
+            )
+            return all(results)
+        
+        except Exception as e:
+            logger.error(f"Failed to add documents to sharded vector index: {str(e)}")
+            return False
+    
+    def _fan_out(self, fan_out: Optional[bool], hits: Optional[int], k: int) -> bool:
+        """Whether a query searches every shard (hits is None before the primary search)."""
+        if fan_out is not None:
+            return fan_out
+        mode = settings.vector_shard_fanout.lower()
+        if mode not in FANOUT_MODES:
+            mode = "auto"
+        if mode == "auto":
+            return hits is not None and hits < k
+        return mode == "always"
+    
+    async def _routed(self, search, query: Optional[str], k: int, fan_out: Optional[bool], language: Optional[str]):
+        """
+        Run search(shard) on the query's shard, then on the others if it fans out.
+        
+        Fanned-out shards are searched concurrently, each on its own batcher
+        thread, after a text query has been encoded once into the shared cache.
+        """
+        if language not in self.shards:
+            language = detect_language(query or '', default=self.default_language)
+            if language not in self.shards:
+                language = self.default_language
+        primary = self.shards[language]
+        others = [shard for other, shard in self.shards.items() if other != language and shard.is_available()]
+        self.routing_stats["queries"] += 1
+        self.routing_stats["by_language"][language] += 1
+        
+        if others and self._fan_out(fan_out, None, k):
+            if query is not None:
+                await asyncio.to_thread(primary.encode_queries, [query])
+            ranked = await asyncio.gather(*(search(shard) for shard in [primary] + others))
+        else:
+            ranked = [await search(primary)]
+            if not others or not self._fan_out(fan_out, len(ranked[0]), k):
+                self.routing_stats["primary_only"] += 1
+                return ranked[0]
+            ranked += await asyncio.gather(*(search(shard) for shard in others))
+        
+        self.routing_stats["fanned_out"] += 1
+        return self._merge(ranked, k)
+    
+    @staticmethod
+    def _merge(ranked: List[List[Dict[str, Any]]], k: int) -> List[Dict[str, Any]]:
+        """
+        Merge per-shard result lists by score.
+        
+        A document found in several shards keeps its best hit; matched
+        passages add up. Ties go to the earlier list (the query's own shard).
+        """
+        best: Dict[str, Dict[str, Any]] = {}
+        for results in ranked:
+            for result in results:
+                kept = best.get(result['id'])
+                if kept is None:
+                    best[result['id']] = dict(result)
+                    continue
+                passages = kept.get('matched_passages', 1) + result.get('matched_passages', 1)
+                if result['score'] > kept['score']:
+                    kept = best[result['id']] = dict(result)
+                if 'matched_passages' in kept:
+                    kept['matched_passages'] = passages
+        
+        merged = sorted(best.values(), key=lambda result: -result['score'])[:k]
+        for rank, result in enumerate(merged, 1):
+            result['rank'] = rank
+        return merged
+    
+    async def search_similar(
+        self,
+        query: str,
+        k: int = 5,
+        threshold: float = 0.7,
+        group_by: str = "document",
+        filters: Optional[Dict[str, Any]] = None,
+        fan_out: Optional[bool] = None,
+        language: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Search the query's language shard, fanning out to the others as configured.
+        
+        Args:
+            query: Search query
+            k: Number of results to return
+            threshold: Minimum similarity threshold
+            group_by: "document" (article or law) or "law"
+            filters: See VectorService.search_similar
+            fan_out: Search every shard (True), only the query's (False),
+                or follow settings.vector_shard_fanout (None)
+            language: Shard to search first (default: detected from the query)
+        
+        Returns:
+            List of similar documents with scores, merged across shards
+        
+        Raises:
+            ValueError: On an unknown filter
+        """
+        normalize_filters(filters)
+        return await self._routed(
+            lambda shard: shard.search_similar(query, k=k, threshold=threshold, group_by=group_by, filters=filters),
+            query, k, fan_out, language,
+        )
+    
+    async def hybrid_search(
+        self,
+        query: str,
+        k: int = 10,
+        threshold: Optional[float] = None,
+        candidates: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        fan_out: Optional[bool] = None,
+        language: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Hybrid (BM25 + vector) search, routed like search_similar.
+        
+        Fused scores are rank based, so shards' results merge on an equal
+        footing whatever the size of each shard.
+        
+        Raises:
+            ValueError: On an unknown filter
+        """
+        normalize_filters(filters)
+        return await self._routed(
+            lambda shard: shard.hybrid_search(
+                query, k=k, threshold=threshold, candidates=candidates, filters=filters
+            ),
+            query, k, fan_out, language,
+        )
+    
+    async def similar_documents(
+        self,
+        doc_id: str,
+        k: int = 10,
+        group_by: str = "document",
+        filters: Optional[Dict[str, Any]] = None,
+        fan_out: Optional[bool] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Find documents similar to an indexed one (see VectorService.similar_documents).
+        
+        Its stored vectors come from the shard holding it, which is searched
+        first; other shards are searched with the same vectors when the
+        query fans out.
+        
+        Returns:
+            List of similar documents with cosine scores, or None if the
+            document is not indexed
+        
+        Raises:
+            ValueError: On an unknown filter
+        """
+        normalized = normalize_filters(filters)
+        key = ("similar", self.index_version, doc_id, k, group_by, normalized, fan_out)
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return [dict(result) for result in cached]
+        
+        language = self._shard_of(doc_id)
+        if language is None:
+            return None
+        try:
+            found = await asyncio.to_thread(self.shards[language].document_vectors, doc_id)
+            if found is None:
+                return None
+            vectors, first_passage = found
+            exclude = VectorService._group_key(first_passage, group_by)
+            results = await self._routed(
+                lambda shard: asyncio.to_thread(shard.search_by_vectors, vectors, k, group_by, normalized, exclude),
+                None, k, fan_out, language,
+            )
+            self.result_cache.put(key, [dict(result) for result in results])
+            return results
+        
+        except Exception as e:
+            logger.error(f"Failed to find similar documents: {str(e)}")
+            return []
+    
+    def encode_queries(self, queries: List[str]) -> "np.ndarray":
+        """Encode search queries (the shards share one embedding space)."""
+        return self.shards[self.default_language].encode_queries(queries)
+    
+    def training_sample_size(self, num_vectors: int) -> int:
+        """Training sample wanted for a corpus of this size (see VectorService)."""
+        return self.shards[self.default_language].training_sample_size(num_vectors)
+    
+    async def rebuild_shard(self, language: str, documents: List[Dict[str, Any]]) -> bool:
+        """
+        Rebuild one language shard, leaving the others untouched.
+        
+        Args:
+            language: Shard to rebuild
+            documents: The shard's documents
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if language not in self.shards:
+            raise ValueError(f"Unknown shard language: {language}")
+        success = await self.shards[language].rebuild_index(documents)
+        self.last_rebuild_stats = {
+            **self.shards[language].last_rebuild_stats,
+            "shards": {language: self.shards[language].last_rebuild_stats},
+        }
+        return success
+    
+    async def rebuild_index(self, documents: List[Dict[str, Any]]) -> bool:
+        """
+        Rebuild every shard from the given documents, split by language.
+        
+        Args:
+            documents: List of documents to index
+        
+        Returns:
+            bool: True if every shard was rebuilt, False otherwise
+        """
+        groups = self._split(documents)
+        stats = {}
+        success = True
+        for language, shard in self.shards.items():
+            success = await shard.rebuild_index(groups.get(language, [])) and success
+            stats[language] = shard.last_rebuild_stats
+        self.last_rebuild_stats = self._sum_stats(stats)
+        return success
+    
+    async def rebuild_from_batches(
+        self,
+        batches: Iterable[List[Dict[str, Any]]],
+        expected_total: int,
+        training_batches: Optional[Iterable[List[Dict[str, Any]]]] = None,
+        languages: Optional[List[str]] = None,
+        progress: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """
+        Rebuild shards from a stream of document batches.
+        
+        The stream is split by language into temporary JSONL files, then
+        each shard is rebuilt from its file in turn (the encoder pool is
+        shared by all of them), sized for its own document count. Each
+        shard keeps serving its current index until its rebuild is swapped in.
+        
+        Args:
+            batches: Iterable of document lists, consumed once
+            expected_total: Approximate corpus size (unused; shards are sized exactly)
+            training_batches: Representative sample, split by language like the corpus
+            languages: Shards to rebuild (default: all); other documents are skipped
+            progress: Dictionary updated with the phase, shard and documents indexed so far
+        
+        Returns:
+            bool: True if every rebuilt shard succeeded, False otherwise
+        """
+        languages = list(languages or self.languages)
+        unknown = [language for language in languages if language not in self.shards]
+        if unknown:
+            raise ValueError(f"Unknown shard languages: {', '.join(unknown)}")
+        
+        progress = progress if progress is not None else {}
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        spill_dir = Path(tempfile.mkdtemp(prefix="vector-shards-", dir=self.data_dir))
+        try:
+            progress["phase"] = "splitting"
+            counts = await asyncio.to_thread(self._spill, batches, spill_dir, "corpus", languages)
+            if training_batches is not None:
+                await asyncio.to_thread(self._spill, training_batches, spill_dir, "training", languages)
+            
+            batch_size = settings.vector_encode_batch_size
+            stats = {}
+            success = True
+            for language in languages:
+                corpus = spill_dir / f"corpus-{language}.jsonl"
+                training = spill_dir / f"training-{language}.jsonl"
+                shard = self.shards[language]
+                progress["shard"] = language
+                rebuilt = await shard.rebuild_from_batches(
+                    _read_spill(corpus, batch_size) if corpus.exists() else iter(()),
+                    counts.get(language, 0),
+                    training_batches=_read_spill(training, batch_size) if training.exists() else None,
+                    progress=progress,
+                )
+                success = rebuilt and success
+                stats[language] = shard.last_rebuild_stats
+            
+            self.last_rebuild_stats = self._sum_stats(stats)
+            logger.info(f"Rebuilt vector shards {', '.join(languages)}: {dict(counts)}")
+            return success
+        
+        except Exception as e:
+            logger.error(f"Failed to rebuild vector shards: {str(e)}")
+            return False
+        finally:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+    
+    def start_rebuild(
+        self,
+        batches: Iterable[List[Dict[str, Any]]],
+        expected_total: int,
+        training_batches: Optional[Iterable[List[Dict[str, Any]]]] = None,
+        languages: Optional[List[str]] = None,
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run rebuild_from_batches as a background job (see VectorService.start_rebuild).
+        
+        Raises:
+            RuntimeError: If a rebuild is already running
+        """
+        return self.rebuild_job.start(
+            lambda progress: self.rebuild_from_batches(
+                batches, expected_total, training_batches=training_batches, languages=languages, progress=progress
+            ),
+            expected_total,
+            lambda: self.last_rebuild_stats,
+            on_done,
+        )
+    
+    def _spill(self, batches: Iterable[List[Dict[str, Any]]], directory: Path, name: str, languages: List[str]) -> Counter:
+        """Write documents to one JSONL file per language; return the counts."""
+        files = {}
+        counts: Counter = Counter()
+        try:
+            for batch in batches:
+                for document in batch:
+                    language = self.language_of(document)
+                    if language not in languages:
+                        continue
+                    if language not in files:
+                        files[language] = open(directory / f"{name}-{language}.jsonl", "w", encoding="utf-8")
+                    files[language].write(json.dumps(document, ensure_ascii=False, default=_json_default) + "\n")
+                    counts[language] += 1
+        finally:
+            for f in files.values():
+                f.close()
+        return counts
+    
+    @staticmethod
+    def _sum_stats(stats: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Add up per-shard rebuild counters, keeping the per-shard ones."""
+        total: Dict[str, Any] = {}
+        for shard_stats in stats.values():
+            for key, value in shard_stats.items():
+                if isinstance(value, (int, float)):
+                    total[key] = total.get(key, 0) + value
+        total["shards"] = stats
+        return total
+    
+    async def close(self):
+        """Merge the segments each shard logged into its snapshot (see VectorService.close)."""
+        await asyncio.gather(*(shard.close() for shard in self.shards.values()))
+    
+    async def get_index_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the shards.
+        
+        Returns:
+            Dictionary with totals, query routing counters and per-shard statistics
+        """
+        shard_stats = {language: await shard.get_index_stats() for language, shard in self.shards.items()}
+        available = [stats for stats in shard_stats.values() if stats.get("status") == "available"]
+        return {
+            "status": "available" if available else "not_available",
+            "sharded": True,
+            "languages": self.languages,
+            "documents": sum(stats["documents"] for stats in available),
+            "live_vectors": sum(stats["live_vectors"] for stats in available),
+            "index_version": self.index_version,
+            "routing": {**self.routing_stats, "by_language": dict(self.routing_stats["by_language"])},
+            "fanout": settings.vector_shard_fanout,
+            "shards": shard_stats,
+        }
+    
+    async def remove_document(self, doc_id: str) -> bool:
+        """
+        Remove a document from whichever shard holds it.
+        
+        Args:
+            doc_id: Document ID to remove
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        language = self._shard_of(doc_id)
+        if language is None:
+            logger.warning(f"Document {doc_id} not found in index")
+            return False
+        return await self.shards[language].remove_document(doc_id)
+    
+    async def update_document(self, doc_id: str, new_text: str, metadata: Dict[str, Any]) -> bool:
+        """
+        Update a document, moving it to another shard if its language changed.
+        
+        Args:
+            doc_id: Document ID to update
+            new_text: New document text
+            metadata: Updated metadata
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        return await self.add_documents([{**metadata, 'id': doc_id, 'text': new_text}])
+    
+    def add_change_listener(self, listener: Callable[[Optional[List[str]]], None]):
+        """Register a callable notified of document changes in any shard."""
+        for shard in self.shards.values():
+            shard.add_change_listener(listener)
+    
+    def is_available(self) -> bool:
+        """
+        Check if vector search is available (any shard can serve queries).
+        
+        Returns:
+            bool: True if vector service is available, False otherwise
+        """
+        return any(shard.is_available() for shard in self.shards.values())
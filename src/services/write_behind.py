@@ -0,0 +1,305 @@
+"""
+Write-Behind - Batched, off-request persistence of AI query records.
+AI queries, answers and answer sources are queued in memory and inserted
+in batches by a background task, so a question's request never waits on
+the database. Their IDs come from database sequences in blocks, so a query
+ID can be returned before its row is written.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from src.core.settings import settings
+from src.db.models.ai import AIAnswers, AIAnswerSources, AIQueries
+
+logger = logging.getLogger(__name__)
+
+# Attempts at writing a batch before its records are written one by one
+WRITE_ATTEMPTS = 3
+
+# How long a read waits for queued records it depends on
+READ_WAIT_SECONDS = 5.0
+
+# (query, answer or None, sources) rows of one question
+RecordGroup = Tuple[Dict[str, Any], Optional[Dict[str, Any]], List[Dict[str, Any]]]
+
+
+class RecordsPendingError(RuntimeError):
+    """Raised when records a read depends on are still queued for writing."""
+
+
+class SequenceAllocator:
+    """
+    Hands out IDs of one table from its database sequence, fetched in blocks.
+    
+    On SQL Server a block is one sp_sequence_get_range call; unused IDs of
+    the last block are lost when the process stops. Other databases (local
+    development) continue after the largest stored ID, which is only safe
+    with a single process.
+    """
+    
+    def __init__(self, engine: Engine, sequence: str, column, block_size: int):
+        self.engine = engine
+        self.sequence = sequence
+        self.column = column
+        self.block_size = max(1, block_size)
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+    
+    async def allocate(self, count: int = 1) -> List[int]:
+        """Allocate count new IDs; the database is only reached when a block runs out."""
+        ids: List[int] = []
+        async with self._lock:
+            while len(ids) < count:
+                if self._next >= self._end:
+                    size = max(self.block_size, count - len(ids))
+                    self._next = await asyncio.to_thread(self._fetch_range, size)
+                    self._end = self._next + size
+                take = min(count - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+        return ids
+    
+    def _fetch_range(self, size: int) -> int:
+        """Reserve size consecutive IDs and return the first."""
+        with self.engine.begin() as connection:
+            if connection.dialect.name == "mssql":
+                return int(connection.execute(
+                    text(
+                        "SET NOCOUNT ON; "
+                        "DECLARE @first SQL_VARIANT; "
+                        "EXEC sys.sp_sequence_get_range @sequence_name = :sequence, "
+                        "@range_size = :size, @range_first_value = @first OUTPUT; "
+                        "SELECT CAST(@first AS BIGINT)"
+                    ),
+                    {"sequence": self.sequence, "size": size},
+                ).scalar_one())
+            stored = connection.execute(select(func.max(self.column))).scalar() or 0
+            return max(stored + 1, self._end)
+
+
+class WriteBehindWriter:
+    """
+    Queue of AI records inserted in batches by a background task.
+    
+    A batch is written once ai_write_batch_size questions are queued or the
+    oldest has waited ai_write_max_wait_ms, with one executemany per table
+    in one transaction. A failed batch is retried, then written question by
+    question so one bad record does not lose the others. Callers wait when
+    ai_write_queue_size questions are pending.
+    
+    A query's rows reach the database shortly after its response, so reads
+    that follow a question (feedback, history, details) call wait_written
+    first to see them.
+    """
+    
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        block_size = settings.ai_id_block_size
+        self.query_ids = SequenceAllocator(engine, "AIQueries_QueryID_Seq", AIQueries.QueryID, block_size)
+        self.answer_ids = SequenceAllocator(engine, "AIAnswers_AnswerID_Seq", AIAnswers.AnswerID, block_size)
+        self.source_ids = SequenceAllocator(engine, "AIAnswerSources_SourceID_Seq", AIAnswerSources.SourceID, block_size)
+        self.batch_size = max(1, settings.ai_write_batch_size)
+        self.max_wait = settings.ai_write_max_wait_ms / 1000
+        self._queue: "asyncio.Queue[RecordGroup]" = asyncio.Queue(maxsize=max(0, settings.ai_write_queue_size))
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        # QueryID -> (UserID, set once the query's records are written or dropped)
+        self._pending: Dict[int, Tuple[Optional[int], asyncio.Event]] = {}
+        
+        self.queued = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.dropped = 0
+    
+    async def new_query_id(self) -> int:
+        """ID for a query whose row will be submitted later."""
+        return (await self.query_ids.allocate())[0]
+    
+    async def submit(
+        self,
+        query: Dict[str, Any],
+        answer: Optional[Dict[str, Any]] = None,
+        sources: Optional[List[Dict[str, Any]]] = None,
+    ):
+        """
+        Queue a question's records for writing.
+        
+        Args:
+            query: AIQueries row, with its QueryID from new_query_id()
+            answer: AIAnswers row without IDs, or None for an unanswered query
+            sources: AIAnswerSources rows without IDs
+        
+        Raises:
+            RuntimeError: If the writer has been closed
+        """
+        if self._closed:
+            raise RuntimeError("AI record writer is closed")
+        sources = list(sources or [])
+        if answer is not None:
+            answer = {**answer, 'AnswerID': (await self.answer_ids.allocate())[0], 'QueryID': query['QueryID']}
+            source_ids = await self.source_ids.allocate(len(sources)) if sources else []
+            sources = [
+                {**source, 'SourceID': source_id, 'AnswerID': answer['AnswerID']}
+                for source, source_id in zip(sources, source_ids)
+            ]
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        self._pending[query['QueryID']] = (query.get('UserID'), asyncio.Event())
+        try:
+            await self._queue.put((query, answer, sources))
+        except BaseException:
+            self._pending.pop(query['QueryID'], None)
+            raise
+        self.queued += 1
+    
+    async def wait_written(
+        self,
+        query_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        timeout: float = READ_WAIT_SECONDS,
+    ) -> bool:
+        """
+        Wait until queued records are in the database.
+        
+        Args:
+            query_id: Only this query's records
+            user_id: Only the records of this user's queries
+            timeout: Seconds to wait at most
+        
+        Returns:
+            False if some were still pending after timeout seconds
+        """
+        events = [
+            event for pending_id, (pending_user, event) in self._pending.items()
+            if (query_id is None or pending_id == query_id) and (user_id is None or pending_user == user_id)
+        ]
+        if not events:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.gather(*(event.wait() for event in events)), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    async def _run(self):
+        """Collect batches from the queue and write them, until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._write(batch)
+            finally:
+                for query, _, _ in batch:
+                    _, event = self._pending.pop(query['QueryID'], (None, None))
+                    if event is not None:
+                        event.set()
+                    self._queue.task_done()
+    
+    async def _write(self, batch: List[RecordGroup]):
+        """Write a batch, retrying, then question by question."""
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                await asyncio.to_thread(self._insert, batch)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} AI records (attempt {attempt + 1}): {str(e)}")
+                if attempt + 1 < WRITE_ATTEMPTS:
+                    self.retries += 1
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+        
+        for group in batch:
+            try:
+                await asyncio.to_thread(self._insert, [group])
+                self.written += 1
+            except Exception as e:
+                logger.error(f"Dropped AI records of query {group[0].get('QueryID')}: {str(e)}")
+                self.dropped += 1
+    
+    def _insert(self, batch: List[RecordGroup]):
+        """Insert the batch's rows, parents first, in one transaction."""
+        queries = [query for query, _, _ in batch]
+        answers = [answer for _, answer, _ in batch if answer is not None]
+        sources = [source for _, _, group in batch for source in group]
+        with self.engine.begin() as connection:
+            for model, rows in ((AIQueries, queries), (AIAnswers, answers), (AIAnswerSources, sources)):
+                if rows:
+                    self._insert_rows(connection, model.__table__, rows)
+    
+    @staticmethod
+    def _insert_rows(connection: Connection, table, rows: List[Dict[str, Any]]):
+        """executemany insert with explicit IDs into an IDENTITY table."""
+        identity = connection.dialect.name == "mssql"
+        if identity:
+            connection.exec_driver_sql(f"SET IDENTITY_INSERT [{table.name}] ON")
+        try:
+            connection.execute(table.insert(), rows)
+        finally:
+            if identity:
+                connection.exec_driver_sql(f"SET IDENTITY_INSERT [{table.name}] OFF")
+    
+    async def drain(self):
+        """Stop accepting records and write every queued one."""
+        self._closed = True
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+    
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and write counters for this process."""
+        return {
+            "pending": self._queue.qsize(),
+            "queued": self.queued,
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "dropped": self.dropped,
+        }
+
+
+_shared_writer: Optional[WriteBehindWriter] = None
+_shared_writer_lock = threading.Lock()
+
+
+def get_ai_record_writer() -> WriteBehindWriter:
+    """Return the process-wide AI record writer, creating it on first use."""
+    global _shared_writer
+    if _shared_writer is None:
+        with _shared_writer_lock:
+            if _shared_writer is None:
+                from src.db.session import engine
+                _shared_writer = WriteBehindWriter(engine)
+    return _shared_writer
+
+
+async def close_ai_record_writer():
+    """Write the queued records and close the writer, e.g. on app shutdown."""
+    global _shared_writer
+    writer, _shared_writer = _shared_writer, None
+    if writer is not None:
+        await writer.drain()
+        logger.info(f"Drained AI record writer: {writer.written} written, {writer.dropped} dropped")
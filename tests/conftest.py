@@ -0,0 +1,113 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from src.core.settings import settings
+
+
+class StubEncoder:
+    """Deterministic bag-of-words encoder standing in for the sentence model."""
+
+    max_seq_length = 128
+    tokenizer = None
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        embeddings = np.zeros((len(texts), settings.vector_dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = text.lower().split()
+            for word in words:
+                seed = int(hashlib.md5(word.encode()).hexdigest()[:8], 16)
+                embeddings[row] += np.random.default_rng(seed).standard_normal(settings.vector_dimension)
+            if not words:
+                embeddings[row, 0] = 1.0
+        return embeddings
+
+
+@pytest.fixture
+def stub_encoder(monkeypatch, tmp_path):
+    """Enable the vector service with StubEncoder, without a real encoder backend installed."""
+    faiss = pytest.importorskip("faiss")
+    from src.services import vector_service
+
+    mmap_flags = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    monkeypatch.setattr(vector_service, "VECTOR_AVAILABLE", True)
+    monkeypatch.setattr(vector_service, "INDEX_MMAP_FLAGS", mmap_flags, raising=False)
+    monkeypatch.setattr(
+        vector_service, "INDEX_READ_FLAGS", mmap_flags | faiss.IO_FLAG_READ_ONLY if mmap_flags else 0, raising=False
+    )
+    monkeypatch.setitem(vector_service._shared_encoders, settings.vector_model, StubEncoder())
+    monkeypatch.setattr(settings, "vector_encode_workers", 1)
+    monkeypatch.setattr(settings, "vector_shard_languages", "")
+    monkeypatch.setattr(settings, "vector_embedding_cache_dir", str(tmp_path / "embedding_cache"))
+    return StubEncoder()
+
+
+@pytest.fixture
+def articles():
+    """Law articles with distinct wording, two categories and five laws."""
+    return [
+        {
+            'id': f'article_{i}',
+            'text': f'article {i} of law {i % 5} concerns topic{i} and subject{i % 7}',
+            'type': 'law_article',
+            'law_id': i % 5,
+            'article_id': i,
+            'category': 'Tax' if i % 2 else 'Civil',
+        }
+        for i in range(60)
+    ]
+
+
+class FakeAIBackend:
+    """Retrieval, provider and record writer of AIService, in memory."""
+
+    def __init__(self):
+        self.chunks = ["Exports ", "are ", "exempt."]
+        # Raised by the provider once it has streamed the chunks
+        self.error = None
+        self.streamed = 0
+        self.provider_closed = False
+        self.query_ids = 0
+        self.submitted = []
+
+    async def new_query_id(self):
+        self.query_ids += 1
+        return self.query_ids
+
+    async def submit(self, query, answer=None, sources=None):
+        self.submitted.append((query, answer, sources))
+
+    async def retrieve_context(self, query, max_sources=5):
+        return [{
+            'law_id': 12, 'article_id': 5, 'content': "Exports of goods are exempt from VAT.",
+            'relevance_score': 0.9, 'law_number': "12-34", 'law_title': "Finance Act", 'article_number': "5",
+        }]
+
+    async def stream_provider(self, prompt):
+        try:
+            for chunk in self.chunks:
+                self.streamed += 1
+                yield chunk
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.provider_closed = True
+
+
+@pytest.fixture
+def ai_backend(monkeypatch):
+    """Run AIService on FakeAIBackend: no search index, answer cache, provider or database."""
+    from types import SimpleNamespace
+
+    from src.services import ai_service
+    from src.services.ai_service import AIService
+
+    backend = FakeAIBackend()
+    monkeypatch.setattr(ai_service, "get_vector_service", lambda: SimpleNamespace(index_version=0))
+    monkeypatch.setattr(ai_service, "get_answer_cache", lambda: SimpleNamespace(max_size=0))
+    monkeypatch.setattr(ai_service, "get_provider_gateway", lambda: SimpleNamespace(provider="openai", client=None))
+    monkeypatch.setattr(ai_service, "get_ai_record_writer", lambda: backend)
+    monkeypatch.setattr(AIService, "_retrieve_context", lambda service, query, max_sources=5: backend.retrieve_context(query, max_sources))
+    monkeypatch.setattr(AIService, "_stream_ai_provider", lambda service, prompt: backend.stream_provider(prompt))
+    return backend
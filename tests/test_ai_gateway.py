@@ -0,0 +1,137 @@
+import asyncio
+import email.utils
+import time
+
+import httpx
+import pytest
+
+from src.services.ai_gateway import ProviderTransport, retry_after_seconds
+
+
+def _transport(handler, **options):
+    settings = {"max_concurrency": 2, "max_retries": 2, "base_delay": 0.001, "max_delay": 1.0, **options}
+    return ProviderTransport(httpx.MockTransport(handler), **settings)
+
+
+def _replies(*responses):
+    """Handler returning the given responses (or raising the given errors) in turn."""
+    queue = list(responses)
+
+    def handler(request):
+        reply = queue.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    return handler
+
+
+class _EventStream(httpx.AsyncByteStream):
+    """Body sent chunk by chunk, as a streamed answer is."""
+
+    def __init__(self, *chunks):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def test_retry_after_headers():
+    assert retry_after_seconds(httpx.Headers({"retry-after-ms": "250"})) == 0.25
+    assert retry_after_seconds(httpx.Headers({"retry-after": "3"})) == 3.0
+    assert retry_after_seconds(httpx.Headers({"retry-after": "soon"})) is None
+    assert retry_after_seconds(httpx.Headers()) is None
+    in_a_minute = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 < retry_after_seconds(httpx.Headers({"retry-after": in_a_minute})) <= 60
+
+
+@pytest.mark.asyncio
+async def test_throttled_requests_wait_for_retry_after_then_succeed():
+    transport = _transport(_replies(
+        httpx.Response(429, headers={"retry-after-ms": "50"}),
+        httpx.Response(200, json={"ok": True}),
+    ))
+    async with httpx.AsyncClient(transport=transport) as client:
+        started = time.monotonic()
+        response = await client.post("https://provider.test/v1/messages")
+
+    assert response.status_code == 200
+    assert time.monotonic() - started >= 0.05
+    assert transport.stats()["retries"] == 1
+    assert transport.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_a_retry_after_beyond_max_delay_is_returned_as_is():
+    transport = _transport(_replies(httpx.Response(429, headers={"retry-after": "120"})))
+    async with httpx.AsyncClient(transport=transport) as client:
+        response = await client.post("https://provider.test/v1/messages")
+
+    assert response.status_code == 429
+    assert (transport.retries, transport.failures) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_retried_up_to_max_retries():
+    transport = _transport(_replies(*(httpx.Response(503) for _ in range(3))))
+    async with httpx.AsyncClient(transport=transport) as client:
+        response = await client.post("https://provider.test/v1/messages")
+
+    assert response.status_code == 503
+    assert (transport.retries, transport.failures) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_connection_errors_are_retried_then_raised():
+    transport = _transport(_replies(
+        httpx.ConnectError("refused"),
+        httpx.Response(200),
+    ))
+    async with httpx.AsyncClient(transport=transport) as client:
+        assert (await client.get("https://provider.test/")).status_code == 200
+
+    failing = _transport(_replies(*(httpx.ConnectError("refused") for _ in range(3))))
+    async with httpx.AsyncClient(transport=failing) as client:
+        with pytest.raises(httpx.ConnectError):
+            await client.get("https://provider.test/")
+    assert (failing.retries, failing.failures, failing.in_flight) == (2, 1, 0)
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    transport = _transport(_replies(httpx.Response(400)))
+    async with httpx.AsyncClient(transport=transport) as client:
+        assert (await client.get("https://provider.test/")).status_code == 400
+    assert transport.retries == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_capped():
+    active = peak = 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200)
+
+    transport = _transport(handler, max_concurrency=2)
+    async with httpx.AsyncClient(transport=transport) as client:
+        responses = await asyncio.gather(*(client.get("https://provider.test/") for _ in range(6)))
+
+    assert all(response.status_code == 200 for response in responses)
+    assert peak == 2
+    assert transport.stats()["requests"] == 6
+
+
+@pytest.mark.asyncio
+async def test_a_streamed_response_holds_its_slot_until_read():
+    transport = _transport(_replies(httpx.Response(200, stream=_EventStream(b"data: one\n\n"))), max_concurrency=1)
+    async with httpx.AsyncClient(transport=transport) as client:
+        async with client.stream("POST", "https://provider.test/v1/messages") as response:
+            assert transport.in_flight == 1
+            assert [chunk async for chunk in response.aiter_bytes()] == [b"data: one\n\n"]
+            assert transport.in_flight == 0
@@ -0,0 +1,158 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.core.security import get_current_user
+from src.db import session as db_session
+from src.routers import ai as ai_router
+from src.schemas.legal import AIQueryRequest
+from src.services import vector_documents, vector_service
+from src.services.rebuild_job import RebuildJob
+
+
+class FakeSession:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    """Database sessions opened by the endpoints."""
+    opened = []
+
+    def session_local():
+        opened.append(FakeSession())
+        return opened[-1]
+
+    monkeypatch.setattr(db_session, "SessionLocal", session_local)
+    return opened
+
+
+@pytest.fixture
+def client(ai_backend, sessions):
+    app = FastAPI()
+    app.include_router(ai_router.router, prefix="/api/v1/ai")
+    app.dependency_overrides[get_current_user] = lambda: None
+    return TestClient(app)
+
+
+def _server_sent_events(body):
+    """(event, data) pairs of an event stream, checking each is framed as one event and one data line."""
+    assert body.endswith("\n\n")
+    events = []
+    for block in body[:-2].split("\n\n"):
+        event, data = block.split("\n")
+        assert event.startswith("event: ") and data.startswith("data: ")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_stream_is_framed_as_server_sent_events(client, sessions, ai_backend):
+    with client.stream("POST", "/api/v1/ai/query/stream", json={"query": "Are exports taxed?"}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.headers["cache-control"] == "no-cache"
+        assert response.headers["x-accel-buffering"] == "no"
+        events = _server_sent_events("".join(response.iter_text()))
+
+    assert [event for event, _ in events] == ["sources", "delta", "delta", "delta", "done"]
+    assert "".join(data["text"] for event, data in events if event == "delta") == "Exports are exempt."
+    assert events[-1][1]["query_id"] == "1"
+    assert len(ai_backend.submitted) == 1
+    assert [session.closed for session in sessions] == [True]
+
+
+def test_provider_errors_are_sent_as_an_error_event(client, sessions, ai_backend):
+    ai_backend.error = RuntimeError("provider overloaded")
+
+    with client.stream("POST", "/api/v1/ai/query/stream", json={"query": "Are exports taxed?"}) as response:
+        assert response.status_code == 200
+        events = _server_sent_events("".join(response.iter_text()))
+
+    assert events[-1] == ("error", {"detail": "AI query failed: provider overloaded"})
+    assert ai_backend.submitted == []
+    assert [session.closed for session in sessions] == [True]
+
+
+@pytest.mark.asyncio
+async def test_a_client_disconnect_closes_the_provider_stream_and_the_session(sessions, ai_backend):
+    response = await ai_router.stream_ai_query(AIQueryRequest(query="Are exports taxed?"), current_user=None)
+
+    assert (await response.body_iterator.__anext__()).startswith("event: sources\n")
+    assert (await response.body_iterator.__anext__()).startswith("event: delta\n")
+    # Starlette closes the body when the client goes away
+    await response.body_iterator.aclose()
+
+    assert ai_backend.provider_closed
+    assert ai_backend.streamed == 1
+    assert ai_backend.submitted == []
+    assert [session.closed for session in sessions] == [True]
+
+
+class FakeRebuildService:
+    """Vector service whose rebuild reads one corpus batch, then fails."""
+
+    def __init__(self):
+        self.rebuild_job = RebuildJob()
+        self.batches_read = 0
+
+    def is_available(self):
+        return True
+
+    def training_sample_size(self, num_vectors):
+        return 2
+
+    def start_rebuild(self, batches, expected_total, training_batches=None, on_done=None):
+        async def rebuild(progress):
+            for batch in batches:
+                self.batches_read += 1
+                raise RuntimeError("encoder crashed")
+            return True
+
+        return self.rebuild_job.start(rebuild, expected_total, lambda: {}, on_done)
+
+
+@pytest.fixture
+def rebuild_service(sessions, monkeypatch):
+    service = FakeRebuildService()
+
+    def iter_corpus_documents(db, batch_size, sample_every=1, skip_duplicates=False):
+        for start in range(0, 4, sample_every):
+            assert not db.closed
+            yield [{'id': f'law_{start}', 'text': "Loi de finances"}]
+
+    monkeypatch.setattr(vector_service, "get_vector_service", lambda: service)
+    monkeypatch.setattr(vector_documents, "count_corpus_documents", lambda db, skip_duplicates=False: {"laws": 4, "articles": 0})
+    monkeypatch.setattr(vector_documents, "iter_corpus_documents", iter_corpus_documents)
+    return service
+
+
+async def _start_rebuild():
+    admin = SimpleNamespace(UserID=1, is_admin=True)
+    return await ai_router.rebuild_vector_index(language=None, current_user=admin, db=FakeSession())
+
+
+@pytest.mark.asyncio
+async def test_a_failed_rebuild_closes_its_sessions(rebuild_service, sessions):
+    assert (await _start_rebuild())["status"] == "started"
+    await rebuild_service.rebuild_job._task
+
+    assert rebuild_service.rebuild_job.state == "failed"
+    assert rebuild_service.batches_read == 1
+    assert sessions and all(session.closed for session in sessions)
+
+
+@pytest.mark.asyncio
+async def test_a_rebuild_cancelled_before_it_runs_opens_no_session(rebuild_service, sessions):
+    await _start_rebuild()
+    rebuild_service.rebuild_job._task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await rebuild_service.rebuild_job._task
+
+    assert sessions == []
@@ -0,0 +1,58 @@
+import pytest
+
+from src.schemas.legal import AIQueryRequest
+from src.services.ai_service import AIService
+
+
+class FakeSession:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+async def _events(stream):
+    return [(event, data) async for event, data in stream]
+
+
+@pytest.mark.asyncio
+async def test_streamed_answer_events_and_records(ai_backend):
+    events = await _events(AIService(FakeSession()).stream_legal_query(AIQueryRequest(query="Are exports taxed?"), user_id=7))
+
+    assert [event for event, _ in events] == ["sources", "delta", "delta", "delta", "done"]
+    assert events[0][1]["sources"][0]["law_id"] == 12
+    assert "".join(data["text"] for event, data in events if event == "delta") == "Exports are exempt."
+    assert events[-1][1]["query_id"] == "1"
+    assert events[-1][1]["disclaimer"]
+
+    [(query, answer, sources)] = ai_backend.submitted
+    assert query["QueryID"] == 1 and query["UserID"] == 7
+    assert answer["AnswerText"] == "Exports are exempt."
+    assert sources[0]["ArticleID"] == 5
+
+
+@pytest.mark.asyncio
+async def test_a_provider_failure_mid_stream_ends_with_an_error_event(ai_backend):
+    ai_backend.error = RuntimeError("connection reset")
+
+    events = await _events(AIService(FakeSession()).stream_legal_query(AIQueryRequest(query="Are exports taxed?")))
+
+    assert [event for event, _ in events] == ["sources", "delta", "delta", "delta", "error"]
+    assert "connection reset" in events[-1][1]["detail"]
+    assert ai_backend.submitted == []
+
+
+@pytest.mark.asyncio
+async def test_closing_the_stream_early_stops_the_provider_and_stores_nothing(ai_backend):
+    session = FakeSession()
+    stream = AIService(session).stream_legal_query(AIQueryRequest(query="Are exports taxed?"))
+
+    assert (await stream.__anext__())[0] == "sources"
+    assert (await stream.__anext__()) == ("delta", {"text": "Exports "})
+    await stream.aclose()
+
+    assert ai_backend.provider_closed
+    assert ai_backend.streamed == 1
+    assert ai_backend.submitted == []
+    # The database session is released before the provider is called
+    assert session.closed
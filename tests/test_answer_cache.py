@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from src.schemas.legal import AIResponse, AISource
+from src.services.answer_cache import AnswerCache
+
+DIMENSION = 8
+
+
+def _embedding(*values):
+    vector = np.zeros(DIMENSION, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector / np.linalg.norm(vector)
+
+
+def _response(law_id=1, article_id=10):
+    return AIResponse(
+        answer_text="answer",
+        confidence=0.8,
+        sources=[AISource(law_id=law_id, article_id=article_id, excerpt="excerpt", score=0.9)],
+        disclaimer="disclaimer",
+        query_id="5",
+    )
+
+
+@pytest.fixture
+def cache():
+    return AnswerCache(max_size=2, threshold=0.95, dimension=DIMENSION)
+
+
+def test_a_near_identical_question_reuses_the_answer(cache):
+    cache.put(_embedding(1.0, 0.0), "fr", 5, _response())
+
+    cached = cache.get(_embedding(1.0, 0.1), "fr", 5)
+
+    assert cached.answer_text == "answer"
+    assert cached.query_id is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_other_questions_languages_and_source_counts_miss(cache):
+    cache.put(_embedding(1.0, 0.0), "fr", 5, _response())
+
+    assert cache.get(_embedding(0.0, 1.0), "fr", 5) is None
+    assert cache.get(_embedding(1.0, 0.0), "ar", 5) is None
+    assert cache.get(_embedding(1.0, 0.0), "fr", 3) is None
+    assert cache.stats()["misses"] == 3
+
+
+def test_a_changed_article_drops_the_answers_citing_it(cache):
+    cache.put(_embedding(1.0, 0.0), "fr", 5, _response(law_id=1, article_id=10))
+    cache.put(_embedding(0.0, 1.0), "fr", 5, _response(law_id=2, article_id=20))
+
+    cache.documents_changed(['article_10', 'law_99'])
+
+    assert cache.get(_embedding(1.0, 0.0), "fr", 5) is None
+    assert cache.get(_embedding(0.0, 1.0), "fr", 5) is not None
+    assert cache.stats()["invalidated"] == 1
+
+
+def test_a_rebuild_clears_the_cache(cache):
+    cache.put(_embedding(1.0, 0.0), "fr", 5, _response())
+
+    cache.documents_changed(None)
+
+    assert len(cache) == 0
+
+
+def test_the_least_recently_used_answer_is_evicted(cache):
+    cache.put(_embedding(1.0, 0.0), "fr", 5, _response(law_id=1))
+    cache.put(_embedding(0.0, 1.0), "fr", 5, _response(law_id=2))
+    assert cache.get(_embedding(1.0, 0.0), "fr", 5) is not None
+
+    cache.put(_embedding(0.0, 0.0, 1.0), "fr", 5, _response(law_id=3))
+
+    assert cache.get(_embedding(0.0, 1.0), "fr", 5) is None
+    assert cache.get(_embedding(1.0, 0.0), "fr", 5) is not None
+    # The evicted answer's citations no longer point at a slot
+    assert cache.invalidate(law_ids=[2]) == 0
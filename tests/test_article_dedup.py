@@ -0,0 +1,36 @@
+import numpy as np
+
+from src.services.article_dedup import _clusters
+
+
+def _unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_chained_articles_are_not_linked_below_the_threshold():
+    # a~b and b~c reach 0.9, a~c does not
+    vectors = np.stack([_unit(1.0, 0.0), _unit(0.94, 0.34), _unit(0.77, 0.64)])
+    articles = [
+        {'article_id': 1, 'publication_date': '2020-01-01'},
+        {'article_id': 2, 'publication_date': '2021-01-01'},
+        {'article_id': 3, 'publication_date': '2022-01-01'},
+    ]
+    left, right = np.array([0, 1]), np.array([1, 2])
+    assert vectors[0] @ vectors[2] < 0.9 <= min(vectors[0] @ vectors[1], vectors[1] @ vectors[2])
+
+    clusters = _clusters(vectors, articles, left, right, threshold=0.9)
+
+    # The newest article is canonical; the oldest is too far from it to be its duplicate
+    assert clusters == [(2, [1])]
+
+
+def test_cluster_members_are_all_linked_to_the_canonical_article():
+    vectors = np.stack([_unit(1.0, 0.0), _unit(0.99, 0.1), _unit(0.99, -0.1)])
+    articles = [{'article_id': i, 'publication_date': None} for i in (5, 3, 4)]
+    left, right = np.array([0, 0]), np.array([1, 2])
+
+    clusters = _clusters(vectors, articles, left, right, threshold=0.9)
+
+    # Without dates, the lowest article ID is canonical
+    assert clusters == [(1, [2, 0])]
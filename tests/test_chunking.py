@@ -0,0 +1,45 @@
+from src.services.chunking import PassageChunker
+
+
+def _words(n):
+    return " ".join(f"w{i:02d}" for i in range(n))
+
+
+def test_short_text_is_one_passage():
+    chunker = PassageChunker(max_tokens=16, overlap_tokens=4)
+
+    assert chunker.split("  a short article  ") == ["a short article"]
+    assert chunker.split("   ") == []
+
+
+def test_long_text_is_split_into_bounded_overlapping_passages():
+    # Without a tokenizer each 3-character word counts as one word piece
+    chunker = PassageChunker(max_tokens=10, overlap_tokens=3)
+
+    passages = chunker.split(_words(25))
+
+    assert all(len(passage.split()) <= 10 for passage in passages)
+    for previous, current in zip(passages, passages[1:]):
+        assert previous.split()[-3:] == current.split()[:3]
+    assert passages[0].split()[0] == "w00"
+    assert passages[-1].split()[-1] == "w24"
+
+
+def test_tokenizer_word_pieces_bound_the_passages():
+    def tokenizer(words, add_special_tokens=False):
+        # Every word is two word pieces
+        return {"input_ids": [[1, 2] for _ in words]}
+
+    chunker = PassageChunker(max_tokens=10, overlap_tokens=0, tokenizer=tokenizer)
+
+    assert [len(passage.split()) for passage in chunker.split(_words(12))] == [5, 5, 2]
+
+
+def test_passages_link_back_to_their_document():
+    chunker = PassageChunker(max_tokens=10, overlap_tokens=0)
+
+    passages = list(chunker.chunk_documents([{'id': 'article_1', 'text': _words(15), 'law_id': 3}]))
+
+    assert [passage['id'] for passage in passages] == ['article_1#0', 'article_1#1']
+    assert all(passage['parent_id'] == 'article_1' and passage['law_id'] == 3 for passage in passages)
+    assert [passage['chunk'] for passage in passages] == [0, 1]
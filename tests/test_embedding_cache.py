@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from src.services.embedding_cache import EmbeddingCache, text_key
+
+DIMENSION = 4
+
+
+def _keys(*texts):
+    return np.array([text_key(text) for text in texts], dtype=np.uint64)
+
+
+def _vectors(*values):
+    return np.array([[value] * DIMENSION for value in values], dtype=np.float32)
+
+
+def test_flushed_embeddings_are_found_after_reopening(tmp_path):
+    cache = EmbeddingCache(tmp_path, "model/name", DIMENSION)
+    cache.put(_keys("a", "b"), _vectors(1.0, 2.0))
+    cache.flush()
+
+    reopened = EmbeddingCache(tmp_path, "model/name", DIMENSION)
+    embeddings, missing = reopened.lookup(_keys("b", "c", "a"))
+
+    assert missing.tolist() == [1]
+    assert embeddings[[0, 2], 0].tolist() == [2.0, 1.0]
+    assert reopened.stats() == {"entries": 2, "hits": 2, "misses": 1}
+
+
+def test_pending_embeddings_are_served_before_a_flush(tmp_path):
+    cache = EmbeddingCache(tmp_path, "model", DIMENSION)
+    cache.put(_keys("a"), _vectors(3.0))
+
+    embeddings, missing = cache.lookup(_keys("a"))
+
+    assert missing.size == 0
+    assert embeddings[0, 0] == 3.0
+
+
+def test_a_torn_tail_is_ignored_and_trimmed(tmp_path):
+    cache = EmbeddingCache(tmp_path, "model", DIMENSION)
+    cache.put(_keys("a"), _vectors(1.0))
+    cache.flush()
+    # A crash after the vector append but before its key
+    with open(cache.vectors_path, "ab") as f:
+        _vectors(9.0).tofile(f)
+
+    reopened = EmbeddingCache(tmp_path, "model", DIMENSION)
+    assert len(reopened) == 1
+    reopened.put(_keys("b"), _vectors(2.0))
+    reopened.flush()
+
+    assert cache.vectors_path.stat().st_size == 2 * DIMENSION * 4
+    embeddings, missing = EmbeddingCache(tmp_path, "model", DIMENSION).lookup(_keys("a", "b"))
+    assert missing.size == 0
+    assert embeddings[:, 0].tolist() == [1.0, 2.0]
+
+
+def test_flushes_merge_into_the_loaded_keys(tmp_path, monkeypatch):
+    cache = EmbeddingCache(tmp_path, "model", DIMENSION)
+    texts = [f"text {i}" for i in range(20)]
+    for start in range(0, 20, 5):
+        cache.put(_keys(*texts[start:start + 5]), _vectors(*range(start, start + 5)))
+        cache.flush()
+        # Flushing never re-reads the key file
+        monkeypatch.setattr(cache, "_load", lambda: pytest.fail("flush reloaded the cache"))
+
+    embeddings, missing = cache.lookup(_keys(*reversed(texts)))
+
+    assert missing.size == 0
+    assert embeddings[:, 0].tolist() == list(range(19, -1, -1))
+    assert np.all(np.diff(cache._sorted_keys.astype(np.float64)) >= 0)
+    reopened, _ = EmbeddingCache(tmp_path, "model", DIMENSION).lookup(_keys(*texts))
+    assert reopened[:, 0].tolist() == list(range(20))
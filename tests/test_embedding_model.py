@@ -0,0 +1,82 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.core.settings import settings
+from src.services.embedding_model import PARITY_TEXTS, parity_report
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class FixedEncoder:
+    """Encoder returning given embeddings, row by row."""
+
+    def __init__(self, embeddings):
+        self.embeddings = np.asarray(embeddings, dtype=np.float32)
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        return self.embeddings[:len(texts)]
+
+
+def _recall_at(reference, candidate, texts, k):
+    """Share of each text's k nearest others under the reference that the candidate also ranks top k."""
+    def neighbours(encoder):
+        embeddings = np.asarray(encoder.encode(texts, show_progress_bar=False), dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        similarities = embeddings @ embeddings.T
+        np.fill_diagonal(similarities, -np.inf)
+        return np.argsort(-similarities, axis=1)[:, :k]
+
+    expected, actual = neighbours(reference), neighbours(candidate)
+    return float(np.mean([len(set(e) & set(a)) / k for e, a in zip(expected, actual)]))
+
+
+def test_parity_report_passes_small_deviations_and_fails_large_ones():
+    rng = np.random.default_rng(0)
+    texts = PARITY_TEXTS[:6]
+    embeddings = rng.standard_normal((len(texts), 32))
+
+    close = parity_report(FixedEncoder(embeddings), FixedEncoder(embeddings * 3 + 1e-3), texts)
+    assert close["passed"]
+    assert close["nearest_neighbour_agreement"] == 1.0
+
+    far = parity_report(FixedEncoder(embeddings), FixedEncoder(rng.standard_normal((len(texts), 32))), texts)
+    assert not far["passed"]
+    assert far["min_cosine"] < 0.95
+
+
+@pytest.fixture(scope="module")
+def onnx_export(tmp_path_factory):
+    """The configured model, exported and int8 quantized by the export script."""
+    for module in ("onnxruntime", "tokenizers", "onnx", "torch", "sentence_transformers"):
+        pytest.importorskip(module)
+    from sentence_transformers import SentenceTransformer
+
+    try:
+        reference = SentenceTransformer(settings.vector_model, device="cpu")
+    except OSError as e:
+        pytest.skip(f"{settings.vector_model} cannot be loaded: {e}")
+
+    output = tmp_path_factory.mktemp("onnx")
+    export = subprocess.run(
+        [sys.executable, str(ROOT / "scripts" / "export_onnx_encoder.py"), "--model", settings.vector_model, "--output", str(output)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    assert export.returncode == 0, export.stdout + export.stderr
+    return reference, output
+
+
+def test_int8_onnx_encoder_matches_sentence_transformers(onnx_export):
+    from src.services.embedding_model import OnnxEncoder
+
+    reference, output = onnx_export
+    candidate = OnnxEncoder(output)
+
+    assert candidate.model_file.name == "model_quantized.onnx"
+    report = parity_report(reference, candidate)
+    assert report["passed"], report
+    assert report["nearest_neighbour_agreement"] >= 0.9
+    assert _recall_at(reference, candidate, PARITY_TEXTS, k=3) >= 0.9
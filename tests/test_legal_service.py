@@ -0,0 +1,56 @@
+import pytest
+
+from src.core.settings import settings
+from src.services import legal_service
+from src.services.legal_service import LegalService
+
+
+class FakeVectorService:
+    """Ranks 300 articles, three per law."""
+
+    def __init__(self):
+        self.calls = []
+
+    def is_available(self):
+        return True
+
+    async def hybrid_search(self, query, k, threshold=None, filters=None):
+        self.calls.append(k)
+        return [{'id': f'article_{i}', 'law_id': i // 3} for i in range(min(k, 300))]
+
+
+@pytest.fixture
+def vector_service(monkeypatch):
+    service = FakeVectorService()
+    monkeypatch.setattr(legal_service, "get_vector_service", lambda: service)
+    monkeypatch.setattr(settings, "vector_hybrid_candidates", 50)
+    monkeypatch.setattr(settings, "vector_hybrid_max_results", 1000)
+    return service
+
+
+@pytest.mark.asyncio
+async def test_ranked_search_widens_to_reach_the_requested_page(vector_service):
+    law_ids, capped = await LegalService(db=None)._ranked_law_ids("tax", wanted=75)
+
+    assert law_ids[:75] == list(range(75))
+    assert capped
+    assert vector_service.calls == [75, 150, 300]
+
+
+@pytest.mark.asyncio
+async def test_ranked_search_reports_exhausted_matches(vector_service):
+    law_ids, capped = await LegalService(db=None)._ranked_law_ids("tax", wanted=150)
+
+    assert law_ids == list(range(100))
+    assert not capped
+
+
+@pytest.mark.asyncio
+async def test_ranked_search_stops_at_the_result_limit(vector_service, monkeypatch):
+    monkeypatch.setattr(settings, "vector_hybrid_max_results", 120)
+
+    law_ids, capped = await LegalService(db=None)._ranked_law_ids("tax", wanted=100)
+
+    assert law_ids == list(range(40))
+    assert capped
+    assert vector_service.calls[-1] == 120
@@ -0,0 +1,30 @@
+from src.services.lexical import match_expression, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_folds_case_accents_and_drops_stopwords():
+    assert tokenize("La Loi relative à l'ÉNERGIE") == ['loi', 'relative', 'energie']
+
+
+def test_tokenize_keeps_law_numbers_whole():
+    assert tokenize("Loi n° 01 - 23 du 2.11.45") == ['loi', '01-23', '2-11-45']
+
+
+def test_tokenize_folds_arabic_letters_and_digits():
+    assert tokenize("القانون رقم ٠١-٢٣ في الطاقة") == ['القانون', 'رقم', '01-23', 'الطاقه']
+
+
+def test_match_expression_quotes_each_distinct_token():
+    assert match_expression('impôt "OR" impot NEAR(') == '"impot" OR "near"'
+
+
+def test_fusion_rewards_items_ranked_by_several_retrievers():
+    fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['b']], k=60)
+
+    assert [item for item, _ in fused] == ['b', 'a', 'c']
+    assert fused[0][1] == 1 / 62 + 1 / 61
+
+
+def test_fusion_applies_per_list_weights():
+    fused = reciprocal_rank_fusion([['a'], ['b']], k=0, weights=[1.0, 3.0])
+
+    assert fused == [('b', 3.0), ('a', 1.0)]
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from src.services.query_batcher import QueryBatcher
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def batcher(calls):
+    def handler(requests):
+        calls.append(list(requests))
+        if "fail" in requests:
+            raise ValueError("bad request")
+        return [request * 2 for request in requests]
+
+    batcher = QueryBatcher(handler, max_batch_size=4, max_wait_ms=20)
+    yield batcher
+    batcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_batch(batcher, calls):
+    results = await asyncio.gather(*(batcher.submit(n) for n in range(3)))
+
+    assert results == [0, 2, 4]
+    assert calls == [[0, 1, 2]]
+    assert batcher.stats()["largest_batch"] == 3
+
+
+@pytest.mark.asyncio
+async def test_a_full_batch_is_flushed_without_waiting(batcher, calls):
+    results = await asyncio.gather(*(batcher.submit(n) for n in range(6)))
+
+    assert results == [0, 2, 4, 6, 8, 10]
+    assert calls == [[0, 1, 2, 3], [4, 5]]
+
+
+@pytest.mark.asyncio
+async def test_a_failed_batch_fails_every_request_in_it(batcher):
+    results = await asyncio.gather(batcher.submit(1), batcher.submit("fail"), return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_requests_are_not_handled(batcher, calls):
+    cancelled = asyncio.ensure_future(batcher.submit(1))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    assert await batcher.submit(2) == 4
+    assert calls == [[2]]
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from src.services.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_with_one_key_share_one_computation():
+    flight = SingleFlight()
+    started = []
+
+    async def compute():
+        started.append(1)
+        await asyncio.sleep(0.01)
+        return {"answer": 42}
+
+    results = await asyncio.gather(*(flight.do("q", compute) for _ in range(5)))
+
+    assert len(started) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"in_flight": 0, "calls": 1, "coalesced": 4}
+
+
+@pytest.mark.asyncio
+async def test_the_key_is_free_once_the_computation_finishes():
+    flight = SingleFlight()
+
+    async def compute():
+        return object()
+
+    first = await flight.do("q", compute)
+    second = await flight.do("q", compute)
+
+    assert first is not second
+    assert flight.stats()["calls"] == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("provider down")
+
+    results = await asyncio.gather(*(flight.do("q", compute) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    leaving = asyncio.ensure_future(flight.do("q", compute))
+    staying = asyncio.ensure_future(flight.do("q", compute))
+    await asyncio.sleep(0)
+    leaving.cancel()
+
+    assert await staying == "answer"
+    assert leaving.cancelled()
@@ -0,0 +1,94 @@
+import pytest
+import pytest_asyncio
+
+from src.core.settings import settings
+from src.services.vector_metadata import normalize_filters
+from src.services.vector_service import VectorService
+
+
+@pytest_asyncio.fixture
+async def service(stub_encoder, articles, tmp_path):
+    for article in articles:
+        article['publication_date'] = f"2020-01-{article['article_id'] % 28 + 1:02d}"
+    service = VectorService(data_dir=tmp_path / "vectors")
+    assert await service.rebuild_index(articles)
+    yield service
+    service.query_batcher.shutdown()
+
+
+def _ids(results):
+    return [result['id'] for result in results]
+
+
+@pytest.mark.asyncio
+async def test_a_filter_excluding_the_top_hit_still_fills_k(service):
+    unfiltered = await service.search_similar("article 7 topic7", k=5, threshold=-1.0)
+    assert unfiltered[0]['id'] == 'article_7'
+
+    results = await service.search_similar("article 7 topic7", k=5, threshold=-1.0, filters={'category': 'Civil'})
+
+    assert len(results) == 5
+    assert 'article_7' not in _ids(results)
+    assert {result['category'] for result in results} == {'Civil'}
+    assert service.filter_stats["selector"] == 1
+
+
+@pytest.mark.asyncio
+async def test_filters_combine_and_skip_tombstoned_documents(service):
+    assert await service.remove_document('article_10')
+
+    results = await service.search_similar(
+        "article 10 topic10", k=20, threshold=-1.0, filters={'law_id': [0, 2], 'category': 'Civil'}
+    )
+
+    assert 'article_10' not in _ids(results)
+    # Civil (even) articles of laws 0 and 2, less the removed one
+    assert sorted(_ids(results)) == sorted(
+        f'article_{i}' for i in range(60) if i % 2 == 0 and i % 5 in (0, 2) and i != 10
+    )
+
+
+@pytest.mark.asyncio
+async def test_publication_date_filters_are_inclusive(service):
+    results = await service.search_similar(
+        "article", k=60, threshold=-1.0,
+        filters={'published_after': '2020-01-02', 'published_before': '2020-01-03'},
+    )
+
+    assert sorted(_ids(results)) == sorted(f'article_{i}' for i in range(60) if i % 28 in (1, 2))
+
+
+@pytest.mark.asyncio
+async def test_small_filtered_sets_of_an_ann_index_are_scored_exactly(stub_encoder, articles, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "vector_index_type", "hnsw")
+    service = VectorService(data_dir=tmp_path / "hnsw")
+    try:
+        assert await service.rebuild_index(articles)
+        assert await service.remove_document('article_15')
+
+        results = await service.search_similar("article 15 topic15", k=20, threshold=-1.0, filters={'law_id': 0})
+
+        assert sorted(_ids(results)) == sorted(f'article_{i}' for i in range(0, 60, 5) if i != 15)
+        assert service.filter_stats["exact"] == 1
+    finally:
+        service.query_batcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_keyword_search_applies_filters(service):
+    lexical = service.metadata.lexical_search("topic7", 10, normalize_filters({'category': 'Tax'}))
+    assert [service.metadata.get(vector_id)['parent_id'] for vector_id, _ in lexical] == ['article_7']
+    assert service.metadata.lexical_search("topic7", 10, normalize_filters({'category': 'Civil'})) == []
+
+    results = await service.hybrid_search("topic7", k=5, filters={'category': 'Civil'})
+
+    assert results
+    assert 'article_7' not in _ids(results)
+    assert all(result['lexical_score'] is None for result in results)
+    assert {result['category'] for result in results} == {'Civil'}
+
+
+@pytest.mark.asyncio
+async def test_unknown_filters_are_rejected(service):
+    with pytest.raises(ValueError):
+        await service.search_similar("article", filters={'author': 'x'})
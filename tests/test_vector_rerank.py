@@ -0,0 +1,97 @@
+import faiss
+import numpy as np
+import pytest
+import pytest_asyncio
+
+from src.core.settings import settings
+from src.services.vector_eval import index_memory
+from src.services.vector_rerank import RerankVectorStore, rerank
+from src.services.vector_service import VectorService
+
+
+def test_store_rows_are_addressed_by_vector_id(tmp_path):
+    store = RerankVectorStore(tmp_path / "full.vectors", 2)
+    store.write(np.arange(3), np.array([[0, 0], [1, 1], [2, 2]], dtype=np.float32))
+    store.write(np.array([7, 4]), np.array([[7, 7], [4, 4]], dtype=np.float32))
+
+    assert store.get(np.array([7, 1, 4])).tolist() == [[7, 7], [1, 1], [4, 4]]
+    assert store.nbytes == 8 * 2 * 4
+    store.close()
+
+
+def test_rerank_orders_candidates_by_exact_score():
+    vectors = {1: [1.0, 0.0], 2: [0.6, 0.8], 3: [0.0, 1.0]}
+    lookup = lambda ids: np.array([vectors[i] for i in ids.tolist()], dtype=np.float32)
+    queries = np.array([[0.0, 1.0], [1.0, 0.0]], dtype=np.float32)
+
+    scores, ids = rerank(queries, np.array([[1, 2, 3], [3, -1, -1]]), lookup, 2)
+
+    assert ids.tolist() == [[3, 2], [3, -1]]
+    assert scores[0].tolist() == pytest.approx([1.0, 0.8])
+
+
+@pytest_asyncio.fixture
+async def compressed(stub_encoder, articles, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "vector_quantization", "sq8")
+    monkeypatch.setattr(settings, "vector_index_type", "flat")
+    service = VectorService(data_dir=tmp_path / "vectors")
+    assert await service.rebuild_index(articles)
+    yield service
+    service.query_batcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_compressed_index_keeps_full_vectors_out_of_the_index(compressed):
+    assert compressed.describe_index() == {"index_type": "flat", "quantization": "sq8"}
+    assert not isinstance(faiss.downcast_index(compressed.index.index), faiss.IndexRefine)
+
+    memory = index_memory(compressed, compressed.index)
+    full_vectors = compressed.index.ntotal * compressed.index.d * 4
+    assert memory["resident_bytes"] == memory["index_bytes"] < full_vectors
+    assert memory["rerank_vectors_bytes"] == compressed.full_vectors.nbytes == full_vectors
+
+
+@pytest.mark.asyncio
+async def test_compressed_search_is_reranked_exactly(compressed, articles):
+    results = await compressed.search_similar("article 17 topic17", k=3, threshold=0.0)
+    assert results[0]['id'] == 'article_17'
+
+    query = compressed.encode_queries(["article 17 topic17"])[0]
+    vectors, _ = compressed.document_vectors('article_17')
+    assert results[0]['score'] == pytest.approx(float(vectors[0] @ query), abs=1e-4)
+
+
+@pytest.mark.asyncio
+async def test_written_vectors_reach_the_store_and_survive_a_reload(compressed):
+    assert await compressed.add_documents([{'id': 'article_100', 'text': 'pension reform article', 'type': 'law_article'}])
+    await compressed.close()
+
+    reloaded = VectorService(data_dir=compressed.data_dir)
+    try:
+        assert reloaded.full_vectors is not None
+        results = await reloaded.search_similar("pension reform article", k=1, threshold=0.0)
+        assert results[0]['id'] == 'article_100'
+    finally:
+        reloaded.query_batcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_snapshots_with_a_refine_wrapper_are_converted(compressed):
+    vectors, ids = compressed.live_vectors()
+    # How compressed indexes were saved before the full-vector store
+    base = faiss.IndexScalarQuantizer(vectors.shape[1], faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    legacy = faiss.IndexIDMap2(faiss.IndexRefineFlat(base))
+    legacy.train(vectors)
+    legacy.add_with_ids(vectors, ids)
+    compressed.index = legacy
+    compressed._write_snapshot(*compressed._snapshot_state())
+
+    reloaded = VectorService(data_dir=compressed.data_dir)
+    try:
+        assert reloaded._refine_index() is None
+        assert reloaded.describe_index() == {"index_type": "flat", "quantization": "sq8"}
+        assert np.allclose(reloaded.full_vectors.get(ids), vectors)
+        results = await reloaded.search_similar("article 23 topic23", k=1, threshold=0.0)
+        assert results[0]['id'] == 'article_23'
+    finally:
+        reloaded.query_batcher.shutdown()
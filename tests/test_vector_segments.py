@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from src.services.vector_segments import SegmentLog
+from src.services.vector_service import VectorService
+
+
+def _append(log, seq, ids):
+    vectors = np.full((len(ids), 4), seq, dtype=np.float32)
+    log.append(seq, np.array(ids, dtype=np.int64), vectors, {'removed': [], 'next_id': max(ids) + 1})
+
+
+def test_segments_replay_in_order_after_a_snapshot(tmp_path):
+    log = SegmentLog(tmp_path / "segments")
+    for seq in (1, 2, 3):
+        _append(log, seq, [seq * 10])
+
+    replayed = list(log.replay(after_seq=1))
+
+    assert [seq for seq, _, _, _ in replayed] == [2, 3]
+    assert replayed[0][1].tolist() == [20]
+    assert replayed[0][2].shape == (1, 4)
+    assert replayed[1][3]['next_id'] == 31
+
+
+def test_replay_stops_at_an_unreadable_segment(tmp_path):
+    log = SegmentLog(tmp_path / "segments")
+    for seq in (1, 2, 3):
+        _append(log, seq, [seq])
+    log._path(2).write_bytes(b"torn")
+
+    assert [seq for seq, _, _, _ in log.replay(after_seq=0)] == [1]
+
+
+def test_prune_and_discard_partial(tmp_path):
+    log = SegmentLog(tmp_path / "segments")
+    for seq in (1, 2, 3):
+        _append(log, seq, [seq])
+    (log.directory / "000000000004.seg.tmp").write_bytes(b"partial")
+
+    log.prune(upto_seq=2)
+    log.discard_partial()
+
+    assert sorted(path.name for path in log.directory.iterdir()) == ["000000000003.seg"]
+
+
+@pytest.mark.asyncio
+async def test_writes_survive_a_restart_through_segments_and_snapshots(stub_encoder, articles, tmp_path):
+    data_dir = tmp_path / "vectors"
+    service = VectorService(data_dir=data_dir)
+    assert await service.rebuild_index(articles[:10])
+    assert await service.add_documents([{'id': 'article_50', 'text': 'article 50 concerns customs', 'type': 'law_article'}])
+    assert await service.remove_document('article_3')
+    assert service.segment_seq - service.snapshot_seq == 2
+    service.query_batcher.shutdown()
+
+    replayed = VectorService(data_dir=data_dir)
+    assert replayed.metadata.parent_vector_ids(['article_50'])
+    assert not replayed.metadata.parent_vector_ids(['article_3'])
+    assert await replayed.merge_segments()
+    assert not list(replayed.segments.replay(replayed.snapshot_seq))
+    replayed.query_batcher.shutdown()
+
+    merged = VectorService(data_dir=data_dir)
+    assert merged.segment_seq == merged.snapshot_seq
+    assert merged.metadata.parent_vector_ids(['article_50'])
+    assert not merged.metadata.parent_vector_ids(['article_3'])
+    assert (await merged.search_similar("article 50 concerns customs", k=1, threshold=0.0))[0]['id'] == 'article_50'
+    merged.query_batcher.shutdown()
+
+
+def test_a_written_segment_is_never_replaced(tmp_path):
+    log = SegmentLog(tmp_path / "segments")
+    _append(log, 1, [10])
+
+    with pytest.raises(FileExistsError):
+        _append(log, 1, [99])
+
+    assert [ids.tolist() for _, ids, _, _ in log.replay(0)] == [[10]]
+    assert not list(log.directory.glob("*.tmp"))
+
+
+def test_one_process_at_a_time_holds_the_writer_lock(tmp_path):
+    first, second = SegmentLog(tmp_path / "segments"), SegmentLog(tmp_path / "segments")
+
+    assert first.acquire_writer()
+    assert first.acquire_writer()
+    assert not second.acquire_writer()
+
+
+@pytest.mark.asyncio
+async def test_a_second_writer_of_one_directory_is_refused(stub_encoder, articles, tmp_path):
+    writer = VectorService(data_dir=tmp_path / "vectors")
+    other = None
+    try:
+        assert await writer.rebuild_index(articles)
+        other = VectorService(data_dir=writer.data_dir)
+
+        assert not await other.add_documents([{'id': 'article_100', 'text': 'pensions', 'type': 'law_article'}])
+        assert await other.remove_documents(['article_1']) == 0
+        assert await writer.add_documents([{'id': 'article_100', 'text': 'pensions', 'type': 'law_article'}])
+        assert len(list(writer.segments.directory.glob("*.seg"))) == 1
+    finally:
+        writer.query_batcher.shutdown()
+        if other is not None:
+            other.query_batcher.shutdown()
@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+
+from src.core.settings import settings
+from src.services import vector_service
+from src.services.vector_service import VectorService
+
+
+@pytest_asyncio.fixture
+async def service(stub_encoder, articles, tmp_path):
+    service = VectorService(data_dir=tmp_path / "vectors")
+    assert await service.rebuild_index(articles)
+    yield service
+    service.query_batcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_repeated_hybrid_search_is_served_from_result_cache(service):
+    first = await service.hybrid_search("article 7 topic7", k=3)
+    hits = service.result_cache.hits
+
+    second = await service.hybrid_search("article 7 topic7", k=3)
+
+    assert first and first[0]['id'] == 'article_7'
+    assert second == first
+    assert service.result_cache.hits == hits + 1
+    assert all(isinstance(key, tuple) for key in service.result_cache._entries)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_does_not_block_the_event_loop(service, articles):
+    def slow_batches():
+        # Stands in for a blocking database fetch per batch
+        for start in range(0, len(articles), 10):
+            time.sleep(0.1)
+            yield articles[start:start + 10]
+
+    longest_gap = 0.0
+    rebuild = asyncio.ensure_future(service.rebuild_from_batches(slow_batches(), len(articles)))
+    while not rebuild.done():
+        started = time.monotonic()
+        await asyncio.sleep(0.01)
+        longest_gap = max(longest_gap, time.monotonic() - started)
+
+    assert rebuild.result()
+    assert longest_gap < 0.08
+    assert (await service.search_similar("article 3 topic3", k=1, threshold=0.0))[0]['id'] == 'article_3'
+
+
+@pytest.mark.asyncio
+async def test_close_merges_segments_so_the_next_start_maps_the_index(service):
+    assert await service.add_documents([{'id': 'article_100', 'text': 'article 100 concerns pensions', 'type': 'law_article'}])
+    assert service.segment_seq > service.snapshot_seq
+
+    await service.close()
+
+    reloaded = VectorService(data_dir=service.data_dir)
+    try:
+        assert reloaded.segment_seq == reloaded.snapshot_seq
+        assert reloaded.index_mmapped == bool(vector_service.INDEX_READ_FLAGS)
+        assert reloaded.metadata.parent_vector_ids(['article_100'])
+    finally:
+        reloaded.query_batcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_cached_results(service):
+    await service.search_similar("article 9 topic9", k=1, threshold=0.0)
+    version = service.index_version
+    assert len(service.result_cache) == 1
+
+    assert await service.remove_document('article_9')
+
+    assert service.index_version > version
+    assert len(service.result_cache) == 0
+    results = await service.search_similar("article 9 topic9", k=1, threshold=0.0)
+    assert results[0]['id'] != 'article_9'
+
+
+@pytest.mark.asyncio
+async def test_update_replaces_the_document_in_place(service):
+    assert await service.update_document('article_5', 'customs duties on imported vehicles', {'type': 'law_article', 'law_id': 0, 'article_id': 5})
+
+    results = await service.search_similar("customs duties on imported vehicles", k=1, threshold=0.0)
+
+    assert results[0]['id'] == 'article_5'
+    assert results[0]['content'] == 'customs duties on imported vehicles'
+    assert len(service.metadata.parent_vector_ids(['article_5'])) == 1
+    assert service.tombstones
+
+
+@pytest.mark.asyncio
+async def test_removed_documents_are_never_returned(service):
+    assert await service.remove_document('article_8')
+    assert not await service.remove_document('article_8')
+
+    results = await service.search_similar("article 8 topic8", k=60, threshold=-1.0)
+
+    assert 'article_8' not in {result['id'] for result in results}
+    assert len(results) == 59
+
+
+@pytest.mark.asyncio
+async def test_compaction_drops_tombstones_and_survives_a_reload(service):
+    assert await service.remove_documents([f'article_{i}' for i in range(10)]) == 10
+    stored = service.index.ntotal
+
+    assert await service.compact_index()
+
+    assert not service.tombstones
+    assert service.index.ntotal == stored - 10
+    reloaded = VectorService(data_dir=service.data_dir)
+    try:
+        stats = await reloaded.get_index_stats()
+        assert (stats['live_vectors'], stats['tombstones']) == (50, 0)
+        results = await reloaded.search_similar("article 12 topic12", k=1, threshold=0.0)
+        assert results[0]['id'] == 'article_12'
+    finally:
+        reloaded.query_batcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_the_index_family(stub_encoder, articles, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "vector_index_type", "hnsw")
+    monkeypatch.setattr(settings, "vector_quantization", "sq8")
+    service = VectorService(data_dir=tmp_path / "vectors")
+    try:
+        assert await service.rebuild_index(articles)
+        # Settings that would pick another index for the compacted corpus
+        monkeypatch.setattr(settings, "vector_index_type", "auto")
+        monkeypatch.setattr(settings, "vector_quantization", "none")
+
+        assert await service.remove_documents([f'article_{i}' for i in range(10)]) == 10
+        assert await service.compact_index()
+
+        assert service.describe_index() == {"index_type": "hnsw", "quantization": "sq8"}
+        results = await service.search_similar("article 12 topic12", k=1, threshold=0.0)
+        assert results[0]['id'] == 'article_12'
+    finally:
+        service.query_batcher.shutdown()
@@ -0,0 +1,104 @@
+import pytest
+import pytest_asyncio
+
+from src.services.language import detect_language
+from src.services.vector_shards import ShardedVectorService
+
+DOCUMENTS = (
+    [{'id': f'fr_{i}', 'text': f"article {i} du décret relatif à la taxe{i} et aux biens", 'law_id': i} for i in range(8)]
+    + [{'id': f'en_{i}', 'text': f"article {i} of the act regarding the tax{i} and property", 'law_id': i} for i in range(8)]
+    + [{'id': f'ar_{i}', 'text': f"المادة {i} من القانون المتعلق بالضريبة ضريبة{i}", 'law_id': i} for i in range(8)]
+)
+
+
+@pytest_asyncio.fixture
+async def sharded(stub_encoder, tmp_path):
+    sharded = ShardedVectorService(["fr", "en", "ar"], data_dir=tmp_path / "vectors")
+    assert await sharded.add_documents(DOCUMENTS)
+    yield sharded
+    for shard in sharded.shards.values():
+        shard.query_batcher.shutdown()
+
+
+def _held_by(sharded, doc_id):
+    return [language for language, shard in sharded.shards.items() if shard.metadata.parent_vector_ids([doc_id])]
+
+
+def test_detect_language():
+    assert detect_language("المادة الأولى من القانون") == "ar"
+    assert detect_language("Le présent décret est relatif aux impôts") == "fr"
+    assert detect_language("This act shall apply to the property of any person") == "en"
+    assert detect_language("2024 - 17", default="en") == "en"
+
+
+@pytest.mark.asyncio
+async def test_documents_are_written_to_the_shard_of_their_language(sharded):
+    for document in DOCUMENTS:
+        assert _held_by(sharded, document['id']) == [document['id'][:2]]
+    assert {language: shard.metadata.parent_count() for language, shard in sharded.shards.items()} == {
+        "fr": 8, "en": 8, "ar": 8,
+    }
+
+
+@pytest.mark.asyncio
+async def test_a_language_field_overrides_detection(sharded):
+    assert await sharded.add_documents([{'id': 'tagged', 'text': "the act regarding tax", 'language': "ar"}])
+    assert _held_by(sharded, 'tagged') == ["ar"]
+
+    # Unknown languages fall back to detection
+    assert await sharded.add_documents([{'id': 'untagged', 'text': "the act regarding tax", 'language': "de"}])
+    assert _held_by(sharded, 'untagged') == ["en"]
+
+
+@pytest.mark.asyncio
+async def test_a_document_changing_language_moves_shard(sharded):
+    assert await sharded.update_document('fr_3', "article 3 of the act regarding the tax3 and property", {'law_id': 3})
+
+    assert _held_by(sharded, 'fr_3') == ["en"]
+    assert await sharded.remove_document('fr_3')
+    assert _held_by(sharded, 'fr_3') == []
+
+
+@pytest.mark.asyncio
+async def test_queries_search_their_own_shard_unless_fanning_out(sharded):
+    results = await sharded.search_similar("the act regarding the tax5", k=20, threshold=-1.0, fan_out=False)
+
+    assert {result['id'][:2] for result in results} == {"en"}
+    assert sharded.routing_stats["primary_only"] == 1
+    assert sharded.routing_stats["by_language"]["en"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fanned_out_results_merge_by_score_across_shards(sharded):
+    # Searched from the French shard, the closest document is in the English one
+    results = await sharded.search_similar(
+        "the act regarding the tax5 and property", k=24, threshold=-1.0, fan_out=True, language="fr"
+    )
+
+    assert results[0]['id'] == 'en_5'
+    assert {result['id'][:2] for result in results} == {"fr", "en", "ar"}
+    scores = [result['score'] for result in results]
+    assert scores == sorted(scores, reverse=True)
+    assert [result['rank'] for result in results] == list(range(1, len(results) + 1))
+    assert sharded.routing_stats["fanned_out"] == 1
+    assert sharded.routing_stats["by_language"]["fr"] == 1
+
+
+def test_merge_keeps_the_best_hit_and_prefers_the_first_shard_on_ties():
+    primary = [
+        {'id': 'a', 'score': 0.9, 'matched_passages': 1},
+        {'id': 'b', 'score': 0.5, 'matched_passages': 1},
+    ]
+    other = [
+        {'id': 'c', 'score': 0.9, 'matched_passages': 1},
+        {'id': 'b', 'score': 0.7, 'matched_passages': 2},
+        {'id': 'd', 'score': 0.1, 'matched_passages': 1},
+    ]
+
+    merged = ShardedVectorService._merge([primary, other], k=3)
+
+    assert [(result['id'], result['score'], result['rank']) for result in merged] == [
+        ('a', 0.9, 1), ('c', 0.9, 2), ('b', 0.7, 3),
+    ]
+    assert merged[2]['matched_passages'] == 3
+    assert primary[1]['score'] == 0.5
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from src.core.settings import settings
+from src.db.base import Base
+from src.db.models import legal, security  # noqa: F401  (tables the AI tables refer to)
+from src.db.models.ai import AIAnswers, AIAnswerSources, AIQueries
+from src.services import write_behind
+from src.services.write_behind import WriteBehindWriter
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ai_write_batch_size", 4)
+    monkeypatch.setattr(settings, "ai_write_max_wait_ms", 50)
+    monkeypatch.setattr(settings, "ai_id_block_size", 10)
+    engine = create_engine(f"sqlite:///{tmp_path / 'ai.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[AIQueries.__table__, AIAnswers.__table__, AIAnswerSources.__table__])
+    yield engine
+    engine.dispose()
+
+
+def _count(engine, model):
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+async def _submit(writer, user_id=1):
+    query_id = await writer.new_query_id()
+    await writer.submit(
+        {'QueryID': query_id, 'UserID': user_id, 'QueryText': f'question {query_id}', 'QueryDate': datetime.utcnow()},
+        {'AnswerText': 'answer', 'ConfidenceScore': 0.8, 'DisclaimerAdded': True, 'AnswerDate': datetime.utcnow()},
+        [{'LawID': None, 'ArticleID': None, 'Excerpt': 'excerpt', 'RelevanceScore': 0.5}] * 2,
+    )
+    return query_id
+
+
+@pytest.mark.asyncio
+async def test_records_are_written_in_batches_and_drained(engine):
+    writer = WriteBehindWriter(engine)
+
+    query_ids = [await _submit(writer) for _ in range(10)]
+    await writer.drain()
+
+    assert query_ids == list(range(1, 11))
+    assert (_count(engine, AIQueries), _count(engine, AIAnswers), _count(engine, AIAnswerSources)) == (10, 10, 20)
+    assert writer.batches < 10
+    with pytest.raises(RuntimeError):
+        await _submit(writer)
+
+
+@pytest.mark.asyncio
+async def test_reads_can_wait_for_pending_records(engine):
+    writer = WriteBehindWriter(engine)
+
+    query_id = await _submit(writer, user_id=7)
+    assert _count(engine, AIQueries) == 0
+
+    assert await writer.wait_written(user_id=7)
+    assert _count(engine, AIQueries) == 1
+    assert await writer.wait_written(query_id=query_id)
+    await writer.drain()
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_do_not_back_off_after_the_last_attempt(engine, monkeypatch):
+    writer = WriteBehindWriter(engine)
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    def insert(batch):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(write_behind.asyncio, "sleep", sleep)
+    monkeypatch.setattr(writer, "_insert", insert)
+    query_id = await _submit(writer)
+    await asyncio.wait_for(writer.drain(), 1)
+
+    assert len(delays) == write_behind.WRITE_ATTEMPTS - 1
+    assert writer.dropped == 1
+    assert await writer.wait_written(query_id=query_id, timeout=0)